@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+Almacén de respaldos direccionado por contenido
+
+Cada original distinto se guarda una sola vez en img_backup/.objects/,
+nombrado por su hash. La estructura de siempre en img_backup/ (misma ruta
+relativa que en img/) se mantiene, pero sus archivos son enlaces a esos
+objetos, así que repetir un respaldo no vuelve a copiar nada.
+
+Las restauraciones usan reflink (copia con copy-on-write) cuando el
+sistema de archivos lo permite, y copia normal si no; nunca enlaces duros,
+porque los archivos de img/ se editan y los objetos son de solo lectura.
+Solo se tocan los archivos cuyo contenido cambió.
+
+Uso:
+    python backup_store.py --restore   # img_backup/ → img/
+"""
+
+import os
+import sys
+import stat
+import shutil
+import tempfile
+import argparse
+import contextlib
+from pathlib import Path
+from compression_manifest import file_hash, load_manifest, save_manifest, forget
+
+BACKUP_FOLDER = Path("img_backup")
+OBJECTS_DIR = ".objects"
+
+# ioctl FICLONE de Linux (reflink en btrfs, XFS, etc.)
+FICLONE = 0x40049409
+
+def objects_folder(backup_folder=BACKUP_FOLDER):
+    """Carpeta donde viven los objetos del almacén"""
+    return Path(backup_folder) / OBJECTS_DIR
+
+def _object_path(backup_folder, digest):
+    return objects_folder(backup_folder) / digest[:2] / digest
+
+def _reflink(src, dst):
+    """Copia con copy-on-write; lanza OSError si no está soportado"""
+    import fcntl  # Solo Unix
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+
+def _same_inode(a, b):
+    """True si a y b son el mismo archivo (p. ej. enlaces duros entre sí)"""
+    try:
+        sa, sb = os.stat(a), os.stat(b)
+    except OSError:
+        return False
+    return (sa.st_dev, sa.st_ino) == (sb.st_dev, sb.st_ino)
+
+def _same_file(a, b):
+    """True si a y b son el mismo archivo o tienen el mismo contenido"""
+    try:
+        sa, sb = os.stat(a), os.stat(b)
+    except OSError:
+        return False
+    if (sa.st_dev, sa.st_ino) == (sb.st_dev, sb.st_ino):
+        return True
+    return sa.st_size == sb.st_size and file_hash(a) == file_hash(b)
+
+def _replace(tmp_name, dst):
+    """os.replace que también funciona si el destino es de solo lectura"""
+    try:
+        os.replace(tmp_name, dst)
+    except PermissionError:
+        # Windows no reemplaza archivos de solo lectura
+        os.chmod(dst, stat.S_IWRITE | stat.S_IREAD)
+        os.replace(tmp_name, dst)
+
+def _umask():
+    """Máscara de permisos del proceso (os.umask solo se puede leer cambiándola)"""
+    mask = os.umask(0)
+    os.umask(mask)
+    return mask
+
+def link_or_copy(src, dst, hardlink=True):
+    """
+    Coloca en dst el contenido de src de la forma más barata posible
+
+    Orden: reflink → enlace duro → copia. El reemplazo es atómico.
+
+    Con hardlink=False (archivos de trabajo de img/, que se editan) no se
+    usa el enlace duro y dst queda escribible con los permisos normales,
+    no con los de solo lectura de los objetos del almacén.
+
+    Returns:
+        'reflink', 'link' o 'copy'
+    """
+    dst = Path(dst)
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(dir=dst.parent, prefix=f".{dst.name}.", suffix='.tmp')
+    os.close(fd)
+    try:
+        try:
+            _reflink(src, tmp_name)
+            method = 'reflink'
+        except (OSError, ImportError):
+            os.unlink(tmp_name)
+            method = 'copy'
+            if hardlink:
+                with contextlib.suppress(OSError):
+                    os.link(src, tmp_name)
+                    method = 'link'
+            if method == 'copy':
+                shutil.copy2(src, tmp_name)
+        if not hardlink:
+            os.chmod(tmp_name, 0o666 & ~_umask())
+        _replace(tmp_name, dst)
+        return method
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.unlink(tmp_name)
+        raise
+
+def store_object(path, backup_folder=BACKUP_FOLDER, digest=None):
+    """
+    Guarda el contenido de path en el almacén (si no estaba ya)
+
+    El objeto es una copia real (no un enlace al archivo de img/, que puede
+    editarse) y queda de solo lectura.
+
+    Returns:
+        (hash, ruta_del_objeto)
+    """
+    digest = digest or file_hash(path)
+    obj = _object_path(backup_folder, digest)
+    if not obj.exists():
+        obj.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(dir=obj.parent, prefix='.', suffix='.tmp')
+        os.close(fd)
+        try:
+            shutil.copy2(path, tmp_name)
+            os.chmod(tmp_name, stat.S_IREAD | stat.S_IRGRP | stat.S_IROTH)
+            # Si otro proceso lo guardó a la vez, el contenido es idéntico
+            os.replace(tmp_name, obj)
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.unlink(tmp_name)
+            raise
+    return digest, obj
+
+def backup_file(path, backup_path, backup_folder=BACKUP_FOLDER, digest=None):
+    """
+    Respalda path en backup_path a través del almacén
+
+    Si backup_path ya tiene ese contenido no se escribe nada. Si tiene otro
+    (se sustituyó la imagen), ese contenido anterior se guarda antes en el
+    almacén para no perderlo. digest es el hash de path si ya se conoce.
+
+    Returns:
+        hash del contenido respaldado
+    """
+    digest, obj = store_object(path, backup_folder, digest)
+    if not _same_file(obj, backup_path):
+        if os.path.exists(backup_path):
+            store_object(backup_path, backup_folder)
+        link_or_copy(obj, backup_path)
+    return digest
+
+def backup_folder_tree(img_folder, backup_folder=BACKUP_FOLDER, extensions=None):
+    """Respalda todos los archivos de img_folder (sustituye a copytree)"""
+    img_folder = Path(img_folder)
+    count = 0
+    for path in img_folder.rglob('*'):
+        if path.is_file() and (extensions is None or path.suffix.lower() in extensions):
+            backup_file(path, Path(backup_folder) / path.relative_to(img_folder), backup_folder)
+            count += 1
+    return count
+
+def iter_backups(backup_folder=BACKUP_FOLDER):
+    """Archivos respaldados (sin los objetos internos del almacén)"""
+    backup_folder = Path(backup_folder)
+    for path in backup_folder.rglob('*'):
+        rel = path.relative_to(backup_folder)
+        if rel.parts[0] == OBJECTS_DIR or path.name.startswith('.') or not path.is_file():
+            continue
+        yield path, rel
+
+def restore_folder(img_folder=Path("img"), backup_folder=BACKUP_FOLDER):
+    """
+    Restaura los originales de backup_folder en img_folder
+
+    Solo se escriben los archivos que difieren. Las salidas comprimidas
+    registradas en el manifiesto para un original restaurado (p. ej. el
+    .jpg de un .png) se eliminan.
+
+    Returns:
+        dict con restored, unchanged y removed
+    """
+    img_folder = Path(img_folder)
+    manifest = load_manifest()
+    by_source = {}
+    for output, entry in manifest['outputs'].items():
+        by_source.setdefault(entry['source'], []).append(output)
+
+    counts = {'restored': 0, 'unchanged': 0, 'removed': 0}
+    for path, rel in iter_backups(backup_folder):
+        target = img_folder / rel
+        for output in by_source.get(path.as_posix(), []):
+            forget(manifest, output)
+            if Path(output) != target and Path(output).exists():
+                os.unlink(output)
+                counts['removed'] += 1
+        # Un enlace duro al respaldo (restauraciones anteriores) se sustituye por una copia
+        if _same_file(path, target) and not _same_inode(path, target):
+            counts['unchanged'] += 1
+            continue
+        link_or_copy(path, target, hardlink=False)
+        counts['restored'] += 1
+    save_manifest(manifest)
+    return counts
+
+def main():
+    parser = argparse.ArgumentParser(description="Almacén de respaldos de imágenes")
+    parser.add_argument('--restore', action='store_true',
+                        help="Restaurar los originales de img_backup/ en img/")
+    args = parser.parse_args()
+
+    if not args.restore:
+        parser.print_help()
+        return
+
+    if not BACKUP_FOLDER.exists():
+        print("❌ No se encontró carpeta de backup")
+        sys.exit(1)
+
+    print("🔄 Restaurando originales desde img_backup/...")
+    counts = restore_folder()
+    print(f"✅ Restaurados: {counts['restored']}")
+    print(f"   Sin cambios: {counts['unchanged']}")
+    print(f"   Salidas comprimidas eliminadas: {counts['removed']}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+Diario de escritura anticipada para las pasadas por lotes sobre img/
+
+Cada lote anota en JOURNAL_PATH (JSON Lines, sincronizado a disco línea a
+línea) qué imágenes piensa procesar y, por cada una, las operaciones que
+va completando: backup, encode, replace (con el archivo que se borra) y
+done. Antes de sobrescribir o borrar un archivo de img/ se anota su
+contenido anterior (guardado en el almacén de img_backup/) y su entrada
+del manifiesto: eso es lo que permite deshacer.
+
+Si el lote se interrumpe el diario queda en disco y:
+- --resume procesa solo las imágenes planificadas que no llegaron a done
+- --rollback devuelve cada archivo tocado a su contenido anterior, borra
+  los que el lote creó y restaura el manifiesto
+
+Al terminar un lote el diario se elimina.
+
+Uso:
+    python compress_quick.py --resume
+    python fix_compression.py --rollback
+    python batch_journal.py            # estado del lote pendiente
+"""
+
+import os
+import json
+import uuid
+import argparse
+import contextlib
+from pathlib import Path
+from datetime import datetime
+from backup_store import (BACKUP_FOLDER, store_object, link_or_copy, _object_path,
+                          _same_file, _same_inode)
+from compression_manifest import load_manifest, save_manifest, forget
+
+JOURNAL_PATH = Path(".compression_journal.jsonl")
+
+def _key(path):
+    return Path(path).as_posix()
+
+def _append(journal, entry):
+    """Añade una línea y la fuerza a disco antes de seguir"""
+    journal['file'].write(json.dumps(entry, ensure_ascii=False) + '\n')
+    journal['file'].flush()
+    os.fsync(journal['file'].fileno())
+
+def read_journal(path=JOURNAL_PATH):
+    """
+    Estado del lote sin terminar
+
+    Una última línea cortada por la interrupción se ignora.
+
+    Returns:
+        dict con script, params, started, planned (rutas), done (conjunto)
+        y saves (estados anteriores, en orden), o None si no hay lote
+    """
+    path = Path(path)
+    if not path.exists():
+        return None
+    state = None
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                break
+            op = entry['op']
+            if op == 'begin':
+                state = {'batch': entry['batch'], 'script': entry['script'],
+                         'params': entry.get('params', {}), 'started': entry['started'],
+                         'planned': [], 'done': set(), 'saves': []}
+            elif state is None:
+                continue
+            elif op == 'plan':
+                state['planned'].extend(entry['paths'])
+            elif op == 'done':
+                state['done'].add(entry['path'])
+            elif op == 'save':
+                state['saves'].append(entry)
+    return state
+
+def pending_paths(state):
+    """Imágenes planificadas que no llegaron a completarse"""
+    return [Path(p) for p in state['planned'] if p not in state['done']]
+
+def begin_batch(script, planned, params=None, path=JOURNAL_PATH, backup_folder=BACKUP_FOLDER):
+    """Abre el diario de un lote nuevo y anota las imágenes planificadas"""
+    journal = {'path': Path(path), 'file': open(path, 'a', encoding='utf-8'),
+               'backup_folder': Path(backup_folder), 'saved': set()}
+    _append(journal, {'op': 'begin', 'batch': uuid.uuid4().hex[:12], 'script': script,
+                      'params': params or {},
+                      'started': datetime.now().isoformat(timespec='seconds')})
+    _append(journal, {'op': 'plan', 'paths': [_key(p) for p in planned]})
+    return journal
+
+def resume_batch(state, path=JOURNAL_PATH, backup_folder=BACKUP_FOLDER):
+    """Reabre el diario de un lote interrumpido para continuarlo"""
+    journal = {'path': Path(path), 'file': open(path, 'a', encoding='utf-8'),
+               'backup_folder': Path(backup_folder),
+               'saved': {save['path'] for save in state['saves']}}
+    _append(journal, {'op': 'resume', 'at': datetime.now().isoformat(timespec='seconds')})
+    return journal
+
+def log_op(journal, op, path, **fields):
+    """Anota una operación completada sobre path (backup, encode, replace, done)"""
+    if journal is None:
+        return
+    entry = {'op': op, 'path': _key(path)}
+    entry.update(fields)
+    _append(journal, entry)
+
+def protect(journal, path, manifest):
+    """
+    Anota el estado de path antes de sobrescribirlo o borrarlo
+
+    El contenido se guarda en el almacén de respaldos (no cuesta nada si
+    ya estaba, como los originales respaldados). Solo la primera vez en el
+    lote: ese es el estado al que vuelve --rollback.
+    """
+    if journal is None or _key(path) in journal['saved']:
+        return
+    digest = None
+    if Path(path).exists():
+        digest, _ = store_object(path, journal['backup_folder'])
+    _append(journal, {'op': 'save', 'path': _key(path), 'digest': digest,
+                      'entry': manifest['outputs'].get(_key(path))})
+    journal['saved'].add(_key(path))
+
+def end_batch(journal):
+    """Cierra el lote completo y elimina el diario"""
+    if journal is None:
+        return
+    _append(journal, {'op': 'end'})
+    journal['file'].close()
+    journal['path'].unlink()
+
+def close_journal(journal):
+    """Cierra el archivo sin dar el lote por terminado (interrupción)"""
+    if journal is not None:
+        journal['file'].close()
+
+def rollback(path=JOURNAL_PATH, backup_folder=BACKUP_FOLDER):
+    """
+    Deshace el lote pendiente: cada archivo vuelve a su estado anterior
+
+    Returns:
+        dict con restored y removed, o None si no hay lote pendiente
+    """
+    state = read_journal(path)
+    if state is None:
+        return None
+    manifest = load_manifest()
+    counts = {'restored': 0, 'removed': 0}
+    for save in reversed(state['saves']):
+        target = Path(save['path'])
+        if save['digest']:
+            obj = _object_path(Path(backup_folder), save['digest'])
+            if not _same_file(obj, target) or _same_inode(obj, target):
+                # Copia escribible, nunca un enlace al objeto de solo lectura
+                link_or_copy(obj, target, hardlink=False)
+                counts['restored'] += 1
+        elif target.exists():
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(target)
+            counts['removed'] += 1
+        if save['entry'] is None:
+            forget(manifest, target)
+        else:
+            manifest['outputs'][save['path']] = save['entry']
+    save_manifest(manifest)
+    Path(path).unlink()
+    return counts
+
+def describe(state):
+    """Una línea con el progreso de un lote pendiente"""
+    done = len(set(state['planned']) & state['done'])
+    return (f"{state['script']} iniciado el {state['started']}: "
+            f"{done}/{len(state['planned'])} imágenes completadas")
+
+def check_pending(script, resume=False, rollback_requested=False):
+    """
+    Decide qué hacer con un lote pendiente antes de empezar
+
+    Returns:
+        ('run', None) para un lote nuevo, ('resume', estado), o ('stop', None)
+        si hay que parar (lote de otro script, rollback hecho o nada que
+        reanudar)
+    """
+    state = read_journal()
+    if rollback_requested:
+        if state is None:
+            print("ℹ️  No hay ningún lote pendiente que deshacer")
+            return 'stop', None
+        print(f"↩️  Deshaciendo el lote de {describe(state)}")
+        counts = rollback()
+        print(f"✅ Archivos restaurados: {counts['restored']}, "
+              f"creados por el lote y eliminados: {counts['removed']}")
+        return 'stop', None
+    if state is None:
+        if resume:
+            print("ℹ️  No hay ningún lote pendiente: se hace una pasada normal")
+        return 'run', None
+    if state['script'] != script:
+        print(f"⚠️  Hay un lote pendiente de {describe(state)}")
+        print(f"   Termínalo con: python {state['script']}.py --resume "
+              f"(o deshazlo con --rollback)")
+        return 'stop', None
+    if not resume:
+        print(f"⚠️  Hay un lote pendiente de {describe(state)}")
+        print("   Usa --resume para terminarlo o --rollback para deshacerlo")
+        return 'stop', None
+    print(f"▶️  Reanudando el lote de {describe(state)}")
+    return 'resume', state
+
+def add_journal_arguments(parser):
+    """Añade --resume y --rollback a un ArgumentParser"""
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('--resume', action='store_true',
+                       help="Terminar solo las imágenes pendientes del último lote interrumpido")
+    group.add_argument('--rollback', action='store_true',
+                       help="Deshacer el último lote interrumpido")
+
+def main():
+    parser = argparse.ArgumentParser(description="Estado del lote de compresión pendiente")
+    parser.add_argument('--rollback', action='store_true', help="Deshacer el lote pendiente")
+    args = parser.parse_args()
+    if args.rollback:
+        check_pending(None, rollback_requested=True)
+        return
+    state = read_journal()
+    if state is None:
+        print("✅ No hay ningún lote pendiente")
+        return
+    print(f"⚠️  Lote pendiente de {describe(state)}")
+    for path in pending_paths(state)[:20]:
+        print(f"   · {path.as_posix()}")
+
+if __name__ == "__main__":
+    main()
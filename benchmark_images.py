@@ -0,0 +1,367 @@
+#!/usr/bin/env python3
+"""
+Banco de pruebas de las estrategias de compresión de imágenes
+
+Genera (una sola vez, con semilla fija) un corpus que imita lo que hay en
+img/: gráficas de colores planos, mapas, fotografías, imágenes RGBA y con
+paleta, y portadas muy grandes. Sobre ese corpus mide cada estrategia de
+compresión sin tocar img/ ni img_backup/: todo se codifica en memoria.
+
+Por estrategia se obtiene:
+- Rendimiento en MP/s y MB/s de entrada
+- Percentiles de latencia por imagen
+- Pico de memoria residente (cada estrategia corre en un proceso nuevo)
+- Bytes de salida y SSIM respecto al original
+
+Los resultados se guardan en JSON para comparar ejecuciones:
+    python benchmark_images.py -o antes.json
+    python benchmark_images.py -o despues.json --compare antes.json
+"""
+
+import io
+import sys
+import json
+import time
+import platform
+import argparse
+import multiprocessing
+from pathlib import Path
+from datetime import datetime
+from contextlib import redirect_stdout
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import PIL
+from PIL import Image, ImageDraw
+
+from image_io import flatten_to_rgb, peak_rss_mb
+from image_quality import luminance, ssim
+
+CORPUS_FOLDER = Path(".bench_corpus")
+CORPUS_VERSION = 1
+DEFAULT_SEED = 2025
+
+# Estrategias: nombre → descripción (la función se resuelve en el proceso hijo)
+STRATEGIES = {
+    'compress_images': "compress_images.py (calidad 92, 1920x1080)",
+    'compress_images_auto': "compress_images.py --auto-format",
+    'compress_images_low_memory': "compress_images.py --low-memory",
+    'compress_images_ssim': "compress_images.py --ssim 0.98",
+    'compress_quick': "compress_quick.py (calidad 90, 3000 px)",
+    'restore_and_recompress': "fix_compression.py (calidad según tamaño)",
+    'recompress_to_budget': "recompress_specific.py (2 MB, 2400 px)",
+}
+
+# ----------------------------------------------------------------------
+# Corpus
+# ----------------------------------------------------------------------
+
+def _smooth_noise(rng, width, height, octaves=5):
+    """Ruido suave tipo fotografía: suma de octavas de ruido ampliado (0..1)"""
+    field = np.zeros((height, width), dtype=np.float32)
+    amplitude = 1.0
+    for octave in range(octaves):
+        cells = 4 * 2 ** octave
+        small = rng.random((max(2, height * cells // width), cells), dtype=np.float32)
+        layer = Image.fromarray((small * 255).astype(np.uint8)).resize(
+            (width, height), Image.Resampling.BICUBIC)
+        field += amplitude * np.asarray(layer, dtype=np.float32) / 255
+        amplitude /= 2
+    field -= field.min()
+    return field / max(field.max(), 1e-6)
+
+def _photo(rng, width, height):
+    """Fotografía sintética: color suave, textura y grano"""
+    channels = [_smooth_noise(rng, width, height) for _ in range(3)]
+    rgb = np.stack(channels, axis=-1) * 200 + 20
+    rgb += rng.normal(0, 6, rgb.shape).astype(np.float32)
+    return Image.fromarray(np.clip(rgb, 0, 255).astype(np.uint8), 'RGB')
+
+def _bar_chart(rng, width, height):
+    """Gráfica de barras con rejilla y colores planos"""
+    img = Image.new('RGB', (width, height), (255, 255, 255))
+    draw = ImageDraw.Draw(img)
+    for y in range(height // 10, height, height // 10):
+        draw.line([(width // 12, y), (width - width // 24, y)], fill=(210, 210, 210), width=2)
+    palette = [(31, 119, 180), (255, 127, 14), (44, 160, 44), (214, 39, 40)]
+    bars = 12
+    slot = (width - width // 6) // bars
+    for i in range(bars):
+        value = rng.uniform(0.15, 0.9)
+        x0 = width // 12 + i * slot + slot // 6
+        draw.rectangle([x0, int(height * (1 - value)), x0 + slot * 2 // 3, height - height // 10],
+                       fill=palette[i % len(palette)])
+    draw.line([(width // 12, 0), (width // 12, height - height // 10)], fill=(0, 0, 0), width=3)
+    draw.line([(width // 12, height - height // 10), (width, height - height // 10)],
+              fill=(0, 0, 0), width=3)
+    return img
+
+def _region_map(rng, width, height, regions=40):
+    """Mapa de regiones de color plano con contornos"""
+    small = rng.integers(0, regions, (height // 40, width // 40), dtype=np.uint8)
+    labels = np.asarray(Image.fromarray(small).resize((width, height), Image.Resampling.NEAREST))
+    colors = rng.integers(40, 255, (regions, 3), dtype=np.uint8)
+    rgb = colors[labels]
+    border = np.zeros(labels.shape, dtype=bool)
+    border[:, 1:] |= labels[:, 1:] != labels[:, :-1]
+    border[1:, :] |= labels[1:, :] != labels[:-1, :]
+    rgb[border] = 60
+    return Image.fromarray(rgb, 'RGB')
+
+def _rgba_overlay(rng, width, height):
+    """Fotografía con alfa en degradado (recortes, logotipos con sombra)"""
+    img = _photo(rng, width, height).convert('RGBA')
+    alpha = np.tile(np.linspace(0, 255, width, dtype=np.float32), (height, 1))
+    img.putalpha(Image.fromarray(alpha.astype(np.uint8)))
+    return img
+
+def _palette_logo(rng, width, height):
+    """Imagen con paleta y un índice transparente"""
+    img = Image.new('P', (width, height), 0)
+    img.putpalette([255, 255, 255, 0, 84, 147, 227, 6, 19, 120, 120, 120] + [0] * (256 - 4) * 3)
+    draw = ImageDraw.Draw(img)
+    for _ in range(30):
+        x, y = rng.integers(0, width), rng.integers(0, height)
+        r = int(rng.integers(width // 40, width // 8))
+        draw.ellipse([x - r, y - r, x + r, y + r], fill=int(rng.integers(1, 4)))
+    img.info['transparency'] = 0
+    return img
+
+# nombre, generador, (ancho, alto) a escala 1, formato
+CORPUS = [
+    ('chart_bars.png', _bar_chart, (2400, 1600), 'PNG'),
+    ('chart_map.png', _region_map, (3000, 2200), 'PNG'),
+    ('photo.jpg', _photo, (3000, 2000), 'JPEG'),
+    ('photo_large.png', _photo, (2400, 1800), 'PNG'),
+    ('overlay_rgba.png', _rgba_overlay, (1600, 1200), 'PNG'),
+    ('logo_palette.png', _palette_logo, (1800, 1200), 'PNG'),
+    ('cover.jpg', _photo, (7200, 4800), 'JPEG'),
+]
+
+def generate_corpus(folder=CORPUS_FOLDER, seed=DEFAULT_SEED, scale=1.0):
+    """
+    Genera el corpus en folder si no existe ya con la misma semilla y escala
+
+    Returns:
+        lista de rutas de las imágenes del corpus
+    """
+    folder = Path(folder)
+    spec = {'version': CORPUS_VERSION, 'seed': seed, 'scale': scale,
+            'images': [name for name, *_ in CORPUS]}
+    spec_path = folder / 'corpus.json'
+    paths = [folder / name for name, *_ in CORPUS]
+    if spec_path.exists() and all(p.exists() for p in paths):
+        if json.loads(spec_path.read_text(encoding='utf-8')) == spec:
+            return paths
+
+    folder.mkdir(parents=True, exist_ok=True)
+    print(f"🧪 Generando corpus en {folder}/ (semilla {seed}, escala {scale})...")
+    for index, (name, generator, (width, height), fmt) in enumerate(CORPUS):
+        # Una semilla por imagen: cambiar una no altera las demás
+        rng = np.random.default_rng([seed, index])
+        img = generator(rng, max(64, int(width * scale)), max(64, int(height * scale)))
+        if fmt == 'JPEG':
+            img.save(folder / name, 'JPEG', quality=95)
+        else:
+            img.save(folder / name, 'PNG', compress_level=6)
+    spec_path.write_text(json.dumps(spec, indent=2), encoding='utf-8')
+    return paths
+
+# ----------------------------------------------------------------------
+# Estrategias
+# ----------------------------------------------------------------------
+
+def _strategy_function(name):
+    """Función path → (formato, bytes) que reproduce cada script en memoria"""
+    if name.startswith('compress_images'):
+        from compress_images import encode_image, MAX_WIDTH, MAX_HEIGHT
+        options = {
+            'compress_images': {},
+            'compress_images_auto': {'auto_format': True},
+            'compress_images_low_memory': {'low_memory': True},
+            'compress_images_ssim': {'target_ssim': 0.98},
+        }[name]
+        return lambda path: encode_image(path, 92, MAX_WIDTH, MAX_HEIGHT, **options)
+    if name == 'compress_quick':
+        from compress_quick import encode_quick
+        return lambda path: ('JPEG', encode_quick(path))
+    if name == 'restore_and_recompress':
+        from fix_compression import encode_backup, _strategy
+
+        def encode(path):
+            quality, max_width, _ = _strategy(Path(path).stat().st_size / (1024 * 1024))
+            return 'JPEG', encode_backup(path, quality, max_width)
+        return encode
+    if name == 'recompress_to_budget':
+        from image_budget import fit_data
+        return lambda path: ('JPEG', fit_data(path, 2 * 1024 * 1024,
+                                              max_size=(2400, 2400))[0])
+    raise ValueError(f"Estrategia desconocida: {name}")
+
+def output_ssim(source_path, data):
+    """SSIM de la salida frente al original, a la resolución de la salida"""
+    with Image.open(io.BytesIO(data)) as out:
+        compressed = luminance(flatten_to_rgb(out))
+    with Image.open(source_path) as src:
+        reference = luminance(flatten_to_rgb(src), compressed.shape[::-1])
+    return ssim(reference, compressed)
+
+def run_strategy(name, paths, repeat=1):
+    """
+    Ejecuta una estrategia sobre el corpus (pensada para un proceso nuevo)
+
+    Solo se cronometra la codificación; el SSIM se calcula aparte.
+
+    Returns:
+        dict con los resultados por imagen y el pico de memoria
+    """
+    encode = _strategy_function(name)
+    images = []
+    for path in paths:
+        path = Path(path)
+        latencies = []
+        for _ in range(repeat):
+            with redirect_stdout(io.StringIO()):
+                start = time.perf_counter()
+                result = encode(path)
+                latencies.append(time.perf_counter() - start)
+        if result is None:
+            images.append({'name': path.name, 'error': True, 'latencies_s': latencies})
+            continue
+        fmt, data = result
+        with Image.open(path) as src:
+            width, height = src.size
+        images.append({
+            'name': path.name,
+            'input_bytes': path.stat().st_size,
+            'megapixels': width * height / 1e6,
+            'format': fmt,
+            'output_bytes': len(data),
+            'ssim': round(output_ssim(path, data), 5),
+            'latencies_s': [round(t, 5) for t in latencies],
+        })
+    return {'images': images, 'peak_rss_mb': peak_rss_mb()}
+
+def summarize(run):
+    """Añade los agregados (rendimiento, percentiles, totales) a un resultado"""
+    ok = [img for img in run['images'] if not img.get('error')]
+    latencies = np.array([t for img in ok for t in img['latencies_s']] or [0.0])
+    repeat = max(len(ok[0]['latencies_s']), 1) if ok else 1
+    total_time = float(latencies.sum())
+    megapixels = sum(img['megapixels'] for img in ok) * repeat
+    input_mb = sum(img['input_bytes'] for img in ok) * repeat / (1024 * 1024)
+    scores = [img['ssim'] for img in ok]
+    run.update({
+        'errors': len(run['images']) - len(ok),
+        'input_bytes': sum(img['input_bytes'] for img in ok),
+        'output_bytes': sum(img['output_bytes'] for img in ok),
+        'throughput_mp_s': round(megapixels / total_time, 3) if total_time else None,
+        'throughput_mb_s': round(input_mb / total_time, 3) if total_time else None,
+        'latency_s': {
+            'p50': round(float(np.percentile(latencies, 50)), 5),
+            'p90': round(float(np.percentile(latencies, 90)), 5),
+            'p99': round(float(np.percentile(latencies, 99)), 5),
+            'max': round(float(latencies.max()), 5),
+        },
+        'ssim_mean': round(float(np.mean(scores)), 5) if scores else None,
+        'ssim_min': round(float(np.min(scores)), 5) if scores else None,
+    })
+    return run
+
+def run_benchmark(strategies, paths, repeat=1):
+    """
+    Ejecuta cada estrategia en su propio proceso (spawn)
+
+    Un proceso nuevo por estrategia hace que el pico de memoria medido sea
+    solo el de esa estrategia y no arrastre cachés de las anteriores.
+    """
+    context = multiprocessing.get_context('spawn')
+    results = {}
+    for name in strategies:
+        print(f"⏱️  {name}: {STRATEGIES[name]}")
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+            run = executor.submit(run_strategy, name, [str(p) for p in paths], repeat).result()
+        results[name] = summarize(run)
+    return results
+
+# ----------------------------------------------------------------------
+# Informe
+# ----------------------------------------------------------------------
+
+def print_table(results, baseline=None):
+    """Tabla resumen; con baseline añade la variación respecto a ella"""
+    print("\n" + "=" * 96)
+    print(f"{'Estrategia':<28}{'MP/s':>8}{'MB/s':>8}{'p50 ms':>9}{'p90 ms':>9}"
+          f"{'RSS MB':>9}{'Salida KB':>11}{'SSIM':>8}")
+    print("=" * 96)
+    for name, run in results.items():
+        print(f"{name:<28}{run['throughput_mp_s'] or 0:>8.1f}{run['throughput_mb_s'] or 0:>8.1f}"
+              f"{run['latency_s']['p50'] * 1000:>9.0f}{run['latency_s']['p90'] * 1000:>9.0f}"
+              f"{run['peak_rss_mb'] or 0:>9.0f}{run['output_bytes'] / 1024:>11.0f}"
+              f"{run['ssim_mean'] or 0:>8.4f}")
+        old = (baseline or {}).get(name)
+        if old and old.get('throughput_mp_s') and old.get('output_bytes'):
+            speed = (run['throughput_mp_s'] or 0) / old['throughput_mp_s'] - 1
+            size = run['output_bytes'] / old['output_bytes'] - 1
+            quality = (run['ssim_mean'] or 0) - (old['ssim_mean'] or 0)
+            print(f"{'':<4}↳ frente a la referencia: velocidad {speed:+.1%}, "
+                  f"salida {size:+.1%}, SSIM {quality:+.4f}")
+        if run['errors']:
+            print(f"{'':<4}✗ {run['errors']} imágenes con error")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Banco de pruebas de compresión de imágenes")
+    parser.add_argument('-o', '--output', type=Path, default=Path("benchmark_results.json"),
+                        help="Archivo JSON de resultados (por defecto: benchmark_results.json)")
+    parser.add_argument('--compare', type=Path, default=None, metavar='JSON',
+                        help="Resultados anteriores con los que comparar")
+    parser.add_argument('-s', '--strategy', action='append', choices=list(STRATEGIES),
+                        help="Estrategia a medir (se puede repetir; por defecto todas)")
+    parser.add_argument('--repeat', type=int, default=1,
+                        help="Veces que se codifica cada imagen (por defecto: 1)")
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED,
+                        help=f"Semilla del corpus (por defecto: {DEFAULT_SEED})")
+    parser.add_argument('--scale', type=float, default=1.0,
+                        help="Escala de las dimensiones del corpus (p. ej. 0.25 para una prueba rápida)")
+    parser.add_argument('--corpus', type=Path, default=CORPUS_FOLDER,
+                        help=f"Carpeta del corpus generado (por defecto: {CORPUS_FOLDER})")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    baseline = None
+    if args.compare:
+        baseline = json.loads(args.compare.read_text(encoding='utf-8'))
+        if baseline.get('corpus', {}).get('spec') != {'seed': args.seed, 'scale': args.scale}:
+            print("⚠️  La referencia se midió con otro corpus; la comparación no es directa")
+
+    paths = generate_corpus(args.corpus, args.seed, args.scale)
+    corpus = []
+    for path in paths:
+        with Image.open(path) as img:
+            corpus.append({'name': path.name, 'width': img.width, 'height': img.height,
+                           'mode': img.mode, 'bytes': path.stat().st_size})
+
+    results = run_benchmark(args.strategy or list(STRATEGIES), paths, args.repeat)
+
+    report = {
+        'version': 1,
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'environment': {
+            'python': platform.python_version(),
+            'pillow': PIL.__version__,
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'processor': platform.processor() or platform.machine(),
+        },
+        'corpus': {'spec': {'seed': args.seed, 'scale': args.scale}, 'images': corpus},
+        'repeat': args.repeat,
+        'strategies': results,
+    }
+    args.output.write_text(json.dumps(report, indent=2), encoding='utf-8')
+
+    print_table(results, baseline and baseline.get('strategies'))
+    print(f"\n💾 Resultados guardados en: {args.output}")
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,53 +1,378 @@
 #!/usr/bin/env python3
 """
-Script para limpiar archivos duplicados PNG/JPG después de la compresión
+Detección de imágenes duplicadas y casi duplicadas en img/
+
+Una sola pasada de os.scandir construye un índice con el tamaño, el hash
+de contenido (solo para archivos de igual tamaño) y dos hashes
+perceptuales calculados con NumPy:
+
+- dHash: signo del gradiente horizontal sobre una miniatura de 9x8
+- pHash: signo de los coeficientes DCT de baja frecuencia frente a su mediana
+
+Con el índice se agrupan:
+- Duplicados exactos: mismo contenido con distinto nombre
+- Casi duplicados: misma imagen con otro formato, compresión o resolución.
+  Los hashes solo proponen candidatos; cada par se confirma comparando
+  miniaturas de 64x64, porque mapas y portadas con la misma plantilla
+  (Figura_2_4/2_5, portada.png/PLADESHIportada.jpg) tienen hashes casi
+  iguales siendo figuras distintas. Esos pares se listan como parecidos
+  para revisarlos a mano y nunca se tocan.
+
+En cada grupo se conserva una imagen y el resto se puede eliminar
+(--remove) o, si son copias exactas, sustituir por enlaces duros al
+original conservado (--link). Nunca se elimina una imagen que algún .tex
+necesita si no queda otra con el mismo nombre.
+
+Uso:
+    python cleanup_duplicates.py            # solo informe
+    python cleanup_duplicates.py --remove   # eliminar copias redundantes
+    python cleanup_duplicates.py --link     # enlazar copias exactas
 """
 
 import os
+import argparse
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from PIL import Image
+from backup_store import link_or_copy
+from compression_manifest import (file_hash, load_manifest, save_manifest, known_output,
+                                  record, forget)
+from image_budget import IMAGE_EXTENSIONS
+from tex_images import referenced_images, image_key
+
+# Distancias de Hamming (de 64 bits) hasta las que dos imágenes son candidatas
+DHASH_MAX_DISTANCE = 10
+PHASH_MAX_DISTANCE = 10
+
+# Confirmación sobre miniaturas de THUMB_SIZE en grises: una recompresión
+# o un cambio de tamaño da diferencias medias de ~1 nivel; figuras
+# distintas con la misma plantilla, 4 o más
+THUMB_SIZE = 64
+THUMB_MAX_MEAN_DIFF = 3.0
+THUMB_DIFF_LEVEL = 24
+THUMB_MAX_DIFF_RATIO = 0.01
+
+# Diferencia máxima de proporción (ancho/alto) entre casi duplicados
+ASPECT_TOLERANCE = 0.03
+
+HASH_SIZE = 8
+PHASH_SIZE = 32
+
+def _dct_matrix(n):
+    """Matriz de la DCT-II ortonormal de tamaño n"""
+    k = np.arange(n)[:, None]
+    i = np.arange(n)[None, :]
+    matrix = np.cos(np.pi * (2 * i + 1) * k / (2 * n)) * np.sqrt(2 / n)
+    matrix[0] /= np.sqrt(2)
+    return matrix
+
+_DCT = _dct_matrix(PHASH_SIZE)
+
+def _pack(bits):
+    """64 booleanos → entero sin signo de 64 bits"""
+    return int(np.packbits(bits.ravel().astype(np.uint8)).view('>u8')[0])
+
+def perceptual_hashes(path):
+    """
+    dHash y pHash de una imagen (enteros de 64 bits), su tamaño y una
+    miniatura en grises de THUMB_SIZE para confirmar parecidos
+
+    Las transparencias se aplanan sobre blanco para que la versión PNG y
+    la JPEG de una misma figura coincidan.
+    """
+    with Image.open(path) as img:
+        size = img.size
+        img.draft('RGB', (PHASH_SIZE * 4, PHASH_SIZE * 4))
+        if img.mode in ('RGBA', 'LA', 'P'):
+            img = img.convert('RGBA')
+            background = Image.new('RGBA', img.size, (255, 255, 255, 255))
+            img = Image.alpha_composite(background, img)
+        gray = img.convert('L')
+
+    thumb = np.asarray(gray.resize((THUMB_SIZE, THUMB_SIZE), Image.Resampling.BOX))
+    small = np.asarray(gray.resize((HASH_SIZE + 1, HASH_SIZE), Image.Resampling.BOX),
+                       dtype=np.int16)
+    dhash = _pack(small[:, 1:] > small[:, :-1])
+
+    pixels = np.asarray(gray.resize((PHASH_SIZE, PHASH_SIZE), Image.Resampling.BOX),
+                        dtype=np.float64)
+    coefficients = (_DCT @ pixels @ _DCT.T)[:HASH_SIZE, :HASH_SIZE]
+    low = coefficients.ravel()[1:]  # sin el término DC
+    phash = _pack(coefficients > np.median(low))
+    return dhash, phash, size, thumb
+
+def _perceptual_or_error(path):
+    """perceptual_hashes para el pool: devuelve el error en vez de lanzarlo"""
+    try:
+        return perceptual_hashes(path)
+    except Exception as e:
+        return e
+
+def same_picture(thumb_a, thumb_b):
+    """True si dos miniaturas son la misma imagen salvo compresión o escala"""
+    diff = np.abs(thumb_a.astype(np.int16) - thumb_b.astype(np.int16))
+    return (diff.mean() <= THUMB_MAX_MEAN_DIFF
+            and np.mean(diff > THUMB_DIFF_LEVEL) <= THUMB_MAX_DIFF_RATIO)
+
+def scan_index(folder):
+    """
+    Índice de las imágenes de folder en una sola pasada de os.scandir
+
+    Returns:
+        lista de dicts con path, size, mtime_ns (y luego hash y pHash)
+    """
+    index = []
+    stack = [Path(folder)]
+    while stack:
+        current = stack.pop()
+        with os.scandir(current) as entries:
+            for entry in entries:
+                if entry.name.startswith('.'):
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(Path(entry.path))
+                elif entry.is_file() and Path(entry.name).suffix.lower() in IMAGE_EXTENSIONS:
+                    st = entry.stat()
+                    index.append({'path': Path(entry.path), 'size': st.st_size,
+                                  'inode': (st.st_dev, st.st_ino)})
+    index.sort(key=lambda item: item['path'].as_posix())
+    return index
+
+def _hamming(values):
+    """Matriz de distancias de Hamming entre enteros de 64 bits"""
+    array = np.array(values, dtype=np.uint64)
+    xor = array[:, None] ^ array[None, :]
+    return np.unpackbits(xor.view(np.uint8), axis=-1).reshape(len(values), len(values), 64).sum(-1)
+
+def _clusters(n, pairs):
+    """Componentes conexas (unión-búsqueda) de n elementos"""
+    parent = list(range(n))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
 
-def cleanup_duplicates():
-    """Elimina archivos PNG que tienen su equivalente JPG comprimido"""
-    
-    img_folder = Path("img")
-    removed_count = 0
-    space_freed = 0
-    
+    for a, b in pairs:
+        parent[find(a)] = find(b)
+    groups = {}
+    for i in range(n):
+        groups.setdefault(find(i), []).append(i)
+    return [g for g in groups.values() if len(g) > 1]
+
+def find_duplicates(index, jobs=None):
+    """
+    Agrupa duplicados exactos, casi duplicados y parecidos
+
+    Returns:
+        (exactos, casi_duplicados, parecidos): listas de grupos (listas de
+        entradas). Un casi duplicado agrupa imágenes distintas en bytes; de
+        cada copia exacta solo aparece la primera. Los parecidos son pares
+        con hashes cercanos que no pasan la confirmación.
+    """
+    # Hash de contenido solo cuando coincide el tamaño
+    by_size = {}
+    for item in index:
+        by_size.setdefault(item['size'], []).append(item)
+    by_hash = {}
+    for same_size in by_size.values():
+        if len(same_size) < 2:
+            continue
+        for item in same_size:
+            item['hash'] = file_hash(item['path'])
+            by_hash.setdefault(item['hash'], []).append(item)
+    exact = [group for group in by_hash.values() if len(group) > 1]
+
+    # Un representante por contenido para los hashes perceptuales
+    copies = {id(item): group for group in exact for item in group[1:]}
+    representatives = [item for item in index if id(item) not in copies]
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        hashes = list(executor.map(_perceptual_or_error,
+                                   [item['path'] for item in representatives], chunksize=8))
+    unique = []
+    for item, result in zip(representatives, hashes):
+        if isinstance(result, Exception):
+            print(f"  ✗ No se pudo leer {item['path']}: {result}")
+            continue
+        item['dhash'], item['phash'], item['dims'], item['thumb'] = result
+        unique.append(item)
+    for group in exact:
+        for item in group[1:]:
+            item['dims'] = group[0].get('dims')
+    if len(unique) < 2:
+        return exact, [], []
+
+    dhash = _hamming([item['dhash'] for item in unique])
+    phash = _hamming([item['phash'] for item in unique])
+    aspect = np.array([w / h for w, h in (item['dims'] for item in unique)])
+    similar_aspect = np.abs(np.log(aspect[:, None] / aspect[None, :])) <= ASPECT_TOLERANCE
+    close = (dhash <= DHASH_MAX_DISTANCE) & (phash <= PHASH_MAX_DISTANCE) & similar_aspect
+    confirmed, similar = [], []
+    for i, j in zip(*np.nonzero(np.triu(close, k=1))):
+        if same_picture(unique[i]['thumb'], unique[j]['thumb']):
+            confirmed.append((i, j))
+        else:
+            similar.append([unique[i], unique[j]])
+    near = [[unique[i] for i in group] for group in _clusters(len(unique), confirmed)]
+    return exact, near, similar
+
+def choose_keeper(group, referenced, manifest):
+    """
+    Imagen que se conserva en un grupo
+
+    Preferencia: la que usan los documentos, la que el manifiesto reconoce
+    como salida de la compresión, la de mayor resolución y, por último, la
+    más pequeña en disco.
+    """
+    def score(item):
+        dims = item.get('dims') or (0, 0)
+        return (image_key(item['path']) in referenced,
+                known_output(manifest, item['path']) is not None,
+                dims[0] * dims[1],
+                -item['size'])
+    return max(group, key=score)
+
+def plan_actions(exact, near, referenced, manifest, mode):
+    """
+    Acciones para dejar una sola copia de cada figura
+
+    Una imagen solo se retira si ningún .tex la necesita o si se conserva
+    otra con la misma clave (p. ej. x.jpg junto a x.png).
+
+    Returns:
+        lista de (acción, ruta, ruta_conservada, bytes_liberados)
+    """
+    actions = []
+    for group in exact:
+        keeper = choose_keeper(group, referenced, manifest)
+        for item in group:
+            if item is keeper or item['inode'] == keeper['inode']:
+                continue
+            needed = image_key(item['path']) in referenced
+            if mode == 'link':
+                actions.append(('link', item['path'], keeper['path'], item['size']))
+            elif mode == 'remove' and not needed:
+                actions.append(('remove', item['path'], keeper['path'], item['size']))
+    if mode != 'remove':
+        return actions
+
+    for group in near:
+        keeper = choose_keeper(group, referenced, manifest)
+        kept_keys = {image_key(keeper['path'])}
+        for item in group:
+            key = image_key(item['path'])
+            if item is keeper or (key in referenced and key not in kept_keys):
+                # Sigue siendo necesaria: se conserva y cubre su clave
+                kept_keys.add(key)
+                continue
+            actions.append(('remove', item['path'], keeper['path'], item['size']))
+    return actions
+
+def apply_actions(actions, manifest):
+    """
+    Ejecuta el plan y actualiza el manifiesto
+
+    Una copia enlazada tiene el mismo contenido que la conservada, así que
+    hereda su entrada (mismo original y parámetros); si la conservada no
+    tiene, la copia conserva la suya, renovada para el archivo nuevo.
+    """
+    for action, path, keeper, _ in actions:
+        if action == 'link':
+            entry = known_output(manifest, keeper) or known_output(manifest, path)
+            link_or_copy(keeper, path)
+            if entry is not None:
+                record(manifest, entry['key'], entry['source'], entry['source_hash'], path,
+                       entry.get('covers'))
+            else:
+                forget(manifest, path)
+        else:
+            os.unlink(path)
+            forget(manifest, path)
+    save_manifest(manifest)
+
+def _mb(size):
+    return size / (1024 * 1024)
+
+def cleanup_duplicates(folder=Path("img"), mode=None, tex_files=None):
+    """
+    Informa de los duplicados de folder y, según mode, los elimina o enlaza
+
+    Args:
+        mode: None (solo informe), 'remove' o 'link'
+        tex_files: documentos cuyas imágenes no se pueden retirar (por
+                   defecto, todos los .tex de la carpeta actual)
+    """
     print("🧹 LIMPIEZA DE ARCHIVOS DUPLICADOS")
     print("=" * 40)
-    
-    # Buscar todos los archivos JPG
-    jpg_files = list(img_folder.rglob("*.jpg"))
-    
-    for jpg_file in jpg_files:
-        # Buscar el PNG equivalente
-        png_file = jpg_file.with_suffix('.png')
-        
-        if png_file.exists():
-            # Obtener tamaños
-            png_size = png_file.stat().st_size / (1024*1024)
-            jpg_size = jpg_file.stat().st_size / (1024*1024)
-            
-            print(f"📁 {png_file.name}:")
-            print(f"   PNG: {png_size:.1f} MB")
-            print(f"   JPG: {jpg_size:.1f} MB")
-            
-            # Eliminar el PNG
-            png_file.unlink()
-            removed_count += 1
-            space_freed += png_size
-            
-            print(f"   ✅ PNG eliminado (liberados {png_size:.1f} MB)")
-            print()
-    
-    print("=" * 40)
+
+    index = scan_index(folder)
+    tex_files = tex_files if tex_files is not None else sorted(str(p) for p in Path('.').glob('*.tex'))
+    referenced = referenced_images(tex_files) if tex_files else set()
+    manifest = load_manifest()
+
+    exact, near, similar = find_duplicates(index)
+    actions = plan_actions(exact, near, referenced, manifest, mode)
+    planned = {path: action for action, path, _, _ in actions}
+
+    def show(title, groups):
+        if not groups:
+            return
+        print(f"\n{title}")
+        for group in groups:
+            keeper = choose_keeper(group, referenced, manifest)
+            print("📁 Grupo:")
+            for item in group:
+                dims = item.get('dims')
+                mark = "✅ se conserva" if item is keeper else {
+                    'remove': "🗑️  se elimina", 'link': "🔗 se enlaza"}.get(
+                        planned.get(item['path']), "· se mantiene")
+                detail = f"{dims[0]}x{dims[1]}, " if dims else ""
+                print(f"   {item['path'].relative_to(folder).as_posix()} "
+                      f"({detail}{_mb(item['size']):.2f} MB) {mark}")
+
+    show("🟰 DUPLICADOS EXACTOS", exact)
+    show("≈  CASI DUPLICADOS", near)
+    if similar:
+        print("\n🔍 PARECIDAS (misma plantilla, contenido distinto; no se tocan)")
+        for a, b in similar:
+            print(f"   {a['path'].relative_to(folder).as_posix()} ~ "
+                  f"{b['path'].relative_to(folder).as_posix()}")
+
+    total_size = sum(item['size'] for item in index)
+    freed = sum(size for _, _, _, size in actions)
+    if mode:
+        apply_actions(actions, manifest)
+
+    print("\n" + "=" * 40)
     print(f"📊 RESUMEN DE LIMPIEZA:")
-    print(f"Archivos PNG eliminados: {removed_count}")
-    print(f"Espacio liberado: {space_freed:.1f} MB")
-    
-    # Calcular tamaño total final
-    total_size = sum(f.stat().st_size for f in img_folder.rglob('*') if f.is_file()) / (1024*1024)
-    print(f"Tamaño total final: {total_size:.1f} MB")
+    print(f"Imágenes analizadas: {len(index)}")
+    print(f"Grupos de duplicados exactos: {len(exact)}")
+    print(f"Grupos de casi duplicados: {len(near)}")
+    print(f"Pares parecidos para revisar: {len(similar)}")
+    if mode:
+        print(f"Archivos eliminados: {sum(1 for a in actions if a[0] == 'remove')}")
+        print(f"Archivos enlazados: {sum(1 for a in actions if a[0] == 'link')}")
+        print(f"Espacio liberado: {_mb(freed):.1f} MB")
+        print(f"Tamaño total final: {_mb(total_size - freed):.1f} MB")
+    else:
+        print(f"Tamaño total: {_mb(total_size):.1f} MB")
+        print("Usa --remove o --link para aplicar los cambios")
+    return actions
+
+def main():
+    parser = argparse.ArgumentParser(description="Duplicados y casi duplicados en img/")
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('--remove', action='store_true',
+                       help="Eliminar las copias redundantes (exactas y casi duplicadas)")
+    group.add_argument('--link', action='store_true',
+                       help="Sustituir las copias exactas por enlaces duros a una sola")
+    parser.add_argument('--tex', nargs='+', default=None,
+                        help="Documentos cuyas imágenes se protegen (por defecto: todos los .tex)")
+    args = parser.parse_args()
+    mode = 'remove' if args.remove else 'link' if args.link else None
+    cleanup_duplicates(mode=mode, tex_files=args.tex)
 
 if __name__ == "__main__":
-    cleanup_duplicates()
\ No newline at end of file
+    main()
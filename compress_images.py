@@ -5,52 +5,181 @@ Objetivo: Reducir el tamaño del PDF final a menos de 10MB
 """
 
 import os
+import io
 import sys
-from PIL import Image, ImageOps
-import shutil
+import argparse
+from PIL import Image
 from pathlib import Path
+from contextlib import redirect_stdout
+from concurrent.futures import ProcessPoolExecutor
+from image_io import (flatten_to_rgb, encode_jpeg, encode_png, atomic_write,
+                      replace_image, rename_collisions, jpeg_path, load_reduced,
+                      peak_rss_mb)
+from image_quality import find_quality
+from watch_images import watch_folder
+from compression_worker import serve, DEFAULT_QUEUE
+from png_optimizer import optimize_folder, EFFORTS, DEFAULT_EFFORT
+from size_estimate import estimate_image, save_estimate, compare_estimate
+from run_report import (open_report, close_report, image_record, stage,
+                        describe_source, log_image, profiling, add_report_arguments)
+from image_classifier import (choose_format, to_palette, to_gray, gray_palette,
+                              FORMAT_JPEG, FORMAT_PALETTE, FORMAT_LOSSLESS)
+from image_budget import compress_to_budget, parse_size
+from tex_images import (pixel_limits, max_size_for, referenced_images, is_referenced,
+                        split_referenced)
+from backup_store import backup_file
+from compression_manifest import (load_manifest, save_manifest, params_key,
+                                  resolve_source, is_up_to_date, known_output,
+                                  record)
+
+# Límites de resolución usados por compress_images_in_folder
+MAX_WIDTH = 1920
+MAX_HEIGHT = 1080
+
+# Presupuesto por defecto para las imágenes (margen para el resto del PDF)
+DEFAULT_BUDGET_MB = 8
 
 def get_file_size_mb(filepath):
     """Obtiene el tamaño del archivo en MB"""
     return os.path.getsize(filepath) / (1024 * 1024)
 
-def compress_image(input_path, output_path, quality=85, max_width=1920, max_height=1080):
+def images_size_mb(folder, only=None):
+    """Tamaño total en MB de la carpeta (o de las imágenes en only)"""
+    return sum(get_file_size_mb(f) for f in Path(folder).rglob('*')
+               if f.is_file() and is_referenced(only, f))
+
+def encode_image(input_path, quality=85, max_width=1920, max_height=1080,
+                 auto_format=False, low_memory=False, max_memory=None,
+                 target_ssim=None, record=None):
     """
-    Comprime una imagen manteniendo buena calidad
+    Comprime una imagen en memoria manteniendo buena calidad
     
     Args:
         input_path: Ruta de la imagen original
-        output_path: Ruta donde guardar la imagen comprimida
         quality: Calidad JPEG (1-100, 85 es un buen balance)
         max_width: Ancho máximo en píxeles
         max_height: Alto máximo en píxeles
+        auto_format: Elegir entre JPEG y PNG según el contenido (solo para
+                     originales que no son JPEG)
+        low_memory: Decodificar ya reducido (draft JPEG / reduce entero)
+        max_memory: Bytes máximos para el búfer decodificado (implica low_memory)
+        target_ssim: Si se indica, en lugar de quality se usa la calidad JPEG
+                     más baja con SSIM >= target_ssim
+        record: registro de run_report donde anotar el origen, el formato,
+                la calidad y el tiempo de cada etapa
+    
+    Returns:
+        ('JPEG' o 'PNG', bytes) o None si hubo error
     """
+    low_memory = low_memory or bool(max_memory)
     try:
-        with Image.open(input_path) as img:
-            # Convertir a RGB si es necesario (para PNG con transparencia)
-            if img.mode in ('RGBA', 'LA', 'P'):
-                # Crear fondo blanco para transparencias
-                background = Image.new('RGB', img.size, (255, 255, 255))
-                if img.mode == 'P':
+        # Sin "with": así el búfer original se libera en cuanto se reemplaza
+        with stage(record, 'decode'):
+            img = Image.open(input_path)
+        try:
+            describe_source(record, img)
+            source_format = img.format
+            original_size = img.size
+            resized = False
+            with stage(record, 'decode'):
+                if low_memory:
+                    img = load_reduced(img, (max_width, max_height), max_memory)
+                    resized = img.size != original_size
+                else:
+                    img.load()
+            
+            fmt = FORMAT_JPEG
+            if auto_format and source_format != 'JPEG':
+                with stage(record, 'classify'):
+                    fmt, stats = choose_format(img)
+                if fmt != FORMAT_JPEG:
+                    print(f"  Formato {fmt}: {stats['colors']} colores, "
+                          f"{stats['flat_ratio']:.0%} plano")
+            
+            with stage(record, 'convert'):
+                if fmt == FORMAT_LOSSLESS:
+                    # Conservar la transparencia
                     img = img.convert('RGBA')
-                background.paste(img, mask=img.split()[-1] if img.mode == 'RGBA' else None)
-                img = background
-            elif img.mode != 'RGB':
-                img = img.convert('RGB')
+                else:
+                    # Convertir a RGB si es necesario (para PNG con transparencia)
+                    img = flatten_to_rgb(img)
+            
+            # Figuras grises: un canal en vez de tres desde antes de redimensionar
+            # (para PNG solo si los canales son idénticos: sin pérdida)
+            gray = False
+            if fmt != FORMAT_LOSSLESS:
+                with stage(record, 'classify'):
+                    img, gray = to_gray(img, lossless=fmt == FORMAT_PALETTE)
             
             # Redimensionar si es muy grande
-            original_size = img.size
-            if img.width > max_width or img.height > max_height:
-                img.thumbnail((max_width, max_height), Image.Resampling.LANCZOS)
+            with stage(record, 'resize'):
+                if img.width > max_width or img.height > max_height:
+                    img.thumbnail((max_width, max_height), Image.Resampling.LANCZOS)
+                    resized = True
+            if resized:
                 print(f"  Redimensionado de {original_size} a {img.size}")
+            if record is not None:
+                record.update(output_width=img.width, output_height=img.height)
+            
+            if gray and fmt == FORMAT_JPEG:
+                print("  Escala de grises")
+                if record is not None:
+                    record['gray'] = 'gray'
+            
+            if fmt == FORMAT_JPEG and target_ssim:
+                with stage(record, 'encode'):
+                    quality, data, score = find_quality(img, target_ssim)
+                print(f"  Calidad {quality} (SSIM {score:.4f})")
+                if record is not None:
+                    record.update(format='JPEG', quality=quality, ssim=round(score, 5))
+                return 'JPEG', data
             
-            # Optimizar y guardar como JPEG con calidad específica
-            img.save(output_path, 'JPEG', quality=quality, optimize=True, progressive=True)
+            if fmt == FORMAT_JPEG:
+                # Optimizar y codificar como JPEG con calidad específica
+                with stage(record, 'encode'):
+                    data = encode_jpeg(img, quality)
+                if record is not None:
+                    record.update(format='JPEG', quality=quality)
+                return 'JPEG', data
             
-            return True
+            with stage(record, 'encode'):
+                if fmt == FORMAT_PALETTE and gray:
+                    img, gray = gray_palette(img)
+                elif fmt == FORMAT_PALETTE:
+                    img = to_palette(img)
+                data = encode_png(img)
+            if gray:
+                print(f"  Escala de grises ({gray})")
+            if record is not None:
+                record.update(format='PNG', variant=fmt, **({'gray': gray} if gray else {}))
+            return 'PNG', data
+        finally:
+            img.close()
     except Exception as e:
         print(f"  Error procesando {input_path}: {e}")
+        if record is not None:
+            record['error'] = str(e)
+        return None
+
+def compress_image(input_path, output_path, quality=85, max_width=1920, max_height=1080,
+                   auto_format=False, low_memory=False, max_memory=None,
+                   target_ssim=None, record=None):
+    """
+    Comprime una imagen y la guarda en output_path
+    
+    Mismos argumentos que encode_image; la escritura es atómica.
+    
+    Returns:
+        'JPEG' o 'PNG' según el formato guardado, o False si hubo error
+    """
+    encoded = encode_image(input_path, quality, max_width, max_height, auto_format,
+                           low_memory, max_memory, target_ssim, record)
+    if encoded is None:
         return False
+    fmt, data = encoded
+    with stage(record, 'write'):
+        atomic_write(output_path, data)
+    return fmt
 
 def create_backup_folder():
     """Crea una carpeta de respaldo para las imágenes originales"""
@@ -60,8 +189,148 @@ def create_backup_folder():
         print(f"Creada carpeta de respaldo: {backup_folder}")
     return backup_folder
 
-def compress_images_in_folder(folder_path, backup_folder, quality=85):
-    """Comprime todas las imágenes en una carpeta"""
+def _compress_one(file_path, source_path, folder, backup_folder, quality,
+                  max_size=(MAX_WIDTH, MAX_HEIGHT), auto_format=False,
+                  max_memory=None, target_ssim=None, source_hash=None):
+    """
+    Respalda y comprime una sola imagen
+
+    Se ejecuta igual en modo serie y dentro del pool de procesos; la salida
+    de consola se captura y se devuelve para que el proceso principal la
+    imprima en orden.
+
+    Args:
+        file_path: imagen en img/ que se va a reemplazar
+        source_path: original a comprimir (file_path o su copia en img_backup/)
+        max_size: (ancho, alto) máximos en píxeles para esta imagen
+        auto_format: elegir JPEG o PNG según el contenido
+        max_memory: activar la decodificación de baja memoria con este
+                    límite en bytes (0 = sin límite, None = desactivada)
+        target_ssim: buscar la calidad más baja con este SSIM mínimo
+        source_hash: hash del original si ya se conoce (evita releerlo)
+
+    Returns:
+        dict con status ('compressed', 'kept' o 'error'), original_size,
+        compressed_size (MB), source_path, output_path, log (texto) y
+        record (registro de run_report)
+    """
+    log = io.StringIO()
+    with redirect_stdout(log):
+        if source_path == file_path:
+            # Misma estructura de carpetas en backup
+            relative_path = file_path.relative_to(folder)
+            backup_path = backup_folder / relative_path
+
+            # Hacer backup del original (se guarda una vez por contenido)
+            backup_file(file_path, backup_path, backup_folder, source_hash)
+        else:
+            # El archivo es una salida previa: se parte del original respaldado
+            backup_path = source_path
+
+        # Obtener tamaño original
+        original_size = get_file_size_mb(source_path)
+        output_path = file_path
+
+        print(f"Procesando: {file_path.name} ({original_size:.2f} MB)")
+        image = image_record(file_path, source=Path(source_path).as_posix(),
+                             bytes_before=os.path.getsize(source_path))
+
+        # Comprimir imagen en memoria: solo se escribe el resultado final
+        encoded = encode_image(source_path, quality=quality,
+                               max_width=max_size[0], max_height=max_size[1],
+                               auto_format=auto_format,
+                               low_memory=max_memory is not None,
+                               max_memory=max_memory or None,
+                               target_ssim=target_ssim, record=image)
+
+        # Solo se marca al quedarse con el archivo de img/ tal cual: un .jpg
+        # recomprimido en su sitio conserva la ruta pero sí se reescribió
+        kept_original = True
+        status = 'kept'
+        if encoded is not None:
+            fmt, data = encoded
+            compressed_size = len(data) / (1024 * 1024)
+
+            # Solo reemplazar si la compresión fue efectiva
+            if compressed_size < original_size:
+                # Cambiar extensión a .jpg (los PNG y JPEG conservan su nombre)
+                new_path = file_path.with_suffix('.png') if fmt == 'PNG' else jpeg_path(file_path)
+                with stage(image, 'write'):
+                    replace_image(file_path, new_path, data)
+                output_path = new_path
+                kept_original = False
+                status = 'compressed'
+
+                reduction = ((original_size - compressed_size) / original_size) * 100
+                print(f"  ✓ Comprimido: {compressed_size:.2f} MB (-{reduction:.1f}%)")
+            else:
+                # Si no hubo mejora, mantener original
+                compressed_size = get_file_size_mb(file_path)
+                print(f"  → Mantenido original (no hubo mejora)")
+        else:
+            status = 'error'
+            compressed_size = get_file_size_mb(file_path)
+            print(f"  ✗ Error en compresión, mantenido original")
+
+    image.update(output=Path(output_path).as_posix(), bytes_after=os.path.getsize(output_path),
+                 kept_original=kept_original)
+    return {
+        'status': status,
+        'original_size': original_size,
+        'compressed_size': compressed_size,
+        'source_path': backup_path,
+        'output_path': output_path,
+        'peak_rss_mb': peak_rss_mb(),
+        'log': log.getvalue(),
+        'record': image,
+    }
+
+def job_key(manifest, file_path, quality, limits=None, auto_format=False, target_ssim=None,
+            max_size=None, max_memory=None):
+    """
+    Original, tamaño máximo y clave de manifiesto de una imagen de img/
+
+    max_size, si se indica, reemplaza al límite de limits/MAX_WIDTH x MAX_HEIGHT.
+    max_memory forma parte de la clave: la decodificación de baja memoria
+    (draft/reduce y el tope, que es una estimación y no un límite real de
+    memoria) cambia los píxeles de partida y, por tanto, la salida.
+
+    Returns:
+        (source_path, source_hash, max_size, key)
+    """
+    source_path, source_hash = resolve_source(manifest, file_path)
+    max_size = max_size or max_size_for(limits, file_path, (MAX_WIDTH, MAX_HEIGHT))
+    key = params_key(source_hash, profile='compress_images', quality=quality,
+                     max_width=max_size[0], max_height=max_size[1],
+                     auto_format=auto_format,
+                     **({'ssim': target_ssim} if target_ssim else {}),
+                     **({'max_memory': max_memory} if max_memory is not None else {}))
+    return source_path, source_hash, max_size, key
+
+def compress_images_in_folder(folder_path, backup_folder, quality=85, jobs=None,
+                              limits=None, auto_format=False, max_memory=None,
+                              target_ssim=None, report=None, only=None):
+    """
+    Comprime todas las imágenes en una carpeta
+
+    Las imágenes que el manifiesto reconoce como ya comprimidas con los
+    mismos parámetros se saltan; las que son salidas de una pasada anterior
+    se recomprimen desde su original en backup_folder.
+
+    Args:
+        jobs: número de procesos (None = todos los núcleos, 1 = modo serie)
+        limits: límites de píxeles por imagen según su tamaño impreso
+                (tex_images.pixel_limits); las imágenes que no aparecen
+                usan MAX_WIDTH x MAX_HEIGHT
+        auto_format: elegir JPEG, PNG con paleta o PNG sin pérdida por imagen
+        max_memory: decodificación de baja memoria con límite en bytes por
+                    imagen (0 = sin límite, None = decodificación normal)
+        target_ssim: en lugar de quality fija, la calidad JPEG más baja que
+                     mantiene este SSIM (p. ej. 0.98)
+        report: informe de run_report al que añadir un registro por imagen
+        only: claves de tex_images.referenced_images; si se indica, solo se
+              procesan esas imágenes
+    """
     folder = Path(folder_path)
     if not folder.exists():
         print(f"La carpeta {folder_path} no existe")
@@ -73,78 +342,229 @@ def compress_images_in_folder(folder_path, backup_folder, quality=85):
     total_original_size = 0
     total_compressed_size = 0
     processed_count = 0
+    unchanged_count = 0
+    peak_memory = 0
     
     print(f"\nProcesando carpeta: {folder_path}")
     print("-" * 50)
     
-    for file_path in folder.rglob('*'):
-        if file_path.is_file() and file_path.suffix.lower() in image_extensions:
-            # Crear estructura de carpetas en backup
-            relative_path = file_path.relative_to(folder)
-            backup_path = backup_folder / relative_path
-            backup_path.parent.mkdir(parents=True, exist_ok=True)
-            
-            # Hacer backup del original
-            shutil.copy2(file_path, backup_path)
-            
-            # Obtener tamaño original
-            original_size = get_file_size_mb(file_path)
-            total_original_size += original_size
-            
-            print(f"Procesando: {file_path.name} ({original_size:.2f} MB)")
-            
-            # Comprimir imagen
-            temp_path = file_path.with_suffix('.tmp.jpg')
-            success = compress_image(file_path, temp_path, quality=quality)
-            
-            if success:
-                # Reemplazar archivo original con versión comprimida
-                compressed_size = get_file_size_mb(temp_path)
-                
-                # Solo reemplazar si la compresión fue efectiva
-                if compressed_size < original_size:
-                    # Cambiar extensión a .jpg
-                    new_path = file_path.with_suffix('.jpg')
-                    if new_path != file_path:
-                        file_path.unlink()  # Eliminar original
-                    temp_path.rename(new_path)
-                    
-                    total_compressed_size += compressed_size
-                    reduction = ((original_size - compressed_size) / original_size) * 100
-                    print(f"  ✓ Comprimido: {compressed_size:.2f} MB (-{reduction:.1f}%)")
-                else:
-                    # Si no hubo mejora, mantener original
-                    temp_path.unlink()
-                    total_compressed_size += original_size
-                    print(f"  → Mantenido original (no hubo mejora)")
+    # Listar antes de procesar para no recoger los .jpg recién generados
+    all_files = [f for f in folder.rglob('*')
+                 if f.is_file() and f.suffix.lower() in image_extensions]
+    
+    # x.png y x.jpg en la misma carpeta: convertir x.png pisaría x.jpg
+    collisions = rename_collisions(all_files)
+    for f, others in sorted(collisions.items()):
+        print(f"⚠️  Se deja sin comprimir {f.relative_to(folder).as_posix()}: su salida "
+              f"pisaría {', '.join(o.name for o in others)} (renombra uno de los dos)")
+    files = [f for f in all_files if is_referenced(only, f) and f not in collisions]
+    
+    manifest = load_manifest()
+    keys = {}
+    pending = []
+    for f in files:
+        source_path, source_hash, max_size, key = job_key(
+            manifest, f, quality, limits, auto_format, target_ssim, max_memory=max_memory)
+        if is_up_to_date(manifest, f, key):
+            continue
+        if source_path == f:
+            # Respaldar todos los originales antes de que escriba ningún proceso
+            backup_file(f, backup_folder / f.relative_to(folder), backup_folder, source_hash)
+        keys[f] = (key, source_hash)
+        pending.append((f, source_path, folder, backup_folder, quality, max_size,
+                        auto_format, max_memory, target_ssim, source_hash))
+    
+    jobs = jobs or os.cpu_count() or 1
+    jobs = min(jobs, len(pending)) or 1
+    
+    if jobs == 1:
+        results = (_compress_one(*a) for a in pending)
+    else:
+        print(f"Usando {jobs} procesos en paralelo")
+        executor = ProcessPoolExecutor(max_workers=jobs)
+        # map conserva el orden de entrada: los totales suman igual que en serie
+        results = executor.map(_compress_one, *zip(*pending))
+    results = iter(results)
+    
+    try:
+        for f in files:
+            if f in keys:
+                result = next(results)
+                print(result['log'], end='')
+                key, source_hash = keys[f]
+                if result['status'] != 'error':
+                    # Un error no se anota: la próxima ejecución lo reintenta
+                    record(manifest, key, result['source_path'], source_hash,
+                           result['output_path'])
+                log_image(report, result['record'])
+                total_original_size += result['original_size']
+                total_compressed_size += result['compressed_size']
+                peak_memory = max(peak_memory, result['peak_rss_mb'] or 0)
             else:
-                total_compressed_size += original_size
-                print(f"  ✗ Error en compresión, mantenido original")
-            
+                entry = known_output(manifest, f)
+                total_original_size += get_file_size_mb(entry['source'])
+                total_compressed_size += get_file_size_mb(f)
+                unchanged_count += 1
             processed_count += 1
+    finally:
+        if jobs > 1:
+            executor.shutdown()
+        save_manifest(manifest)
     
     # Mostrar resumen
     print("\n" + "=" * 50)
     print("RESUMEN DE COMPRESIÓN")
     print("=" * 50)
     print(f"Archivos procesados: {processed_count}")
+    print(f"Sin cambios (según manifiesto): {unchanged_count}")
     print(f"Tamaño original total: {total_original_size:.2f} MB")
     print(f"Tamaño comprimido total: {total_compressed_size:.2f} MB")
     if total_original_size > 0:
         total_reduction = ((total_original_size - total_compressed_size) / total_original_size) * 100
         print(f"Reducción total: {total_reduction:.1f}%")
+    if peak_memory:
+        print(f"Pico de memoria por proceso: {peak_memory:.0f} MB")
     print(f"Respaldo guardado en: {backup_folder}")
 
+def _estimate_one(file_path, source_path, quality, max_size, auto_format, target_ssim):
+    """Estimación de una imagen (modo serie o dentro del pool)"""
+    original = os.path.getsize(source_path)
+    try:
+        estimate = estimate_image(source_path, quality, max_size, auto_format, target_ssim)
+    except Exception as e:
+        return {'error': str(e), 'output_path': file_path, 'bytes': os.path.getsize(file_path),
+                'original': original}
+    if estimate['bytes'] >= original:
+        # compress_images_in_folder mantendría el original
+        return {'output_path': file_path, 'bytes': os.path.getsize(file_path),
+                'original': original, 'kept': True, **{k: estimate[k] for k in ('format', 'exact')}}
+    new_path = (file_path.with_suffix('.png') if estimate['format'] == 'PNG'
+                else jpeg_path(file_path))
+    return {'output_path': new_path, 'bytes': estimate['bytes'], 'original': original,
+            'kept': False, 'format': estimate['format'], 'exact': estimate['exact']}
+
+def estimate_folder(folder_path, quality=85, jobs=None, limits=None, auto_format=False,
+                    target_ssim=None, only=None):
+    """
+    Predice el resultado de compress_images_in_folder sin escribir nada
+
+    Las imágenes al día según el manifiesto cuentan con su tamaño actual;
+    el resto se estima codificando un mosaico de teselas (size_estimate).
+    Con only se limitan a las imágenes referenciadas por los documentos.
+
+    Returns:
+        dict ruta de salida prevista → bytes estimados
+    """
+    folder = Path(folder_path)
+    image_extensions = {'.png', '.jpg', '.jpeg', '.bmp', '.tiff', '.tif'}
+    files = [f for f in folder.rglob('*')
+             if f.is_file() and f.suffix.lower() in image_extensions
+             and is_referenced(only, f)]
+    
+    manifest = load_manifest()
+    predictions = {}
+    pending = []
+    for f in files:
+        source_path, source_hash, max_size, key = job_key(
+            manifest, f, quality, limits, auto_format, target_ssim)
+        if is_up_to_date(manifest, f, key):
+            predictions[f.as_posix()] = f.stat().st_size
+            continue
+        pending.append((f, source_path, quality, max_size, auto_format, target_ssim))
+    
+    print(f"\n📐 Estimando {len(pending)} imágenes ({len(predictions)} sin cambios)...")
+    print("-" * 50)
+    jobs = min(jobs or os.cpu_count() or 1, len(pending)) or 1
+    if jobs == 1:
+        results = [_estimate_one(*a) for a in pending]
+    else:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            results = list(executor.map(_estimate_one, *zip(*pending)))
+    
+    total_original = 0
+    for (f, *_), result in zip(pending, results):
+        predictions[result['output_path'].as_posix()] = result['bytes']
+        total_original += result['original']
+        if result.get('error'):
+            print(f"  ✗ {f.name}: {result['error']}")
+        elif result['kept']:
+            print(f"  → {f.name}: se mantendría el original")
+        else:
+            method = "exacto" if result['exact'] else "muestreo"
+            print(f"  {f.name}: {result['original'] / (1024 * 1024):.2f} MB → "
+                  f"~{result['bytes'] / (1024 * 1024):.2f} MB ({result['format']}, {method})")
+    
+    total = sum(predictions.values())
+    print("\n" + "=" * 50)
+    print("ESTIMACIÓN (img/ no se ha modificado)")
+    print("=" * 50)
+    print(f"Tamaño original de las pendientes: {total_original / (1024 * 1024):.2f} MB")
+    print(f"Tamaño total estimado: {total / (1024 * 1024):.2f} MB")
+    return predictions
+
+def parse_args(argv=None):
+    """Argumentos de línea de comandos"""
+    parser = argparse.ArgumentParser(description="Compresor de imágenes para PDF")
+    parser.add_argument('--jobs', '-j', type=int, default=None,
+                        help="Procesos en paralelo (por defecto: todos los núcleos)")
+    parser.add_argument('--budget', type=parse_size, default=None,
+                        help="Presupuesto total de imágenes, p. ej. 8MB "
+                             "(elige calidad y resolución por imagen)")
+    parser.add_argument('--dpi', type=int, default=None,
+                        help="Redimensionar según el tamaño impreso en los .tex "
+                             "(p. ej. 300 para impresión, 150 para pantalla)")
+    parser.add_argument('--auto-format', action='store_true',
+                        help="Elegir JPEG, PNG con paleta o PNG sin pérdida según el contenido")
+    parser.add_argument('--ssim', type=float, default=None, metavar='MIN',
+                        help="Buscar por imagen la calidad JPEG más baja con SSIM >= MIN "
+                             "(p. ej. 0.98) en lugar de la calidad fija")
+    parser.add_argument('--low-memory', action='store_true',
+                        help="Decodificar ya reducido (draft JPEG / reduce) para ahorrar memoria")
+    parser.add_argument('--max-memory', type=int, default=None, metavar='MB',
+                        help="Límite de memoria por imagen decodificada (implica --low-memory)")
+    parser.add_argument('--estimate', '--dry-run', action='store_true',
+                        help="Solo estimar el tamaño final (muestreando cada imagen) "
+                             "sin modificar img/")
+    parser.add_argument('--lossless-png', action='store_true',
+                        help="Optimizar los PNG sin pérdida (mismos píxeles, mismo nombre) "
+                             "en lugar de recomprimirlos")
+    parser.add_argument('--png-effort', choices=sorted(EFFORTS), default=DEFAULT_EFFORT,
+                        help="Combinaciones que prueba --lossless-png (por defecto normal)")
+    parser.add_argument('--watch', action='store_true',
+                        help="Quedarse vigilando img/ y comprimir cada imagen nueva o "
+                             "modificada en segundo plano")
+    parser.add_argument('--serve', action='store_true',
+                        help="Quedarse abierto atendiendo solicitudes JSON Lines de compresión "
+                             "(entrada estándar o --socket)")
+    parser.add_argument('--socket', default=None, metavar='RUTA',
+                        help="Con --serve, escuchar en este socket Unix")
+    parser.add_argument('--queue', type=int, default=DEFAULT_QUEUE, metavar='N',
+                        help=f"Con --serve, solicitudes en curso o en espera como máximo "
+                             f"(por defecto {DEFAULT_QUEUE})")
+    parser.add_argument('--document', '-d', nargs='+', default=None, metavar='TEX',
+                        help="Comprimir solo las imágenes que usan estos .tex "
+                             "(y listar las que no usa ninguno)")
+    parser.add_argument('--tex', nargs='+', default=None,
+                        help="Documentos .tex para --dpi (por defecto: los de --document "
+                             "o todos los de la carpeta)")
+    add_report_arguments(parser)
+    return parser.parse_args(argv)
+
 def main():
     """Función principal"""
+    args = parse_args()
+    
+    # En modo servicio por la entrada estándar, la salida estándar queda
+    # reservada para las respuestas JSON; los mensajes van a la de errores
+    responses = None
+    if args.serve and not args.socket:
+        responses, sys.stdout = sys.stdout.buffer, sys.stderr
+    
     print("🖼️  COMPRESOR DE IMÁGENES PARA PDF")
     print("=" * 50)
     print("Objetivo: Reducir tamaño de imágenes para PDF < 10MB")
     print("Manteniendo la mejor calidad posible")
     
-    # Crear carpeta de respaldo
-    backup_folder = create_backup_folder()
-    
     # Comprimir imágenes con diferentes niveles de calidad
     img_folder = Path("img")
     
@@ -152,32 +572,137 @@ def main():
         print("❌ No se encontró la carpeta 'img'")
         return
     
-    # Primer intento con calidad alta (92)
-    print("\n🔄 Iniciando compresión con calidad alta (92%)...")
-    compress_images_in_folder(img_folder, backup_folder, quality=92)
+    # Decodificación de baja memoria: None = normal, 0 = sin límite
+    max_memory = None
+    if args.max_memory:
+        max_memory = args.max_memory * 1024 * 1024
+    elif args.low_memory:
+        max_memory = 0
     
-    # Calcular tamaño total actual
-    total_size = sum(get_file_size_mb(f) for f in img_folder.rglob('*') if f.is_file())
-    print(f"\n📊 Tamaño total actual de imágenes: {total_size:.2f} MB")
+    # Solo las imágenes que usan los documentos indicados
+    only = None
+    if args.document:
+        only = referenced_images(args.document)
+        image_extensions = {'.png', '.jpg', '.jpeg', '.bmp', '.tiff', '.tif'}
+        files = sorted(f for f in img_folder.rglob('*')
+                       if f.is_file() and f.suffix.lower() in image_extensions)
+        used, unused, missing = split_referenced(files, only)
+        print(f"\n📄 {len(used)} imágenes usadas por {len(args.document)} documentos; "
+              f"{len(unused)} sin usar (no se tocan):")
+        for f in unused:
+            print(f"   · {f.relative_to(img_folder).as_posix()}")
+        for key in missing:
+            print(f"   ⚠️  Referenciada pero no encontrada: {key}")
     
-    # Si aún es muy grande, ofrecer compresión adicional
-    if total_size > 8:  # Dejamos margen para el resto del PDF
-        print("\n⚠️  Las imágenes aún ocupan mucho espacio.")
-        response = input("¿Deseas aplicar compresión adicional? (s/n): ").lower().strip()
-        
-        if response == 's':
-            print("\n🔄 Aplicando compresión adicional (calidad 70%)...")
-            compress_images_in_folder(img_folder, backup_folder, quality=70)
+    # Límites de resolución según el tamaño al que se imprime cada figura
+    limits = None
+    if args.dpi:
+        tex_files = (args.tex or args.document
+                     or sorted(str(p) for p in Path('.').glob('*.tex')))
+        limits = pixel_limits(tex_files, dpi=args.dpi)
+        print(f"\n📐 {len(limits)} imágenes referenciadas en {len(tex_files)} documentos "
+              f"({args.dpi} DPI)")
+    
+    # Una estimación solo se compara con una compresión de mismos parámetros
+    estimate_params = {'quality': 92, 'auto_format': args.auto_format, 'ssim': args.ssim,
+                       'dpi': args.dpi, 'tex': args.tex, 'document': args.document}
+    if args.estimate:
+        if args.budget:
+            print("\nℹ️  Con --budget el total es como mucho el presupuesto; "
+                  "se estima la pasada normal (calidad 92)")
+        predictions = estimate_folder(img_folder, quality=92, jobs=args.jobs, limits=limits,
+                                      auto_format=args.auto_format, target_ssim=args.ssim,
+                                      only=only)
+        save_estimate(estimate_params, predictions)
+        total_mb = sum(predictions.values()) / (1024 * 1024)
+        if total_mb > DEFAULT_BUDGET_MB:
+            print(f"⚠️  Supera {DEFAULT_BUDGET_MB} MB: la compresión real ajustaría "
+                  f"al presupuesto después de la primera pasada")
+        else:
+            print(f"✅ Cabe en {DEFAULT_BUDGET_MB} MB con la primera pasada")
+        return
+    
+    # Crear carpeta de respaldo
+    backup_folder = create_backup_folder()
+    
+    # El perfilado solo ve el proceso principal: con --profile se trabaja en serie
+    jobs = args.jobs
+    if args.profile:
+        print("🔬 Perfilado activado: se procesa en modo serie")
+        jobs = 1
+    report = open_report(args.report, 'compress_images')
+    
+    if args.lossless_png:
+        with profiling(args.profile, args.profile_output):
+            optimize_folder(img_folder, backup_folder, jobs=jobs, effort=args.png_effort,
+                            only=only, report=report)
+        close_report(report)
+        return
+    
+    if args.serve:
+        serve(img_folder, backup_folder, quality=92, jobs=args.jobs, limits=limits,
+              auto_format=args.auto_format, max_memory=max_memory, target_ssim=args.ssim,
+              report=report, socket_path=args.socket, queue_size=args.queue,
+              responses=responses)
+        close_report(report)
+        return
+    
+    if args.watch:
+        watch_folder(img_folder, backup_folder, quality=92, jobs=args.jobs, limits=limits,
+                     auto_format=args.auto_format, max_memory=max_memory,
+                     target_ssim=args.ssim, only=only, report=report)
+        close_report(report)
+        return
+    
+    with profiling(args.profile, args.profile_output):
+        if args.budget:
+            compress_to_budget(img_folder, args.budget, jobs=jobs,
+                               max_size=(MAX_WIDTH, MAX_HEIGHT), backup_folder=backup_folder,
+                               limits=limits, report=report, only=only)
+        else:
+            # Primer intento con calidad alta (92)
+            print("\n🔄 Iniciando compresión con calidad alta (92%)...")
+            compress_images_in_folder(img_folder, backup_folder, quality=92, jobs=jobs,
+                                      limits=limits, auto_format=args.auto_format,
+                                      max_memory=max_memory, target_ssim=args.ssim,
+                                      report=report, only=only)
             
-            total_size = sum(get_file_size_mb(f) for f in img_folder.rglob('*') if f.is_file())
-            print(f"\n📊 Tamaño final de imágenes: {total_size:.2f} MB")
+            # Precisión de la última estimación (--estimate), si la hay
+            accuracy = compare_estimate(estimate_params)
+            if accuracy:
+                print(f"\n📐 Estimación previa: {accuracy['predicted'] / (1024 * 1024):.2f} MB, "
+                      f"real {accuracy['actual'] / (1024 * 1024):.2f} MB "
+                      f"(error total {accuracy['error']:+.1%}, "
+                      f"medio por imagen {accuracy['mean_abs_error']:.1%})")
+        
+            # Calcular tamaño total actual
+            total_size = images_size_mb(img_folder, only)
+            print(f"\n📊 Tamaño total actual de imágenes: {total_size:.2f} MB")
+        
+            # Si aún es muy grande, ajustar automáticamente al presupuesto
+            if total_size > DEFAULT_BUDGET_MB:  # Dejamos margen para el resto del PDF
+                print("\n⚠️  Las imágenes aún ocupan mucho espacio.")
+                print(f"🔄 Ajustando al presupuesto de {DEFAULT_BUDGET_MB} MB...")
+                # Cada salida ajustada cuenta también como hecha por la pasada de
+                # calidad 92: repetir el script sin cambios no recomprime nada
+                def upstream_key(manifest, path):
+                    return job_key(manifest, path, 92, limits, args.auto_format, args.ssim,
+                                   max_memory=max_memory)[3]
+                compress_to_budget(img_folder, DEFAULT_BUDGET_MB * 1024 * 1024, jobs=jobs,
+                                   max_size=(MAX_WIDTH, MAX_HEIGHT), backup_folder=backup_folder,
+                                   limits=limits, report=report, only=only,
+                                   upstream_key=upstream_key)
+    
+    total_size = images_size_mb(img_folder, only)
+    print(f"\n📊 Tamaño final de imágenes: {total_size:.2f} MB")
+    close_report(report, final_mb=round(total_size, 3))
     
     print("\n✅ ¡Compresión completada!")
     print(f"📁 Originales respaldados en: {backup_folder}")
     print("\n💡 Consejos:")
     print("- Si el PDF sigue siendo muy grande, puedes ejecutar el script nuevamente")
     print("- Los originales están seguros en la carpeta de respaldo")
-    print("- Para restaurar originales, copia desde img_backup/ a img/")
+    print("- Para restaurar originales: python backup_store.py --restore")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -4,54 +4,148 @@ Script rápido para comprimir imágenes - Versión simplificada
 """
 
 import os
+import argparse
 from PIL import Image
 from pathlib import Path
-import shutil
+from image_io import encode_jpeg, atomic_write, replace_image, jpeg_path
+from image_classifier import to_gray
+from tex_images import referenced_images, is_referenced
+from run_report import (open_report, close_report, image_record, stage,
+                        describe_source, log_image, profiling, add_report_arguments)
+from backup_store import backup_file, backup_folder_tree
+from compression_manifest import (load_manifest, save_manifest, params_key,
+                                  resolve_source, is_up_to_date, record,
+                                  file_hash)
+from batch_journal import (begin_batch, resume_batch, end_batch, close_journal, log_op,
+                           protect, pending_paths, check_pending, add_journal_arguments)
 
-def compress_all_images():
-    """Comprime todas las imágenes de manera rápida y efectiva"""
+# Parámetros fijos de esta versión rápida
+QUALITY = 90
+MAX_WIDTH = 3000
+
+def encode_quick(source_path, record=None):
+    """Codifica una imagen como JPEG de calidad QUALITY y ancho máximo MAX_WIDTH"""
+    with Image.open(source_path) as img:
+        describe_source(record, img)
+        with stage(record, 'decode'):
+            img.load()
+        
+        # Convertir a RGB si es necesario
+        with stage(record, 'convert'):
+            if img.mode != 'RGB':
+                img = img.convert('RGB')
+            img, _ = to_gray(img)
+        
+        # Redimensionar si es muy grande (máximo 3000px de ancho)
+        with stage(record, 'resize'):
+            if img.width > MAX_WIDTH:
+                ratio = MAX_WIDTH / img.width
+                new_height = int(img.height * ratio)
+                img = img.resize((MAX_WIDTH, new_height), Image.Resampling.LANCZOS)
+        
+        # Codificar como JPG con buena calidad (en memoria)
+        with stage(record, 'encode'):
+            return encode_jpeg(img, QUALITY, progressive=False)
+
+def _compress_file(file_path, img_folder, backup_folder, manifest, journal=None, report=None):
+    """
+    Comprime una imagen de img/ a JPEG, anotando cada paso en el diario
+
+    Returns:
+        (bytes antes, bytes después), o None si ya estaba al día
+    """
+    backup_path = backup_folder / file_path.relative_to(img_folder)
+    if file_path.exists():
+        # Las salidas previas se recomprimen desde su original
+        source_path, source_hash = resolve_source(manifest, file_path)
+    else:
+        # Lote interrumpido tras borrar el PNG: se parte de su respaldo
+        source_path, source_hash = backup_path, file_hash(backup_path)
+    key = params_key(source_hash, profile='compress_quick',
+                     quality=QUALITY, max_width=MAX_WIDTH)
+    if is_up_to_date(manifest, file_path, key):
+        log_op(journal, 'done', file_path, skipped=True)
+        return None
+    
+    if source_path == file_path:
+        # Imagen nueva: respaldarla antes de poder borrarla. Si el respaldo
+        # tenía otro contenido (se sustituyó la imagen), el nuevo original
+        # pasa a ser el respaldo; el anterior sigue en el almacén
+        backup_file(file_path, backup_path, backup_folder, source_hash)
+        source_path = backup_path
+        log_op(journal, 'backup', file_path, backup=backup_path.as_posix())
+    
+    # Abrir y comprimir
+    image = image_record(file_path, source=source_path.as_posix(), format='JPEG',
+                         quality=QUALITY, bytes_before=source_path.stat().st_size)
+    data = encode_quick(source_path, image)
+    log_op(journal, 'encode', file_path, bytes=len(data))
+    
+    # Escribir una sola vez y eliminar el original si era PNG
+    final_path = jpeg_path(file_path)
+    removes_original = file_path.suffix.lower() == '.png'
+    protect(journal, final_path, manifest)
+    if removes_original:
+        protect(journal, file_path, manifest)
+    with stage(image, 'write'):
+        if removes_original:
+            replace_image(file_path, final_path, data)
+        else:
+            atomic_write(final_path, data)
+    log_op(journal, 'replace', final_path,
+           removed=file_path.as_posix() if removes_original else None)
+    
+    # El manifiesto se guarda por imagen: una interrupción no pierde lo hecho
+    record(manifest, key, source_path, source_hash, final_path)
+    save_manifest(manifest)
+    log_op(journal, 'done', file_path)
+    image.update(output=final_path.as_posix(), bytes_after=len(data))
+    log_image(report, image)
+    return image['bytes_before'], len(data)
+
+def compress_all_images(report=None, only=None, state=None):
+    """
+    Comprime todas las imágenes de manera rápida y efectiva
+
+    Con report (run_report.open_report) se registra cada imagen procesada.
+    Con only (tex_images.referenced_images) solo se procesan esas imágenes.
+    Con state (batch_journal.read_journal) se reanuda un lote interrumpido:
+    solo se procesan sus imágenes pendientes.
+    """
     
     # Crear backup
     if not os.path.exists("img_backup"):
-        shutil.copytree("img", "img_backup")
+        backup_folder_tree("img", "img_backup")
         print("✅ Backup creado en img_backup/")
     
     img_folder = Path("img")
+    backup_folder = Path("img_backup")
     total_before = 0
     total_after = 0
     count = 0
+    skipped = 0
+    manifest = load_manifest()
     
-    # Procesar todas las imágenes
-    for file_path in img_folder.rglob("*"):
-        if file_path.suffix.lower() in ['.png', '.jpg', '.jpeg', '.bmp']:
+    # Procesar todas las imágenes (o las pendientes del lote interrumpido)
+    if state is None:
+        files = [f for f in img_folder.rglob("*")
+                 if f.suffix.lower() in ['.png', '.jpg', '.jpeg', '.bmp']
+                 and is_referenced(only, f)]
+        journal = begin_batch('compress_quick', files,
+                              {'quality': QUALITY, 'max_width': MAX_WIDTH})
+    else:
+        files = pending_paths(state)
+        journal = resume_batch(state)
+    try:
+        for file_path in files:
             try:
-                # Tamaño original
-                size_before = file_path.stat().st_size / (1024*1024)
+                result = _compress_file(file_path, img_folder, backup_folder, manifest,
+                                        journal, report)
+                if result is None:
+                    skipped += 1
+                    continue
+                size_before, size_after = (b / (1024*1024) for b in result)
                 total_before += size_before
-                
-                # Abrir y comprimir
-                with Image.open(file_path) as img:
-                    # Convertir a RGB si es necesario
-                    if img.mode != 'RGB':
-                        img = img.convert('RGB')
-                    
-                    # Redimensionar si es muy grande (máximo 3000px de ancho)
-                    if img.width > 3000:
-                        ratio = 3000 / img.width
-                        new_height = int(img.height * ratio)
-                        img = img.resize((3000, new_height), Image.Resampling.LANCZOS)
-                    
-                    # Guardar como JPG con buena calidad
-                    new_path = file_path.with_suffix('.jpg')
-                    img.save(new_path, 'JPEG', quality=90, optimize=True)
-                    
-                    # Eliminar original si era PNG
-                    if file_path.suffix.lower() == '.png' and new_path != file_path:
-                        file_path.unlink()
-                
-                # Tamaño después
-                final_path = file_path.with_suffix('.jpg')
-                size_after = final_path.stat().st_size / (1024*1024)
                 total_after += size_after
                 
                 reduction = ((size_before - size_after) / size_before) * 100
@@ -60,14 +154,39 @@ def compress_all_images():
                 
             except Exception as e:
                 print(f"✗ Error con {file_path.name}: {e}")
+    except KeyboardInterrupt:
+        close_journal(journal)
+        print("\n⏹️  Interrumpido. Para terminar solo lo pendiente: "
+              "python compress_quick.py --resume (o --rollback para deshacerlo)")
+        return
+    save_manifest(manifest)
+    end_batch(journal)
     
     # Resumen
     print(f"\n📊 RESUMEN:")
     print(f"Archivos procesados: {count}")
+    print(f"Sin cambios (según manifiesto): {skipped}")
     print(f"Tamaño total antes: {total_before:.1f} MB")
     print(f"Tamaño total después: {total_after:.1f} MB")
-    print(f"Reducción: {((total_before-total_after)/total_before)*100:.0f}%")
+    if total_before > 0:
+        print(f"Reducción: {((total_before-total_after)/total_before)*100:.0f}%")
     print(f"Backup en: img_backup/")
 
+def main():
+    parser = argparse.ArgumentParser(description="Compresión rápida de img/ (JPEG 90, 3000 px)")
+    parser.add_argument('--document', '-d', nargs='+', default=None, metavar='TEX',
+                        help="Procesar solo las imágenes que usan estos .tex")
+    add_journal_arguments(parser)
+    add_report_arguments(parser)
+    args = parser.parse_args()
+    action, state = check_pending('compress_quick', args.resume, args.rollback)
+    if action == 'stop':
+        return
+    only = referenced_images(args.document) if args.document else None
+    report = open_report(args.report, 'compress_quick')
+    with profiling(args.profile, args.profile_output):
+        compress_all_images(report, only, state)
+    close_report(report)
+
 if __name__ == "__main__":
-    compress_all_images()
\ No newline at end of file
+    main()
\ No newline at end of file
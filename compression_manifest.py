@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Manifiesto persistente de compresión de imágenes
+
+Registra, por cada imagen generada en img/, el hash del original del que
+salió, los parámetros usados (calidad, max_width/max_height) y el hash y
+tamaño del resultado. Con eso los scripts de compresión pueden:
+
+- Saltar las imágenes que ya están comprimidas con los mismos parámetros
+- Reconocer sus propias salidas y volver al original en img_backup/ en vez
+  de recomprimir un JPEG ya comprimido (pérdida generacional)
+"""
+
+import os
+import json
+import hashlib
+from pathlib import Path
+
+MANIFEST_PATH = Path(".compression_manifest.json")
+MANIFEST_VERSION = 1
+
+def file_hash(filepath):
+    """Hash SHA-256 del contenido de un archivo"""
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _rel(path):
+    """Ruta normalizada para usar como clave en el manifiesto"""
+    return Path(path).as_posix()
+
+def params_key(source_hash, **params):
+    """Clave de una compresión: hash del original + parámetros"""
+    encoded = json.dumps(params, sort_keys=True)
+    return f"{source_hash}:{encoded}"
+
+def load_manifest(path=MANIFEST_PATH):
+    """Carga el manifiesto (o uno vacío si no existe o está dañado)"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest.get('version') == MANIFEST_VERSION:
+            return manifest
+    except (OSError, ValueError):
+        pass
+    return {'version': MANIFEST_VERSION, 'outputs': {}}
+
+def save_manifest(manifest, path=MANIFEST_PATH):
+    """Guarda el manifiesto de forma atómica"""
+    path = Path(path)
+    tmp_path = path.with_name(path.name + '.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+def _matches(entry, filepath):
+    """Comprueba si un archivo es exactamente la salida registrada"""
+    try:
+        st = os.stat(filepath)
+    except OSError:
+        return False
+    if st.st_size != entry['output_size']:
+        return False
+    # Camino rápido: mismo tamaño y fecha, no hace falta leer el archivo
+    if st.st_mtime_ns == entry.get('output_mtime_ns'):
+        return True
+    return file_hash(filepath) == entry['output_hash']
+
+def known_output(manifest, filepath):
+    """Devuelve la entrada si el archivo es una salida registrada intacta"""
+    entry = manifest['outputs'].get(_rel(filepath))
+    if entry and _matches(entry, filepath):
+        return entry
+    return None
+
+def resolve_source(manifest, filepath):
+    """
+    Determina el original del que debe comprimirse una imagen de img/
+
+    Si el archivo es una salida nuestra, el original es su copia en
+    img_backup/; así una salida nunca vuelve a entrar como fuente.
+
+    Returns:
+        (ruta_original, hash_original)
+    """
+    entry = known_output(manifest, filepath)
+    if entry is not None:
+        source = Path(entry['source'])
+        if source.exists():
+            return source, entry['source_hash']
+    return Path(filepath), file_hash(filepath)
+
+def is_up_to_date(manifest, output_path, key):
+    """
+    True si output_path ya es el resultado de la compresión `key`
+
+    También lo es si la salida la escribió una pasada posterior que
+    sustituye a `key` (la anota en 'covers'), como el ajuste al presupuesto
+    que sigue a la pasada de calidad 92.
+    """
+    entry = known_output(manifest, output_path)
+    return entry is not None and (entry['key'] == key or key in entry.get('covers', ()))
+
+def record(manifest, key, source_path, source_hash, output_path, covers=None):
+    """
+    Registra una salida recién escrita
+
+    covers: claves de pasadas anteriores a las que esta salida sustituye
+    """
+    st = os.stat(output_path)
+    entry = manifest['outputs'][_rel(output_path)] = {
+        'key': key,
+        'source': _rel(source_path),
+        'source_hash': source_hash,
+        'output_hash': file_hash(output_path),
+        'output_size': st.st_size,
+        'output_mtime_ns': st.st_mtime_ns,
+    }
+    if covers:
+        entry['covers'] = sorted(set(covers))
+
+def forget(manifest, output_path):
+    """Elimina del manifiesto una salida que ya no existe"""
+    manifest['outputs'].pop(_rel(output_path), None)
@@ -0,0 +1,355 @@
+#!/usr/bin/env python3
+"""
+Modo servicio: un proceso que se queda abierto y comprime imágenes a petición
+
+Lanzar un intérprete por imagen (importar Pillow, leer el manifiesto)
+cuesta más que comprimir una figura pequeña. En este modo el proceso
+queda esperando solicitudes en JSON Lines, por la entrada estándar o por
+un socket Unix local, y responde una línea JSON por solicitud en cuanto
+termina (no necesariamente en orden: cada respuesta lleva el id de su
+solicitud).
+
+Solicitud:
+    {"id": 1, "path": "img/graficos/figura_2_1.png", "policy": "compress",
+     "options": {"quality": 92, "auto_format": true}}
+
+Políticas:
+- compress (por defecto): como compress_images (respaldo, manifiesto,
+  reemplazo atómico); si el manifiesto la da por comprimida no se toca, y
+  si su salida pisaría otra imagen (x.png junto a x.jpg) se responde error
+- estimate: tamaño previsto sin escribir nada (size_estimate)
+- renditions: versiones de impresión, vista previa y miniatura (renditions)
+
+Opciones: quality, max_width, max_height, auto_format, ssim, max_memory (MB)
+y, para renditions, names. Las que no se indican toman los valores con los
+que se lanzó el servicio.
+
+Respuesta:
+    {"id": 1, "ok": true, "status": "compressed", "format": "JPEG",
+     "bytes_before": ..., "bytes_after": ..., "stages": {...},
+     "queued_s": ..., "total_s": ...}
+    {"id": 2, "ok": false, "error": "..."}
+
+{"op": "ping"} responde con los contadores del servicio.
+
+Como mucho --queue solicitudes están en curso o esperando en el pool; al
+llegar al límite se deja de leer (la entrada estándar o el socket hacen
+de cola) hasta que alguna termina.
+
+Uso:
+    python compress_images.py --serve                      # stdin/stdout
+    python compress_images.py --serve --socket /tmp/img.sock
+"""
+
+import os
+import sys
+import json
+import time
+import signal
+import socket
+import threading
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from compression_manifest import load_manifest, save_manifest, is_up_to_date, record
+from size_estimate import estimate_image
+from renditions import get_renditions, evict, RENDITIONS, CACHE_DIR, CACHE_MAX_BYTES
+from run_report import log_image
+from watch_images import _ignore_interrupt, _outputs
+from image_io import rename_collisions
+from image_budget import IMAGE_EXTENSIONS
+from tex_images import NO_LIMIT
+
+# Solicitudes admitidas a la vez (en curso + esperando un proceso libre)
+DEFAULT_QUEUE = 16
+
+POLICIES = ('compress', 'estimate', 'renditions')
+
+OPTIONS = {'quality', 'max_width', 'max_height', 'auto_format', 'ssim', 'max_memory', 'names'}
+
+def _timed(function, *args):
+    """Ejecuta function en el pool y devuelve (resultado, segundos de trabajo)"""
+    start = time.perf_counter()
+    return function(*args), time.perf_counter() - start
+
+def _renditions(path, names):
+    """get_renditions para el pool; la caché la recorta el proceso principal"""
+    paths = get_renditions(path, names, max_bytes=None)
+    return {name: p.as_posix() for name, p in paths.items()}
+
+def _image_path(server, request):
+    """Ruta de la solicitud, que debe ser una imagen existente dentro de la carpeta"""
+    if not request.get('path'):
+        raise ValueError("falta 'path'")
+    path = Path(request['path'])
+    folder = server['folder'].resolve()
+    if folder not in path.resolve().parents:
+        raise ValueError(f"{path} no está dentro de {server['folder']}/")
+    if not path.is_file():
+        raise ValueError(f"no existe {path}")
+    return server['folder'] / path.resolve().relative_to(folder)
+
+def _prepare(server, request):
+    """
+    Valida una solicitud y prepara su trabajo
+
+    Returns:
+        (respuesta inmediata, None) si no hace falta el pool, o
+        (None, (función, argumentos, contexto para _finish))
+
+    Raises:
+        ValueError: solicitud no válida
+    """
+    from compress_images import _compress_one, job_key  # compress_images importa este módulo
+
+    policy = request.get('policy', 'compress')
+    if policy not in POLICIES:
+        raise ValueError(f"política desconocida {policy!r} (válidas: {', '.join(POLICIES)})")
+    given = request.get('options') or {}
+    unknown = set(given) - OPTIONS
+    if unknown:
+        raise ValueError(f"opciones desconocidas: {', '.join(sorted(unknown))}")
+    options = dict(server['defaults'], **given)
+    path = _image_path(server, request)
+    context = {'policy': policy, 'path': path}
+
+    if policy == 'renditions':
+        names = options.get('names') or list(RENDITIONS)
+        if set(names) - set(RENDITIONS):
+            raise ValueError(f"versiones válidas: {', '.join(RENDITIONS)}")
+        return None, (_renditions, (path, names), context)
+
+    max_size = None
+    if given.get('max_width') or given.get('max_height'):
+        max_size = (options.get('max_width') or NO_LIMIT,
+                    options.get('max_height') or NO_LIMIT)
+    max_memory = options.get('max_memory')
+    if max_memory is not None:
+        max_memory *= 1024 * 1024
+
+    with server['lock']:
+        source_path, source_hash, max_size, key = job_key(
+            server['manifest'], path, options['quality'], server['limits'],
+            options['auto_format'], options['ssim'], max_size=max_size,
+            max_memory=max_memory)
+        if policy == 'estimate':
+            return None, (estimate_image, (source_path, options['quality'], max_size,
+                                           options['auto_format'], options['ssim']), context)
+        if is_up_to_date(server['manifest'], path, key):
+            return {'status': 'up_to_date', 'output': path.as_posix(),
+                    'bytes_after': path.stat().st_size}, None
+        # x.png junto a x.jpg: comprimir x.png pisaría una imagen que no es suya
+        siblings = [p for p in path.parent.iterdir()
+                    if p.is_file() and p.suffix.lower() in IMAGE_EXTENSIONS]
+        others = rename_collisions(siblings).get(path)
+        if others:
+            raise ValueError(f"su salida pisaría {', '.join(o.name for o in others)} "
+                             f"(renombra uno de los dos)")
+        busy = set().union(*map(_outputs, server['in_flight']))
+        if _outputs(path) & busy:
+            raise ValueError(f"ya hay una solicitud en curso para {path.as_posix()} "
+                             f"o para otra imagen con su mismo nombre de salida")
+        server['in_flight'].add(path)
+    context.update(key=key, source_hash=source_hash)
+    return None, (_compress_one, (path, source_path, server['folder'], server['backup_folder'],
+                                  options['quality'], max_size, options['auto_format'],
+                                  max_memory, options['ssim']), context)
+
+def _finish(server, context, result):
+    """Registra el resultado de un trabajo y arma los campos de la respuesta"""
+    if context['policy'] == 'renditions':
+        with server['lock']:
+            evict(CACHE_DIR, server['cache_max_bytes'])
+        return {'renditions': result}
+    if context['policy'] == 'estimate':
+        return {'format': result['format'], 'bytes_after': result['bytes'],
+                'width': result['width'], 'height': result['height'],
+                'quality': result['quality'], 'exact': result['exact']}
+
+    print(result['log'], end='', flush=True)
+    if result['status'] == 'error':
+        # No se anota en el manifiesto: la próxima solicitud lo reintenta
+        raise RuntimeError(result['record'].get('error', 'error en la compresión'))
+    with server['lock']:
+        record(server['manifest'], context['key'], result['source_path'],
+               context['source_hash'], result['output_path'])
+        save_manifest(server['manifest'])
+        log_image(server['report'], result['record'])
+    image = result['record']
+    return {'status': result['status'],
+            'output': image['output'], 'format': image.get('format'),
+            'quality': image.get('quality'), 'bytes_before': image['bytes_before'],
+            'bytes_after': image['bytes_after'], 'stages': image['stages']}
+
+def handle_request(server, line, respond):
+    """
+    Atiende una línea de solicitud; respond(dict) escribe la respuesta
+
+    Se bloquea mientras la cola está llena, lo que frena la lectura.
+    """
+    received = time.perf_counter()
+    try:
+        request = json.loads(line)
+        if not isinstance(request, dict):
+            raise ValueError("se esperaba un objeto JSON")
+    except ValueError as e:
+        respond({'id': None, 'ok': False, 'error': f"solicitud no válida: {e}"})
+        return
+    reply = {'id': request.get('id')}
+    if request.get('op') == 'ping':
+        with server['lock']:
+            stats = dict(server['stats'], running=len(server['in_flight']))
+        respond(dict(reply, ok=True, **stats))
+        return
+    with server['lock']:
+        server['stats']['received'] += 1
+
+    try:
+        immediate, job = _prepare(server, request)
+    except (ValueError, OSError) as e:
+        with server['lock']:
+            server['stats']['failed'] += 1
+        respond(dict(reply, ok=False, error=str(e)))
+        return
+    if immediate is not None:
+        with server['lock']:
+            server['stats']['completed'] += 1
+        respond(dict(reply, ok=True, path=request['path'], **immediate,
+                     total_s=round(time.perf_counter() - received, 6)))
+        return
+
+    function, args, context = job
+    reply.update(policy=context['policy'], path=context['path'].as_posix())
+    server['slots'].acquire()
+
+    def done(future):
+        server['slots'].release()
+        try:
+            result, work = future.result()
+            fields = _finish(server, context, result)
+            ok = True
+        except Exception as e:
+            fields, work, ok = {'error': str(e)}, 0.0, False
+        finally:
+            with server['lock']:
+                server['in_flight'].discard(context['path'])
+                server['stats']['completed' if ok else 'failed'] += 1
+        total = time.perf_counter() - received
+        respond(dict(reply, ok=ok, **fields, queued_s=round(max(total - work, 0.0), 6),
+                     total_s=round(total, 6)))
+
+    try:
+        server['executor'].submit(_timed, function, *args).add_done_callback(done)
+    except RuntimeError as e:
+        # El pool ya se está cerrando
+        server['slots'].release()
+        with server['lock']:
+            server['in_flight'].discard(context['path'])
+        respond(dict(reply, ok=False, error=str(e)))
+
+def _writer(stream):
+    """respond() que escribe líneas JSON en stream sin mezclar respuestas"""
+    lock = threading.Lock()
+
+    def respond(message):
+        with lock:
+            try:
+                stream.write((json.dumps(message, ensure_ascii=False) + '\n').encode('utf-8'))
+                stream.flush()
+            except (OSError, ValueError):
+                pass  # el cliente ya se fue; el trabajo quedó hecho igualmente
+    return respond
+
+def _serve_connection(server, connection):
+    """Atiende las solicitudes de un cliente del socket hasta que cierra"""
+    with connection, connection.makefile('rb') as reader, connection.makefile('wb') as writer:
+        respond = _writer(writer)
+        for line in reader:
+            if line.strip():
+                handle_request(server, line.decode('utf-8'), respond)
+
+def _listen(path):
+    """Socket Unix en path; un socket huérfano de una ejecución anterior se reemplaza"""
+    path = Path(path)
+    if path.exists():
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(str(path))
+        except OSError:
+            path.unlink()
+        else:
+            probe.close()
+            raise RuntimeError(f"ya hay un servicio escuchando en {path}")
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(str(path))
+    os.chmod(path, 0o600)
+    listener.listen()
+    return listener
+
+def _stop(signum, frame):
+    raise KeyboardInterrupt
+
+def serve(folder_path, backup_folder, quality=92, jobs=None, limits=None,
+          auto_format=False, max_memory=None, target_ssim=None, report=None,
+          socket_path=None, queue_size=DEFAULT_QUEUE, responses=None):
+    """
+    Atiende solicitudes de compresión hasta fin de la entrada, Ctrl+C o SIGTERM
+
+    Args:
+        quality, limits, auto_format, max_memory (bytes), target_ssim:
+            valores por defecto de las solicitudes, como en compress_images
+        socket_path: escuchar en este socket Unix en lugar de la entrada estándar
+        queue_size: solicitudes en curso o en espera como máximo
+        responses: flujo binario para las respuestas en modo entrada estándar
+                   (por defecto sys.stdout)
+
+    Returns:
+        dict con los contadores received, completed y failed
+    """
+    jobs = jobs or min(os.cpu_count() or 1, 4)
+    server = {
+        'folder': Path(folder_path),
+        'backup_folder': Path(backup_folder),
+        'limits': limits,
+        'defaults': {'quality': quality, 'auto_format': auto_format, 'ssim': target_ssim,
+                     'max_memory': max_memory // (1024 * 1024) if max_memory else max_memory},
+        'manifest': load_manifest(),
+        'report': report,
+        'cache_max_bytes': CACHE_MAX_BYTES,
+        'lock': threading.Lock(),
+        'slots': threading.BoundedSemaphore(queue_size),
+        'in_flight': set(),
+        'executor': ProcessPoolExecutor(max_workers=jobs, initializer=_ignore_interrupt),
+        'stats': {'received': 0, 'completed': 0, 'failed': 0},
+    }
+    signal.signal(signal.SIGTERM, _stop)
+    listener = None
+    try:
+        if socket_path:
+            listener = _listen(socket_path)
+            print(f"🔌 Esperando solicitudes en {socket_path} "
+                  f"({jobs} procesos, cola de {queue_size}; Ctrl+C para terminar)")
+            while True:
+                connection, _ = listener.accept()
+                threading.Thread(target=_serve_connection, args=(server, connection),
+                                 daemon=True).start()
+        else:
+            print(f"📥 Esperando solicitudes en la entrada estándar "
+                  f"({jobs} procesos, cola de {queue_size})")
+            respond = _writer(responses or sys.stdout.buffer)
+            for line in sys.stdin:
+                if line.strip():
+                    handle_request(server, line, respond)
+    except KeyboardInterrupt:
+        print("\n⏹️  Deteniendo el servicio...")
+    finally:
+        if listener is not None:
+            listener.close()
+            if Path(socket_path).exists():
+                Path(socket_path).unlink()
+        # Las solicitudes aceptadas terminan y se responden antes de salir
+        server['executor'].shutdown(wait=True)
+        with server['lock']:
+            save_manifest(server['manifest'])
+    stats = server['stats']
+    print(f"✅ Solicitudes atendidas: {stats['completed']}, con error: {stats['failed']}")
+    return stats
@@ -24,7 +24,7 @@ if errorlevel 1 (
     echo.
     echo ERROR: No se pudieron instalar las dependencias
     echo Intentando con pip3...
-    pip3 install Pillow
+    pip3 install Pillow numpy
 )
 
 echo.
@@ -3,113 +3,180 @@
 Script para arreglar la compresión completa con mejor control
 """
 
-import os
-import shutil
+import argparse
 from PIL import Image
 from pathlib import Path
+from image_io import encode_jpeg, replace_image, flatten_to_rgb, jpeg_path
+from image_classifier import to_gray
+from tex_images import referenced_images, is_referenced
+from run_report import (open_report, close_report, image_record, stage,
+                        describe_source, log_image, profiling, add_report_arguments)
+from backup_store import iter_backups
+from compression_manifest import (load_manifest, save_manifest, params_key,
+                                  is_up_to_date, record, file_hash)
+from batch_journal import (begin_batch, resume_batch, end_batch, close_journal, log_op,
+                           protect, pending_paths, check_pending, add_journal_arguments)
 
-def restore_and_recompress():
-    """Restaura desde backup y recomprime con mejor control"""
+def _strategy(size_mb):
+    """Calidad, ancho máximo y descripción según el tamaño original"""
+    if size_mb > 10:  # Imágenes muy grandes
+        return 90, 3000, "🔥 Imagen muy grande - Compresión agresiva"
+    elif size_mb > 5:  # Imágenes grandes
+        return 92, 3200, "📊 Imagen grande - Compresión moderada"
+    elif size_mb > 1:  # Imágenes medianas
+        return 95, 3840, "📈 Imagen mediana - Compresión suave"
+    else:  # Imágenes pequeñas
+        return 98, 4000, "📋 Imagen pequeña - Compresión mínima"
+
+def encode_backup(source_path, quality, max_width, record=None):
+    """Codifica un original como JPEG con la calidad y el ancho máximo dados"""
+    with Image.open(source_path) as img:
+        describe_source(record, img)
+        with stage(record, 'decode'):
+            img.load()
+        
+        # Convertir a RGB (transparencias sobre fondo blanco); gris si lo es
+        with stage(record, 'convert'):
+            img, _ = to_gray(flatten_to_rgb(img))
+        
+        # Redimensionar si es necesario
+        original_size = img.size
+        if img.width > max_width:
+            with stage(record, 'resize'):
+                ratio = max_width / img.width
+                new_height = int(img.height * ratio)
+                img = img.resize((max_width, new_height), Image.Resampling.LANCZOS)
+            print(f"   📏 Redimensionado: {original_size} → {img.size}")
+        
+        with stage(record, 'encode'):
+            return encode_jpeg(img, quality, progressive=False)
+
+def _recompress_file(source_path, file_path, manifest, journal=None, report=None):
+    """
+    Recomprime un original respaldado sobre img/, anotando cada paso en el diario
+
+    Returns:
+        (MB antes, MB después, True si se procesó o False si estaba al día)
+    """
+    new_path = jpeg_path(file_path)
+    
+    # Tamaño original
+    size_mb = source_path.stat().st_size / (1024*1024)
+    
+    quality, max_width, label = _strategy(size_mb)
+    source_hash = file_hash(source_path)
+    key = params_key(source_hash, profile='fix_compression',
+                     quality=quality, max_width=max_width)
+    if is_up_to_date(manifest, new_path, key):
+        log_op(journal, 'done', file_path, skipped=True)
+        return size_mb, new_path.stat().st_size / (1024*1024), False
+    
+    print(f"\n📁 {source_path.name} ({size_mb:.1f} MB)")
+    print(f"   {label}")
+    
+    # Guardar como JPG (una sola escritura, atómica) y
+    # eliminar la versión PNG si quedó en img/
+    image = image_record(file_path, source=source_path.as_posix(), format='JPEG',
+                         quality=quality, bytes_before=source_path.stat().st_size)
+    data = encode_backup(source_path, quality, max_width, image)
+    log_op(journal, 'encode', file_path, bytes=len(data))
+    new_path.parent.mkdir(parents=True, exist_ok=True)
+    protect(journal, new_path, manifest)
+    if file_path != new_path:
+        protect(journal, file_path, manifest)
+    with stage(image, 'write'):
+        replace_image(file_path, new_path, data)
+    log_op(journal, 'replace', new_path,
+           removed=file_path.as_posix() if file_path != new_path else None)
+    
+    # El manifiesto se guarda por imagen: una interrupción no pierde lo hecho
+    record(manifest, key, source_path, source_hash, new_path)
+    save_manifest(manifest)
+    log_op(journal, 'done', file_path)
+    image.update(output=new_path.as_posix(), bytes_after=len(data))
+    log_image(report, image)
+    
+    # Calcular nuevo tamaño
+    new_size_mb = len(data) / (1024*1024)
+    reduction = ((size_mb - new_size_mb) / size_mb) * 100
+    print(f"   ✅ {size_mb:.1f} MB → {new_size_mb:.1f} MB (-{reduction:.0f}%)")
+    return size_mb, new_size_mb, True
+
+def restore_and_recompress(report=None, only=None, state=None):
+    """
+    Restaura desde backup y recomprime con mejor control
+
+    Con report (run_report.open_report) se registra cada imagen procesada.
+    Con only (tex_images.referenced_images) solo se procesan esas imágenes.
+    Con state (batch_journal.read_journal) se reanuda un lote interrumpido:
+    solo se procesan sus imágenes pendientes.
+    """
     
     print("🔄 RESTAURACIÓN Y RECOMPRESIÓN CONTROLADA")
     print("=" * 50)
     
-    # Eliminar carpeta img actual
     img_folder = Path("img")
-    if img_folder.exists():
-        shutil.rmtree(img_folder)
-        print("✅ Carpeta img eliminada")
-    
-    # Restaurar desde backup
     backup_folder = Path("img_backup")
-    if backup_folder.exists():
-        shutil.copytree(backup_folder, img_folder)
-        print("✅ Imágenes restauradas desde backup")
-    else:
+    if not backup_folder.exists():
         print("❌ No se encontró carpeta de backup")
         return
+    img_folder.mkdir(exist_ok=True)
+    
+    # Los originales se leen directamente de img_backup/; el manifiesto
+    # evita reprocesar las imágenes cuyo resultado en img/ sigue vigente
+    manifest = load_manifest()
     
     # Comprimir con diferentes estrategias según tamaño
     total_before = 0
     total_after = 0
     processed = 0
+    skipped = 0
+    
+    # Destino en img/ → original respaldado (o las pendientes del lote interrumpido)
+    if state is None:
+        jobs = {img_folder / relative_path: source_path
+                for source_path, relative_path in iter_backups(backup_folder)
+                if source_path.suffix.lower() in ['.png', '.jpg', '.jpeg']
+                and is_referenced(only, img_folder / relative_path)}
+        journal = begin_batch('fix_compression', jobs)
+    else:
+        jobs = {file_path: backup_folder / file_path.relative_to(img_folder)
+                for file_path in pending_paths(state)}
+        journal = resume_batch(state)
     
     print("\n🎯 Iniciando compresión inteligente...")
     print("-" * 50)
     
-    for file_path in img_folder.rglob("*"):
-        if file_path.suffix.lower() in ['.png', '.jpg', '.jpeg']:
+    try:
+        for file_path, source_path in jobs.items():
             try:
-                # Tamaño original
-                size_mb = file_path.stat().st_size / (1024*1024)
+                size_mb, new_size_mb, done = _recompress_file(source_path, file_path, manifest,
+                                                              journal, report)
                 total_before += size_mb
-                
-                print(f"\n📁 {file_path.name} ({size_mb:.1f} MB)")
-                
-                with Image.open(file_path) as img:
-                    # Convertir a RGB
-                    if img.mode != 'RGB':
-                        if img.mode in ('RGBA', 'LA', 'P'):
-                            background = Image.new('RGB', img.size, (255, 255, 255))
-                            if img.mode == 'P':
-                                img = img.convert('RGBA')
-                            if img.mode == 'RGBA':
-                                background.paste(img, mask=img.split()[-1])
-                                img = background
-                        else:
-                            img = img.convert('RGB')
-                    
-                    # Estrategia según tamaño original
-                    if size_mb > 10:  # Imágenes muy grandes
-                        quality = 90
-                        max_width = 3000
-                        print(f"   🔥 Imagen muy grande - Compresión agresiva")
-                    elif size_mb > 5:  # Imágenes grandes
-                        quality = 92
-                        max_width = 3200
-                        print(f"   📊 Imagen grande - Compresión moderada")
-                    elif size_mb > 1:  # Imágenes medianas
-                        quality = 95
-                        max_width = 3840
-                        print(f"   📈 Imagen mediana - Compresión suave")
-                    else:  # Imágenes pequeñas
-                        quality = 98
-                        max_width = 4000
-                        print(f"   📋 Imagen pequeña - Compresión mínima")
-                    
-                    # Redimensionar si es necesario
-                    original_size = img.size
-                    if img.width > max_width:
-                        ratio = max_width / img.width
-                        new_height = int(img.height * ratio)
-                        img = img.resize((max_width, new_height), Image.Resampling.LANCZOS)
-                        print(f"   📏 Redimensionado: {original_size} → {img.size}")
-                    
-                    # Guardar como JPG
-                    new_path = file_path.with_suffix('.jpg')
-                    img.save(new_path, 'JPEG', quality=quality, optimize=True)
-                    
-                    # Eliminar original si era PNG
-                    if file_path.suffix.lower() == '.png':
-                        file_path.unlink()
-                    
-                    # Calcular nuevo tamaño
-                    new_size_mb = new_path.stat().st_size / (1024*1024)
-                    total_after += new_size_mb
-                    reduction = ((size_mb - new_size_mb) / size_mb) * 100
-                    
-                    print(f"   ✅ {size_mb:.1f} MB → {new_size_mb:.1f} MB (-{reduction:.0f}%)")
+                total_after += new_size_mb
+                if done:
                     processed += 1
-                    
+                else:
+                    skipped += 1
             except Exception as e:
-                print(f"   ❌ Error: {e}")
+                print(f"   ❌ Error con {source_path.name}: {e}")
+                size_mb = source_path.stat().st_size / (1024*1024)
+                total_before += size_mb
                 total_after += size_mb
+    except KeyboardInterrupt:
+        close_journal(journal)
+        print("\n⏹️  Interrumpido. Para terminar solo lo pendiente: "
+              "python fix_compression.py --resume (o --rollback para deshacerlo)")
+        return
+    end_batch(journal)
+    save_manifest(manifest)
     
     # Resumen final
     print("\n" + "=" * 50)
     print("📊 RESUMEN FINAL")
     print("=" * 50)
     print(f"Archivos procesados: {processed}")
+    print(f"Sin cambios (según manifiesto): {skipped}")
     print(f"Tamaño original: {total_before:.1f} MB")
     print(f"Tamaño final: {total_after:.1f} MB")
     if total_before > 0:
@@ -124,5 +191,22 @@ def restore_and_recompress():
     else:
         print("❌ Necesita más compresión")
 
+def main():
+    parser = argparse.ArgumentParser(
+        description="Recomprime img/ desde img_backup/ con calidad según el tamaño")
+    parser.add_argument('--document', '-d', nargs='+', default=None, metavar='TEX',
+                        help="Procesar solo las imágenes que usan estos .tex")
+    add_journal_arguments(parser)
+    add_report_arguments(parser)
+    args = parser.parse_args()
+    action, state = check_pending('fix_compression', args.resume, args.rollback)
+    if action == 'stop':
+        return
+    only = referenced_images(args.document) if args.document else None
+    report = open_report(args.report, 'fix_compression')
+    with profiling(args.profile, args.profile_output):
+        restore_and_recompress(report, only, state)
+    close_report(report)
+
 if __name__ == "__main__":
-    restore_and_recompress()
\ No newline at end of file
+    main()
\ No newline at end of file
@@ -0,0 +1,369 @@
+#!/usr/bin/env python3
+"""
+Optimizador de presupuesto global de bytes para las imágenes del PDF
+
+Sustituye la segunda pasada interactiva (calidad 70 a todo) y las cascadas
+fijas de calidad por una sola pasada automática:
+
+1. Cada original se decodifica una vez; sobre ese búfer se prueba cada
+   escala y, por búsqueda binaria, la calidad JPEG más alta que cabe en
+   varias fracciones de su tamaño. El resultado es una curva
+   bytes → pérdida de calidad por imagen.
+2. Con las curvas, un reparto global elige una opción por imagen de modo
+   que el total quepa en el presupuesto con la menor pérdida total.
+3. Solo se escribe el resultado elegido de cada imagen.
+"""
+
+import os
+import re
+import json
+import heapq
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image
+from image_io import flatten_to_rgb, encode_jpeg, atomic_write, rename_collisions, jpeg_path
+from image_classifier import to_gray
+from run_report import image_record, stage, describe_source, log_image
+from tex_images import max_size_for, is_referenced
+from backup_store import backup_file
+from compression_manifest import (load_manifest, save_manifest, params_key,
+                                  resolve_source, known_output, is_up_to_date, record)
+
+# Rango de calidades y escalas que puede usar el optimizador
+QUALITY_MAX = 92
+QUALITY_MIN = 50
+SCALES = (1.0, 0.85, 0.7, 0.55)
+
+# Pérdida equivalente a reducir la escala un 100% (en puntos de calidad):
+# bajar a 0.85 cuesta lo mismo que bajar 15 puntos de calidad
+SCALE_PENALTY = 100
+
+# Fracciones del tamaño máximo en las que se busca la mejor opción
+RATIO_GRID = (1.0, 0.8, 0.65, 0.5, 0.4, 0.3, 0.22, 0.15, 0.1, 0.07, 0.05)
+
+IMAGE_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.bmp', '.tiff', '.tif'}
+
+def parse_size(text):
+    """Convierte '8MB', '500KB' o '8' (MB) a bytes"""
+    match = re.fullmatch(r'\s*([\d.]+)\s*([KMG]?)B?\s*', str(text).upper())
+    if not match:
+        raise ValueError(f"Tamaño no válido: {text}")
+    value, unit = match.groups()
+    factor = {'': 1024 ** 2, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}[unit]
+    return int(float(value) * factor)
+
+def quality_loss(scale, quality):
+    """Pérdida de calidad de una opción (0 = calidad y escala máximas)"""
+    return (QUALITY_MAX - quality) + SCALE_PENALTY * (1 - scale)
+
+def _scaled(img, scale):
+    """Redimensiona el búfer decodificado a la escala pedida"""
+    if scale == 1.0:
+        return img
+    size = (max(1, round(img.width * scale)), max(1, round(img.height * scale)))
+    return img.resize(size, Image.Resampling.LANCZOS)
+
+def _best_quality(scaled, allowance, sizes):
+    """
+    Búsqueda binaria de la calidad más alta cuyo JPEG cabe en allowance
+
+    sizes memoriza {calidad: bytes} para no repetir codificaciones.
+    Devuelve None si ni la calidad mínima cabe.
+    """
+    def size_at(q):
+        if q not in sizes:
+            sizes[q] = len(encode_jpeg(scaled, q))
+        return sizes[q]
+
+    if size_at(QUALITY_MIN) > allowance:
+        return None
+    lo, hi = QUALITY_MIN, QUALITY_MAX
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if size_at(mid) <= allowance:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+def load_source(source_path, max_size=None, record=None):
+    """Decodifica y aplana un original, aplicando el límite de resolución"""
+    with Image.open(source_path) as img:
+        describe_source(record, img)
+        with stage(record, 'decode'):
+            img.load()
+        with stage(record, 'convert'):
+            img = flatten_to_rgb(img)
+        with stage(record, 'classify'):
+            img, _ = to_gray(img)
+        with stage(record, 'resize'):
+            if max_size and (img.width > max_size[0] or img.height > max_size[1]):
+                img.thumbnail(max_size, Image.Resampling.LANCZOS)
+        return img
+
+def measure_options(source_path, max_size=None):
+    """
+    Construye la curva de opciones (bytes, pérdida, escala, calidad)
+
+    El original se decodifica una sola vez para todas las pruebas.
+    Las opciones dominadas (más bytes y más pérdida) se descartan.
+    """
+    img = load_source(source_path, max_size)
+    options = {}
+    full_size = None
+    for scale in SCALES:
+        scaled = _scaled(img, scale)
+        sizes = {}
+        if full_size is None:
+            full_size = len(encode_jpeg(scaled, QUALITY_MAX))
+            sizes[QUALITY_MAX] = full_size
+        for ratio in RATIO_GRID:
+            quality = _best_quality(scaled, full_size * ratio, sizes)
+            if quality is not None:
+                options[(scale, quality)] = sizes[quality]
+        # Opción más pequeña posible en esta escala (siempre medida)
+        options[(scale, QUALITY_MIN)] = sizes[QUALITY_MIN]
+
+    return _frontier((size, quality_loss(scale, q), scale, q)
+                     for (scale, q), size in options.items())
+
+def _frontier(options):
+    """Frontera de Pareto de unas opciones, ordenada de más bytes a menos bytes"""
+    frontier = []
+    best_loss = None
+    for option in sorted(options, key=lambda o: (o[0], o[1])):
+        if best_loss is None or option[1] < best_loss:
+            frontier.append(option)
+            best_loss = option[1]
+    frontier.reverse()
+    return frontier
+
+def keep_option(manifest, path):
+    """
+    Opción «dejar el archivo actual»: (bytes, pérdida, None, None)
+
+    Si el archivo es una salida registrada, su pérdida es la de la calidad
+    y escala con que se generó; un original sin comprimir no pierde nada.
+    """
+    loss = 0
+    entry = known_output(manifest, path)
+    if entry is not None:
+        params = json.loads(entry['key'].split(':', 1)[1])
+        if params.get('quality') is not None:
+            loss = quality_loss(params.get('scale', 1.0), min(params['quality'], QUALITY_MAX))
+    return (path.stat().st_size, loss, None, None)
+
+def with_keep(curve, keep):
+    """
+    Curva con la opción de dejar el archivo actual
+
+    Se descartan las opciones que no son más pequeñas que el archivo: el
+    ajuste nunca sustituye una imagen por otra mayor.
+    """
+    return _frontier([tuple(o) for o in curve if o[0] < keep[0]] + [keep])
+
+def keeps_format(manifest, path):
+    """
+    True si la imagen no debe pasar a JPEG
+
+    Es el caso de los PNG que otra pasada dejó como PNG (--auto-format,
+    --lossless-png) y de todo lo que tiene transparencia. Un canal alfa
+    totalmente opaco (habitual en las gráficas exportadas) no cuenta. Las
+    que no se pueden leer tampoco se tocan.
+    """
+    if path.suffix.lower() == '.png' and known_output(manifest, path) is not None:
+        return True
+    try:
+        with Image.open(path) as img:
+            if 'A' not in img.getbands() and 'transparency' not in img.info:
+                return False
+            return img.convert('RGBA').getchannel('A').getextrema()[0] < 255
+    except Exception:
+        return True
+
+def allocate(curves, budget):
+    """
+    Elige una opción por imagen para que el total quepa en budget
+
+    Parte de la opción de menor pérdida de cada imagen y va bajando, en cada
+    paso, la imagen que ahorra más bytes por punto de calidad perdido.
+
+    Returns:
+        (lista de índices elegidos por imagen, total de bytes)
+    """
+    choice = [0] * len(curves)
+    total = sum(curve[0][0] for curve in curves)
+
+    def push(heap, i):
+        k = choice[i]
+        curve = curves[i]
+        if k + 1 < len(curve):
+            saved = curve[k][0] - curve[k + 1][0]
+            extra_loss = curve[k + 1][1] - curve[k][1]
+            heapq.heappush(heap, (extra_loss / max(saved, 1), i))
+
+    heap = []
+    for i in range(len(curves)):
+        push(heap, i)
+    while total > budget and heap:
+        _, i = heapq.heappop(heap)
+        k = choice[i]
+        total -= curves[i][k][0] - curves[i][k + 1][0]
+        choice[i] = k + 1
+        push(heap, i)
+    return choice, total
+
+def encode_option(source_path, scale, quality, max_size=None, record=None):
+    """Codifica en memoria la opción elegida"""
+    img = load_source(source_path, max_size, record)
+    with stage(record, 'resize'):
+        img = _scaled(img, scale)
+    with stage(record, 'encode'):
+        return encode_jpeg(img, quality)
+
+def write_option(source_path, output_path, scale, quality, max_size=None, record=None):
+    """Codifica la opción elegida y la escribe en output_path"""
+    data = encode_option(source_path, scale, quality, max_size, record)
+    with stage(record, 'write'):
+        atomic_write(output_path, data)
+    return len(data)
+
+def fit_data(source_path, budget, max_size=None, record=None):
+    """
+    Codifica una sola imagen con la menor pérdida que cabe en budget bytes
+
+    Returns:
+        (bytes JPEG, escala, calidad)
+    """
+    curve = measure_options(source_path, max_size)
+    choice, _ = allocate([curve], budget)
+    _, _, scale, quality = curve[choice[0]]
+    return encode_option(source_path, scale, quality, max_size, record), scale, quality
+
+def fit_image(source_path, output_path, budget, max_size=None, record=None):
+    """
+    Comprime una sola imagen con la menor pérdida que cabe en budget bytes
+
+    Returns:
+        (bytes escritos, escala, calidad)
+    """
+    data, scale, quality = fit_data(source_path, budget, max_size, record)
+    with stage(record, 'write'):
+        atomic_write(output_path, data)
+    return len(data), scale, quality
+
+def compress_to_budget(folder_path, budget, jobs=None, max_size=None,
+                       backup_folder=Path("img_backup"), limits=None, report=None,
+                       only=None, upstream_key=None):
+    """
+    Comprime todas las imágenes de una carpeta para que quepan en budget bytes
+
+    Los originales se toman de img_backup/ a través del manifiesto, de modo
+    que repetir la pasada no acumula pérdida generacional. Con limits
+    (tex_images.pixel_limits) cada imagen parte de su tamaño impreso en vez
+    de max_size. Con report (run_report.open_report) se registra cada
+    imagen escrita; la medición de curvas no se desglosa por etapa. Con
+    only (tex_images.referenced_images) solo se recomprimen las imágenes
+    que usan los documentos.
+
+    El presupuesto es para toda la carpeta: las imágenes que se quedan
+    fuera (no referenciadas o con colisión de nombre) cuentan con su tamaño
+    actual. Cada imagen puede quedarse como está, y ninguna se sustituye por
+    una versión mayor. Los PNG que otra pasada dejó como PNG y las imágenes
+    con transparencia no pasan a JPEG: cuentan con su tamaño actual.
+
+    upstream_key(manifest, ruta) da la clave de la pasada previa cuya salida
+    se ajusta (la de calidad 92 de compress_images). Se anota junto a la del
+    presupuesto para que esa pasada, al repetirse, dé la imagen por hecha en
+    lugar de recomprimirla y deshacer el ajuste.
+    """
+    folder = Path(folder_path)
+    all_files = [f for f in folder.rglob('*')
+                 if f.is_file() and f.suffix.lower() in IMAGE_EXTENSIONS]
+    # Igual que en compress_images: nunca escribir x.jpg encima de otra imagen
+    collisions = rename_collisions(all_files)
+    for f, others in sorted(collisions.items()):
+        print(f"⚠️  Se deja fuera {f.relative_to(folder).as_posix()}: su salida "
+              f"pisaría {', '.join(o.name for o in others)}")
+    files = [f for f in all_files if is_referenced(only, f) and f not in collisions]
+    if not files:
+        print(f"No hay imágenes en {folder_path}")
+        return
+    outside = sum(f.stat().st_size for f in all_files if f not in files)
+    available = max(budget - outside, 0)
+
+    print(f"\n🎯 Presupuesto: {budget / (1024 * 1024):.2f} MB; "
+          f"{available / (1024 * 1024):.2f} MB para {len(files)} imágenes")
+    print("-" * 50)
+
+    manifest = load_manifest()
+    keeps = [keep_option(manifest, f) for f in files]
+    fixed = [keeps_format(manifest, f) for f in files]
+    sources = []
+    for f, is_fixed in zip(files, fixed):
+        source_path, source_hash = resolve_source(manifest, f)
+        if source_path == f and not is_fixed:
+            # Original sin respaldo: copiarlo antes de sobrescribirlo
+            backup_path = backup_folder / f.relative_to(folder)
+            backup_file(f, backup_path, backup_folder)
+            source_path = backup_path
+        sources.append((source_path, source_hash))
+
+    # Fase 1: curvas de tamaño/calidad (una decodificación por imagen);
+    # las curvas ya medidas para el mismo original se reutilizan
+    sizes = [max_size_for(limits, f, max_size) for f in files]
+    cache = manifest.setdefault('curves', {})
+    curve_keys = [params_key(source_hash, profile='budget_curve',
+                             max_size=list(size) if size else None)
+                  for (_, source_hash), size in zip(sources, sizes)]
+    missing = [i for i, key in enumerate(curve_keys) if key not in cache and not fixed[i]]
+    paths = [sources[i][0] for i in missing]
+    missing_sizes = [sizes[i] for i in missing]
+    jobs = min(jobs or os.cpu_count() or 1, len(paths)) or 1
+    if jobs == 1:
+        measured = [measure_options(p, size) for p, size in zip(paths, missing_sizes)]
+    else:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            measured = list(executor.map(measure_options, paths, missing_sizes))
+    for i, curve in zip(missing, measured):
+        cache[curve_keys[i]] = curve
+    curves = [[keep] if is_fixed else with_keep(cache[key], keep)
+              for key, keep, is_fixed in zip(curve_keys, keeps, fixed)]
+
+    # Fase 2: reparto global del presupuesto
+    choice, total = allocate(curves, available)
+    if total > available:
+        print(f"⚠️  Ni con la compresión máxima cabe: "
+              f"{(total + outside) / (1024 * 1024):.2f} MB")
+
+    # Fase 3: escribir solo la opción elegida de cada imagen
+    for f, (source_path, source_hash), size_limit, curve, k in zip(
+            files, sources, sizes, curves, choice):
+        _, _, scale, quality = curve[k]
+        if scale is None:
+            continue  # Se queda el archivo actual
+        key = params_key(source_hash, profile='budget', quality=quality, scale=scale,
+                         max_size=list(size_limit) if size_limit else None)
+        new_path = jpeg_path(f)
+        if is_up_to_date(manifest, f, key):
+            continue
+        covers = [upstream_key(manifest, f)] if upstream_key else None
+        image = image_record(f, source=Path(source_path).as_posix(), output=new_path.as_posix(),
+                             format='JPEG', quality=quality, scale=scale,
+                             bytes_before=Path(source_path).stat().st_size)
+        size = write_option(source_path, new_path, scale, quality, size_limit, image)
+        image['bytes_after'] = size
+        log_image(report, image)
+        if new_path != f:
+            f.unlink()  # El .jpg ya está completo en disco
+        record(manifest, key, source_path, source_hash, new_path, covers)
+        print(f"✓ {new_path.name}: calidad {quality}, escala {scale:.2f} → {size / 1024:.0f} KB")
+    save_manifest(manifest)
+
+    # Tamaño real de la carpeta, incluidas las imágenes que no se tocaron
+    folder_total = sum(f.stat().st_size for f in folder.rglob('*')
+                       if f.is_file() and f.suffix.lower() in IMAGE_EXTENSIONS)
+    print("\n" + "=" * 50)
+    print(f"Tamaño total de {folder.as_posix()}/: {folder_total / (1024 * 1024):.2f} MB "
+          f"(presupuesto {budget / (1024 * 1024):.2f} MB)")
+    return folder_total
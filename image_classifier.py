@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Clasificador de contenido para elegir el formato de salida de cada imagen
+
+Las gráficas y mapas de colores planos (Figura_2_*, figura_3_*) salen más
+pequeños y nítidos como PNG con paleta que como JPEG. El análisis se hace
+con NumPy sobre una versión reducida de la imagen, así que cuesta una
+fracción pequeña del tiempo de codificación.
+
+Las figuras que en realidad son grises (páginas escaneadas, diagramas en
+blanco y negro, fojas en blanco) se codifican con un solo canal: JPEG en
+escala de grises, o PNG de 8 bits de gris o de paleta de 1, 2 o 4 bits
+cuando tienen pocos tonos.
+"""
+
+import numpy as np
+from PIL import Image
+
+# Lado máximo de la vista reducida que se analiza
+ANALYSIS_SIZE = 256
+
+# Umbrales de decisión
+PALETTE_MAX_COLORS = 256      # Con tan pocos colores la paleta no pierde nada
+FLAT_RATIO_MIN = 0.7          # Fracción de píxeles iguales a su vecino
+EDGE_RATIO_MAX = 0.25         # Fracción de píxeles con salto fuerte de color
+EDGE_THRESHOLD = 48           # Diferencia (suma RGB) que cuenta como borde
+ALPHA_RATIO_MIN = 0.01        # Fracción de píxeles transparentes que importa
+GRAY_TOLERANCE = 3            # Diferencia máxima entre canales para codificar en gris (JPEG)
+FEW_TONES_MAX = 16            # Con hasta tantos grises basta una paleta de 4 bits o menos
+
+# Filas por bloque en la comprobación a resolución completa
+GRAY_BLOCK_ROWS = 256
+
+FORMAT_JPEG = 'jpeg'
+FORMAT_PALETTE = 'palette'
+FORMAT_LOSSLESS = 'lossless'
+
+def _analysis_view(img):
+    """
+    Vista reducida RGB/RGBA de la imagen para el análisis
+
+    Se muestrea por vecino más cercano: es casi gratis y no inventa colores
+    intermedios que falsearían el conteo de colores.
+    """
+    factor = max(1, max(img.size) // ANALYSIS_SIZE)
+    if factor > 1:
+        img = img.resize((max(1, img.width // factor), max(1, img.height // factor)),
+                         Image.Resampling.NEAREST)
+    if img.mode not in ('RGB', 'RGBA'):
+        img = img.convert('RGBA' if 'A' in img.getbands() or 'transparency' in img.info else 'RGB')
+    return np.asarray(img)
+
+def analyze(img):
+    """
+    Estadísticas de contenido de una imagen
+
+    Returns:
+        dict con colors (colores únicos en la vista reducida), flat_ratio,
+        edge_ratio y alpha_ratio
+    """
+    pixels = _analysis_view(img)
+    rgb = pixels[..., :3].astype(np.int32)
+    if pixels.shape[-1] == 4:
+        alpha_ratio = float(np.mean(pixels[..., 3] < 255))
+    else:
+        alpha_ratio = 0.0
+
+    packed = (rgb[..., 0] << 16) | (rgb[..., 1] << 8) | rgb[..., 2]
+    colors = int(np.unique(packed).size)
+
+    # Diferencias con el vecino derecho e inferior
+    dx = np.abs(np.diff(rgb, axis=1)).sum(axis=-1)
+    dy = np.abs(np.diff(rgb, axis=0)).sum(axis=-1)
+    total = max(dx.size + dy.size, 1)
+    flat_ratio = (np.count_nonzero(dx == 0) + np.count_nonzero(dy == 0)) / total
+    edge_ratio = (np.count_nonzero(dx > EDGE_THRESHOLD) + np.count_nonzero(dy > EDGE_THRESHOLD)) / total
+
+    return {
+        'colors': colors,
+        'flat_ratio': float(flat_ratio),
+        'edge_ratio': float(edge_ratio),
+        'alpha_ratio': alpha_ratio,
+    }
+
+def choose_format(img):
+    """
+    Decide el formato de salida: FORMAT_JPEG, FORMAT_PALETTE o FORMAT_LOSSLESS
+
+    - Transparencia real: PNG sin pérdida (JPEG no la conserva)
+    - Pocos colores o regiones planas: PNG con paleta adaptativa
+    - Resto (fotografías, degradados): JPEG
+    """
+    stats = analyze(img)
+    if stats['alpha_ratio'] >= ALPHA_RATIO_MIN:
+        return FORMAT_LOSSLESS, stats
+    if stats['colors'] <= PALETTE_MAX_COLORS:
+        return FORMAT_PALETTE, stats
+    if stats['flat_ratio'] >= FLAT_RATIO_MIN and stats['edge_ratio'] <= EDGE_RATIO_MAX:
+        return FORMAT_PALETTE, stats
+    return FORMAT_JPEG, stats
+
+def to_palette(img, colors=256):
+    """Cuantiza una imagen RGB a una paleta adaptativa sin tramado"""
+    return img.quantize(colors=colors, method=Image.Quantize.MEDIANCUT,
+                        dither=Image.Dither.NONE)
+
+def gray_spread(img, tolerance=GRAY_TOLERANCE):
+    """
+    Comprueba a resolución completa si una imagen RGB es en realidad gris
+
+    Primero se descarta con la vista reducida (casi gratis para las
+    fotografías en color); después se recorre la imagen por bloques de
+    filas, pasados a planos R, G, B contiguos para que NumPy compare
+    canales a la velocidad de la memoria.
+
+    Returns:
+        máxima diferencia entre canales de un mismo píxel, o None si supera
+        tolerance (o la imagen no es RGB ni gris)
+    """
+    if img.mode in ('L', '1'):
+        return 0
+    if img.mode != 'RGB':
+        return None
+    if int(np.ptp(_analysis_view(img), axis=-1).max()) > tolerance:
+        return None
+
+    pixels = np.asarray(img)
+    spread = 0
+    for top in range(0, pixels.shape[0], GRAY_BLOCK_ROWS):
+        red, green, blue = pixels[top:top + GRAY_BLOCK_ROWS].reshape(-1, 3).T.copy()
+        # max - min en uint8 no desborda; la mayor diferencia entre pares es el rango
+        for a, b in ((red, green), (green, blue), (red, blue)):
+            spread = max(spread, int((np.maximum(a, b) - np.minimum(a, b)).max()))
+        if spread > tolerance:
+            return None
+    return spread
+
+def to_gray(img, lossless=False, tolerance=GRAY_TOLERANCE):
+    """
+    Pasa a 'L' una imagen RGB que es gris
+
+    Conviene hacerlo antes de redimensionar: el remuestreo trabaja con un
+    canal en lugar de tres.
+
+    Args:
+        lossless: para PNG; solo se reduce si los tres canales son idénticos,
+                  así el resultado tiene exactamente los mismos píxeles
+        tolerance: diferencia entre canales admitida si no es lossless (JPEG)
+
+    Returns:
+        (imagen, True) con la imagen en 'L', o (img, False) si tiene color
+    """
+    if gray_spread(img, 0 if lossless else tolerance) is None:
+        return img, False
+    # Con R = G = B la conversión a 'L' devuelve exactamente ese valor
+    return (img if img.mode == 'L' else img.convert('L')), True
+
+def gray_palette(gray):
+    """
+    Paleta solo con los grises presentes si son pocos (sin pérdida)
+
+    Pillow guarda las paletas de hasta 2, 4 o 16 colores con 1, 2 o 4 bits
+    por píxel.
+
+    Returns:
+        (imagen 'P', 'bilevel' o 'tones'), o (gray, 'gray') si hay más de
+        FEW_TONES_MAX grises
+    """
+    levels = np.flatnonzero(gray.histogram())
+    if len(levels) > FEW_TONES_MAX:
+        return gray, 'gray'
+    index = np.zeros(256, dtype=np.uint8)
+    index[levels] = np.arange(len(levels), dtype=np.uint8)
+    palette_img = Image.frombytes('P', gray.size, index[np.asarray(gray)].tobytes())
+    palette_img.putpalette(np.repeat(levels.astype(np.uint8), 3).tobytes())
+    return palette_img, 'bilevel' if len(levels) <= 2 else 'tones'
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Utilidades compartidas de lectura y codificación de imágenes
+"""
+
+import io
+import os
+import tempfile
+import contextlib
+import sys
+from pathlib import Path
+
+try:
+    import resource  # Solo Unix
+except ImportError:
+    resource = None
+
+# Margen que se deja sobre el tamaño final al reducir de forma entera
+REDUCING_GAP = 2
+
+def flatten_to_rgb(img, background=(255, 255, 255)):
+    """
+    Convierte a RGB, aplanando transparencias sobre fondo blanco
+
+    No crea una copia RGBA ni un lienzo de fondo a tamaño completo: las
+    imágenes con paleta se aplanan sobre la propia paleta y las RGBA/LA
+    pegan el color de fondo sobre su conversión RGB usando el alfa invertido.
+    """
+    if img.mode == 'P':
+        transparency = img.info.get('transparency')
+        if transparency is None:
+            return img.convert('RGB')
+        palette = img.getpalette()
+        entries = len(palette) // 3
+        if isinstance(transparency, int):
+            alpha = [0 if i == transparency else 255 for i in range(entries)]
+        else:
+            alpha = list(transparency) + [255] * (entries - len(transparency))
+        flat_palette = []
+        for i in range(entries):
+            a = alpha[i] / 255
+            for c, bg in zip(palette[i * 3:i * 3 + 3], background):
+                flat_palette.append(round(c * a + bg * (1 - a)))
+        img = img.copy()  # 1 byte por píxel
+        img.info.pop('transparency', None)
+        img.putpalette(flat_palette)
+        return img.convert('RGB')
+    if img.mode in ('RGBA', 'LA'):
+        # fondo·(1-α) + color·α  ==  pegar el fondo con máscara 255-α
+        mask = img.getchannel('A').point(lambda v: 255 - v)
+        flat = img.convert('RGB')
+        flat.paste(background, mask=mask)
+        return flat
+    if img.mode != 'RGB':
+        return img.convert('RGB')
+    return img
+
+def estimate_decode_bytes(img, size=None):
+    """Memoria aproximada que ocupa una imagen decodificada"""
+    width, height = size or img.size
+    return width * height * max(len(img.getbands()), 1)
+
+def load_reduced(img, max_size, max_memory=None):
+    """
+    Decodifica una imagen abierta con la menor memoria posible
+
+    - JPEG: modo draft, el decodificador escala 1/2, 1/4 o 1/8 directamente
+    - Resto: reduce() entero justo después de decodificar
+    En ambos casos se deja al menos REDUCING_GAP veces el tamaño final para
+    que el remuestreo LANCZOS posterior conserve la calidad.
+
+    Args:
+        img: imagen recién abierta con Image.open (aún sin cargar)
+        max_size: (ancho, alto) final que se busca
+        max_memory: bytes máximos para el búfer decodificado; si no se
+                    puede cumplir se lanza MemoryError antes de decodificar
+
+    Returns:
+        imagen cargada (mismo modo, con alfa si lo tenía)
+    """
+    width, height = img.size
+    # thumbnail() escala según la dimensión más restrictiva
+    factor = max(width / max_size[0], height / max_size[1]) / REDUCING_GAP
+    factor = max(1, int(factor))
+
+    if img.format == 'JPEG':
+        scale = factor
+        if max_memory:
+            # Si el límite de memoria lo exige, reducir más (hasta 1/8)
+            while scale < 8 and estimate_decode_bytes(
+                    img, (width // scale, height // scale)) > max_memory:
+                scale *= 2
+        if scale > 1:
+            img.draft(img.mode, (max(1, width // scale), max(1, height // scale)))
+            factor = max(1, int(max(img.size[0] / max_size[0],
+                                    img.size[1] / max_size[1]) / REDUCING_GAP))
+
+    if max_memory and estimate_decode_bytes(img) > max_memory:
+        raise MemoryError(
+            f"{img.size[0]}x{img.size[1]} necesita "
+            f"{estimate_decode_bytes(img) / (1024 * 1024):.0f} MB al decodificar "
+            f"(límite {max_memory / (1024 * 1024):.0f} MB)")
+
+    img.load()
+    if factor > 1:
+        if img.mode == 'P':
+            img = img.convert('RGBA' if 'transparency' in img.info else 'RGB')
+        img = img.reduce(factor)
+    return img
+
+def peak_rss_mb():
+    """Pico de memoria residente del proceso en MB (None si no disponible)"""
+    # En Linux, VmHWM es el pico de la imagen actual del proceso; ru_maxrss
+    # conserva tras fork/exec el del proceso padre
+    with contextlib.suppress(OSError):
+        with open('/proc/self/status', encoding='ascii') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa en KB, macOS en bytes
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+def encode_jpeg(img, quality, progressive=True):
+    """Codifica una imagen RGB como JPEG en memoria y devuelve los bytes"""
+    buffer = io.BytesIO()
+    img.save(buffer, 'JPEG', quality=quality, optimize=True, progressive=progressive)
+    return buffer.getvalue()
+
+def encode_png(img):
+    """Codifica una imagen como PNG optimizado en memoria"""
+    buffer = io.BytesIO()
+    img.save(buffer, 'PNG', optimize=True)
+    return buffer.getvalue()
+
+def atomic_write(path, data):
+    """
+    Escribe data en path de forma atómica
+
+    Se escribe a un temporal oculto en la misma carpeta y se renombra
+    encima del destino: un corte a mitad nunca deja un archivo a medias.
+    """
+    path = Path(path)
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        # mkstemp crea el archivo solo legible por el dueño
+        os.chmod(tmp_name, 0o644)
+        os.replace(tmp_name, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.unlink(tmp_name)
+        raise
+
+def jpeg_path(path):
+    """Ruta de la salida JPEG de una imagen: un .jpg o .jpeg conserva su nombre"""
+    path = Path(path)
+    return path if path.suffix.lower() in ('.jpg', '.jpeg') else path.with_suffix('.jpg')
+
+def rename_collisions(paths):
+    """
+    Imágenes cuya salida .jpg caería sobre otra imagen distinta
+
+    Al comprimir, x.png (o x.bmp...) pasa a llamarse x.jpg; si en la misma
+    carpeta hay otra imagen con el mismo nombre base, esa escritura pisaría
+    un archivo que no es suyo. Solo los JPEG (.jpg y .jpeg) se reescriben
+    en su sitio sin riesgo.
+
+    Returns:
+        dict ruta → imágenes con las que comparte carpeta y nombre base
+    """
+    groups = {}
+    for path in paths:
+        path = Path(path)
+        groups.setdefault((path.parent, path.stem.lower()), []).append(path)
+    return {path: [other for other in group if other != path]
+            for group in groups.values() if len(group) > 1
+            for path in group if jpeg_path(path) != path}
+
+def replace_image(original_path, new_path, data):
+    """
+    Escribe la versión comprimida y retira el original en el mismo paso
+
+    Si new_path es distinto de original_path (p. ej. .png → .jpg), el
+    original se borra solo después de que la nueva versión esté completa.
+    """
+    atomic_write(new_path, data)
+    if Path(new_path) != Path(original_path):
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(original_path)
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Búsqueda de calidad JPEG guiada por SSIM
+
+En lugar de fijar la calidad a mano (92, 90, 85...), se busca la calidad
+más baja cuyo resultado mantiene un SSIM mínimo respecto al original.
+El SSIM se calcula con NumPy sobre la luminancia reducida; el original se
+decodifica una sola vez y cada prueba solo decodifica su propio JPEG, en
+modo draft y en escala de grises.
+"""
+
+import io
+import numpy as np
+from PIL import Image
+from image_io import encode_jpeg
+
+# Lado máximo de la luminancia sobre la que se mide el SSIM
+SSIM_SIZE = 1024
+
+# Ventana de promediado del SSIM (píxeles)
+SSIM_WINDOW = 8
+
+# Rango de calidades de la búsqueda
+QUALITY_MIN = 40
+QUALITY_MAX = 95
+
+_C1 = (0.01 * 255) ** 2
+_C2 = (0.03 * 255) ** 2
+
+def _analysis_size(size):
+    """Tamaño de la luminancia de análisis (sin ampliar nunca)"""
+    width, height = size
+    scale = min(1.0, SSIM_SIZE / max(width, height))
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+def luminance(img, size=None):
+    """Luminancia float32 de una imagen, reducida a size"""
+    gray = img.convert('L')
+    size = size or _analysis_size(img.size)
+    if gray.size != size:
+        gray = gray.resize(size, Image.Resampling.BOX)
+    return np.asarray(gray, dtype=np.float32)
+
+def _jpeg_luminance(data, size):
+    """Decodifica un JPEG directamente en grises y reducido"""
+    with Image.open(io.BytesIO(data)) as img:
+        img.draft('L', size)
+        return luminance(img, size)
+
+def _box_mean(x, window=SSIM_WINDOW):
+    """Media en ventanas window x window (válidas) con imágenes integrales"""
+    integral = np.pad(x, ((1, 0), (1, 0))).cumsum(axis=0).cumsum(axis=1)
+    total = (integral[window:, window:] - integral[:-window, window:]
+             - integral[window:, :-window] + integral[:-window, :-window])
+    return total / (window * window)
+
+def ssim(a, b):
+    """SSIM medio entre dos luminancias del mismo tamaño"""
+    if min(a.shape) < SSIM_WINDOW:
+        return 1.0 if np.array_equal(a, b) else 0.0
+    a = a.astype(np.float64)
+    b = b.astype(np.float64)
+    mu_a = _box_mean(a)
+    mu_b = _box_mean(b)
+    var_a = _box_mean(a * a) - mu_a * mu_a
+    var_b = _box_mean(b * b) - mu_b * mu_b
+    cov = _box_mean(a * b) - mu_a * mu_b
+    num = (2 * mu_a * mu_b + _C1) * (2 * cov + _C2)
+    den = (mu_a * mu_a + mu_b * mu_b + _C1) * (var_a + var_b + _C2)
+    return float(np.mean(num / den))
+
+def find_quality(img, target_ssim, quality_min=QUALITY_MIN, quality_max=QUALITY_MAX,
+                 progressive=True):
+    """
+    Calidad JPEG más baja que mantiene SSIM >= target_ssim
+
+    img debe estar ya decodificada, en RGB y a su tamaño final; se reutiliza
+    en todas las pruebas.
+
+    Returns:
+        (calidad, bytes JPEG, ssim obtenido)
+    """
+    size = _analysis_size(img.size)
+    reference = luminance(img, size)
+    trials = {}
+
+    def trial(quality):
+        if quality not in trials:
+            data = encode_jpeg(img, quality, progressive=progressive)
+            trials[quality] = (data, ssim(reference, _jpeg_luminance(data, size)))
+        return trials[quality]
+
+    # Si ni la calidad máxima alcanza el objetivo, se usa la máxima
+    if trial(quality_max)[1] < target_ssim:
+        data, score = trial(quality_max)
+        return quality_max, data, score
+
+    lo, hi = quality_min, quality_max
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if trial(mid)[1] >= target_ssim:
+            hi = mid
+        else:
+            lo = mid + 1
+    data, score = trial(lo)
+    return lo, data, score
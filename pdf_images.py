@@ -0,0 +1,721 @@
+#!/usr/bin/env python3
+"""
+Auditoría de las imágenes incrustadas en un PDF compilado
+
+El tamaño que importa es el del PDF final, no el de img/. Este análisis
+lee el PDF sin cargarlo entero: parte de startxref, recorre las tablas o
+flujos xref (con sus /Prev), y solo lee los objetos que hacen falta: el
+árbol de páginas, los flujos de contenido y los diccionarios de las
+imágenes. Los datos de las imágenes no se leen; su tamaño sale de /Length.
+
+Para cada imagen (XObject /Image) se informa:
+- bytes del flujo (y de su máscara /SMask, si tiene)
+- filtro (DCTDecode = JPEG, FlateDecode = PNG/sin pérdida)
+- dimensiones en píxeles y espacio de color
+- tamaño al que se coloca en la página (siguiendo q/Q/cm del contenido,
+  también dentro de XObjects /Form) y la resolución efectiva en ppp
+- el archivo de img/ del que procede: por contenido para los JPEG copiados
+  tal cual, y si no por dimensiones, prefiriendo las imágenes que usa el
+  .tex del mismo nombre
+
+Uso:
+    python pdf_images.py test_cases.pdf
+    python pdf_images.py documento.pdf --target 8MB   # presupuesto para --budget
+    python pdf_images.py documento.pdf --json auditoria.json
+"""
+
+import re
+import json
+import zlib
+import base64
+import hashlib
+import argparse
+from pathlib import Path
+from collections import namedtuple
+from PIL import Image
+from compression_manifest import file_hash
+from image_budget import parse_size
+from tex_images import referenced_images, is_referenced, DPI_PRINT
+from watch_images import scan_images
+
+# Por encima de DPI_PRINT * OVERSAMPLING la imagen tiene píxeles de sobra
+OVERSAMPLING = 1.5
+
+# Profundidad máxima de XObjects /Form anidados
+MAX_FORM_DEPTH = 12
+
+# Ventana inicial de lectura de un objeto (crece si no basta)
+READ_WINDOW = 4096
+
+class Name(str):
+    """Nombre PDF (/Width)"""
+
+class Operator(str):
+    """Palabra clave sin barra: operadores de contenido (cm, Do) y obj/stream"""
+
+Ref = namedtuple('Ref', 'num gen')
+Stream = namedtuple('Stream', 'dict offset')
+
+class _Truncated(Exception):
+    """El objeto sigue más allá del búfer leído"""
+
+_SKIP = re.compile(rb'(?:[\s\x00]+|%[^\r\n]*)*')
+_TOKEN = re.compile(rb'[^\s\x00()<>\[\]{}/%]+')
+_REF = re.compile(rb'(\d+)[\s\x00]+(\d+)[\s\x00]+R(?![^\s\x00()<>\[\]{}/%])')
+_NUMBER = re.compile(rb'[+-]?(?:\d+\.?\d*|\.\d+)')
+_NAME_ESCAPE = re.compile(rb'#([0-9A-Fa-f]{2})')
+_INLINE_END = re.compile(rb'[\s\x00]EI(?=[\s\x00]|$)')
+_STRING_ESCAPES = {ord('n'): b'\n', ord('r'): b'\r', ord('t'): b'\t', ord('b'): b'\b',
+                   ord('f'): b'\f', ord('('): b'(', ord(')'): b')', ord('\\'): b'\\'}
+
+def _literal_string(buf, pos, final):
+    """Cadena (...) con paréntesis anidados y escapes; pos apunta tras '('"""
+    out = bytearray()
+    depth = 1
+    while pos < len(buf):
+        c = buf[pos]
+        if c == 0x5C:  # barra invertida
+            pos += 1
+            if pos >= len(buf):
+                break
+            c = buf[pos]
+            octal = re.match(rb'[0-7]{1,3}', buf[pos:pos + 3])
+            if octal:
+                out.append(int(octal.group(), 8) & 0xFF)
+                pos += len(octal.group())
+                continue
+            if c in (0x0D, 0x0A):  # continuación de línea
+                pos += 2 if buf[pos:pos + 2] == b'\r\n' else 1
+                continue
+            out += _STRING_ESCAPES.get(c, bytes([c]))
+        elif c == 0x28:
+            depth += 1
+            out.append(c)
+        elif c == 0x29:
+            depth -= 1
+            if depth == 0:
+                return bytes(out), pos + 1
+            out.append(c)
+        else:
+            out.append(c)
+        pos += 1
+    if not final:
+        raise _Truncated
+    return bytes(out), pos
+
+def parse_value(buf, pos, final=True):
+    """
+    Lee un objeto PDF de buf desde pos
+
+    Returns:
+        (valor, posición siguiente). Diccionarios → dict, arrays → list,
+        nombres → Name, cadenas → bytes, referencias → Ref, números,
+        booleanos, None, y cualquier otra palabra → Operator.
+        Con final=False, un objeto que toca el final del búfer lanza
+        _Truncated para que se lea una ventana mayor.
+    """
+    pos = _SKIP.match(buf, pos).end()
+    if pos >= len(buf):
+        if final:
+            raise ValueError("Fin de datos inesperado")
+        raise _Truncated
+    c = buf[pos:pos + 1]
+
+    if c == b'/':
+        match = _TOKEN.match(buf, pos + 1)
+        end = match.end() if match else pos + 1
+        if end >= len(buf) and not final:
+            raise _Truncated
+        raw = _NAME_ESCAPE.sub(lambda m: bytes([int(m.group(1), 16)]), buf[pos + 1:end])
+        return Name(raw.decode('latin-1')), end
+
+    if buf.startswith(b'<<', pos):
+        result = {}
+        pos += 2
+        while True:
+            pos = _SKIP.match(buf, pos).end()
+            if buf.startswith(b'>>', pos):
+                return result, pos + 2
+            if pos >= len(buf):
+                if final:
+                    raise ValueError("Diccionario sin cerrar")
+                raise _Truncated
+            key, pos = parse_value(buf, pos, final)
+            value, pos = parse_value(buf, pos, final)
+            result[key] = value
+
+    if c == b'[':
+        result = []
+        pos += 1
+        while True:
+            pos = _SKIP.match(buf, pos).end()
+            if buf.startswith(b']', pos):
+                return result, pos + 1
+            if pos >= len(buf):
+                if final:
+                    raise ValueError("Array sin cerrar")
+                raise _Truncated
+            value, pos = parse_value(buf, pos, final)
+            result.append(value)
+
+    if c == b'(':
+        return _literal_string(buf, pos + 1, final)
+
+    if c == b'<':
+        end = buf.find(b'>', pos)
+        if end < 0:
+            if final:
+                raise ValueError("Cadena hexadecimal sin cerrar")
+            raise _Truncated
+        digits = re.sub(rb'[^0-9A-Fa-f]', b'', buf[pos + 1:end])
+        if len(digits) % 2:
+            digits += b'0'
+        return bytes.fromhex(digits.decode('ascii')), end + 1
+
+    match = _TOKEN.match(buf, pos)
+    if not match:
+        # Delimitador suelto ('{', '}', ')' ...): se devuelve como operador
+        return Operator(c.decode('latin-1')), pos + 1
+    end = match.end()
+    if end >= len(buf) and not final:
+        raise _Truncated
+    token = match.group()
+
+    if _NUMBER.fullmatch(token):
+        ref = _REF.match(buf, pos)
+        if ref:
+            if ref.end() >= len(buf) and not final:
+                raise _Truncated
+            return Ref(int(ref.group(1)), int(ref.group(2))), ref.end()
+        if not final and len(buf) - end < 16:
+            # Podría ser el principio de "n g R" cortado por la ventana
+            raise _Truncated
+        text = token.decode('ascii')
+        return (float(text) if '.' in text else int(text)), end
+
+    keyword = token.decode('latin-1')
+    if keyword == 'true':
+        return True, end
+    if keyword == 'false':
+        return False, end
+    if keyword == 'null':
+        return None, end
+    return Operator(keyword), end
+
+def _parse_indirect(buf, base, final):
+    """'n g obj valor [stream]' → valor o Stream (offset absoluto de los datos)"""
+    _, pos = parse_value(buf, 0, final)
+    _, pos = parse_value(buf, pos, final)
+    keyword, pos = parse_value(buf, pos, final)
+    if keyword != 'obj':
+        raise ValueError(f"Se esperaba 'obj' en el byte {base}")
+    value, pos = parse_value(buf, pos, final)
+    pos = _SKIP.match(buf, pos).end()
+    if buf.startswith(b'stream', pos):
+        pos += len(b'stream')
+        if buf.startswith(b'\r\n', pos):
+            pos += 2
+        elif buf.startswith(b'\n', pos) or buf.startswith(b'\r', pos):
+            pos += 1
+        return Stream(value, base + pos)
+    if pos >= len(buf) and not final:
+        # Falta ver si detrás viene 'stream'
+        raise _Truncated
+    return value
+
+def _read_at(pdf, offset, parser):
+    """Lee con ventanas crecientes desde offset hasta que parser no se queda corto"""
+    size = READ_WINDOW
+    while True:
+        pdf['file'].seek(offset)
+        buf = pdf['file'].read(size)
+        final = len(buf) < size
+        try:
+            return parser(buf, offset, final)
+        except _Truncated:
+            if final:
+                raise ValueError(f"Objeto incompleto en el byte {offset}")
+            size *= 4
+
+def _unpredict(data, parms):
+    """Deshace el predictor PNG (10-15) de FlateDecode"""
+    predictor = parms.get('Predictor', 1)
+    if predictor < 10:
+        if predictor != 1:
+            raise ValueError(f"Predictor no soportado: {predictor}")
+        return data
+    colors = parms.get('Colors', 1)
+    bits = parms.get('BitsPerComponent', 8)
+    row_length = (parms.get('Columns', 1) * colors * bits + 7) // 8
+    bpp = max(1, colors * bits // 8)
+    out = bytearray()
+    previous = bytearray(row_length)
+    for start in range(0, len(data) - row_length, row_length + 1):
+        kind = data[start]
+        row = bytearray(data[start + 1:start + 1 + row_length])
+        for i in range(len(row)):
+            left = row[i - bpp] if i >= bpp else 0
+            up = previous[i]
+            if kind == 1:
+                row[i] = (row[i] + left) & 0xFF
+            elif kind == 2:
+                row[i] = (row[i] + up) & 0xFF
+            elif kind == 3:
+                row[i] = (row[i] + (left + up) // 2) & 0xFF
+            elif kind == 4:
+                upper_left = previous[i - bpp] if i >= bpp else 0
+                p = left + up - upper_left
+                pa, pb, pc = abs(p - left), abs(p - up), abs(p - upper_left)
+                row[i] = (row[i] + (left if pa <= pb and pa <= pc else up if pb <= pc
+                                    else upper_left)) & 0xFF
+        out += row
+        previous = row
+    return bytes(out)
+
+def _as_list(value):
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+def stream_data(pdf, stream):
+    """Datos decodificados de un flujo (Flate, ASCIIHex, ASCII85)"""
+    length = resolve(pdf, stream.dict.get('Length', 0))
+    pdf['file'].seek(stream.offset)
+    data = pdf['file'].read(length)
+    filters = [resolve(pdf, f) for f in _as_list(resolve(pdf, stream.dict.get('Filter')))]
+    parms = _as_list(resolve(pdf, stream.dict.get('DecodeParms')))
+    for i, name in enumerate(filters):
+        parm = resolve(pdf, parms[i]) if i < len(parms) and parms[i] else {}
+        if name in ('FlateDecode', 'Fl'):
+            data = _unpredict(zlib.decompressobj().decompress(data), parm)
+        elif name in ('ASCIIHexDecode', 'AHx'):
+            digits = re.sub(rb'[^0-9A-Fa-f]', b'', data.split(b'>')[0])
+            data = bytes.fromhex((digits + b'0' * (len(digits) % 2)).decode('ascii'))
+        elif name in ('ASCII85Decode', 'A85'):
+            data = base64.a85decode(data.split(b'~>')[0].replace(b'<~', b''), adobe=False)
+        else:
+            raise ValueError(f"Filtro no soportado: {name}")
+    return data
+
+def stream_hash(pdf, stream):
+    """SHA-256 de los datos sin decodificar, leídos por bloques"""
+    remaining = resolve(pdf, stream.dict.get('Length', 0))
+    digest = hashlib.sha256()
+    pdf['file'].seek(stream.offset)
+    while remaining > 0:
+        chunk = pdf['file'].read(min(remaining, 1024 * 1024))
+        if not chunk:
+            break
+        digest.update(chunk)
+        remaining -= len(chunk)
+    return digest.hexdigest()
+
+def _read_xref_table(pdf, offset):
+    """Tabla xref clásica; devuelve el diccionario trailer"""
+    size = READ_WINDOW
+    while True:
+        pdf['file'].seek(offset)
+        buf = pdf['file'].read(size)
+        end = buf.find(b'trailer')
+        if end >= 0 or len(buf) < size:
+            break
+        size *= 4
+    if end < 0:
+        raise ValueError(f"Tabla xref sin trailer en el byte {offset}")
+
+    tokens = buf[4:end].split()
+    i = 0
+    while i + 1 < len(tokens):
+        first, count = int(tokens[i]), int(tokens[i + 1])
+        i += 2
+        for num in range(first, first + count):
+            entry_offset, _, kind = tokens[i:i + 3]
+            i += 3
+            if kind == b'n':
+                pdf['xref'].setdefault(num, ('n', int(entry_offset)))
+            else:
+                pdf['xref'].setdefault(num, ('f',))
+    trailer_at = offset + end + len(b'trailer')
+    return _read_at(pdf, trailer_at,
+                    lambda buf, base, final: parse_value(buf, 0, final)[0])
+
+def _read_xref_stream(pdf, stream):
+    """Flujo xref (PDF 1.5+): entradas de ancho /W en binario"""
+    data = stream_data(pdf, stream)
+    widths = stream.dict['W']
+    index = stream.dict.get('Index', [0, stream.dict['Size']])
+    entry = sum(widths)
+    pos = 0
+    for first, count in zip(index[::2], index[1::2]):
+        for num in range(first, first + count):
+            fields = []
+            for width in widths:
+                fields.append(int.from_bytes(data[pos:pos + width], 'big') if width else None)
+                pos += width
+            kind = 1 if fields[0] is None else fields[0]
+            if kind == 1:
+                pdf['xref'].setdefault(num, ('n', fields[1]))
+            elif kind == 2:
+                pdf['xref'].setdefault(num, ('c', fields[1], fields[2]))
+            else:
+                pdf['xref'].setdefault(num, ('f',))
+        if pos > len(data) + entry:
+            break
+
+def open_pdf(file):
+    """
+    Lee el xref de un PDF abierto en binario
+
+    Returns:
+        dict con file, xref (num → entrada), trailer y cachés de objetos
+    """
+    pdf = {'file': file, 'xref': {}, 'trailer': None, 'cache': {}, 'objstm': {}}
+    file.seek(0, 2)
+    file_size = file.tell()
+    file.seek(max(0, file_size - 2048))
+    tail = file.read()
+    at = tail.rfind(b'startxref')
+    if at < 0:
+        raise ValueError("No se encontró startxref: ¿es un PDF completo?")
+    offset = int(tail[at + len(b'startxref'):].split()[0])
+
+    seen = set()
+    pending = [offset]
+    while pending:
+        offset = pending.pop(0)
+        if offset is None or offset in seen:
+            continue
+        seen.add(offset)
+        file.seek(offset)
+        if file.read(4) == b'xref':
+            trailer = _read_xref_table(pdf, offset)
+            if 'XRefStm' in trailer:
+                pending.append(trailer['XRefStm'])
+        else:
+            stream = _read_at(pdf, offset, _parse_indirect)
+            trailer = stream.dict
+            _read_xref_stream(pdf, stream)
+        if pdf['trailer'] is None:
+            pdf['trailer'] = trailer
+        pending.append(trailer.get('Prev'))
+    pdf['size'] = file_size
+    return pdf
+
+def get_object(pdf, num):
+    """Objeto indirecto num (de la caché, del archivo o de un flujo de objetos)"""
+    if num in pdf['cache']:
+        return pdf['cache'][num]
+    entry = pdf['xref'].get(num, ('f',))
+    value = None
+    if entry[0] == 'n':
+        value = _read_at(pdf, entry[1], _parse_indirect)
+    elif entry[0] == 'c':
+        stm_num, index = entry[1], entry[2]
+        if stm_num not in pdf['objstm']:
+            stm = get_object(pdf, stm_num)
+            data = stream_data(pdf, stm)
+            first = stm.dict['First']
+            header = data[:first].split()
+            offsets = [first + int(o) for o in header[1::2]]
+            pdf['objstm'][stm_num] = (data, offsets)
+        data, offsets = pdf['objstm'][stm_num]
+        value, _ = parse_value(data, offsets[index])
+    pdf['cache'][num] = value
+    return value
+
+def resolve(pdf, value):
+    """Sigue las referencias indirectas hasta un valor directo"""
+    seen = 0
+    while isinstance(value, Ref) and seen < 32:
+        value = get_object(pdf, value.num)
+        seen += 1
+    return value
+
+def _pages(pdf):
+    """(número de página, diccionario, recursos heredados) de cada página"""
+    root = resolve(pdf, pdf['trailer']['Root'])
+    stack = [(resolve(pdf, root['Pages']), None)]
+    visited = set()
+    number = 0
+    while stack:
+        node, resources = stack.pop()
+        if id(node) in visited:
+            continue
+        visited.add(id(node))
+        resources = resolve(pdf, node.get('Resources', resources))
+        kids = resolve(pdf, node.get('Kids'))
+        if kids is not None:
+            for kid in reversed(kids):
+                stack.append((resolve(pdf, kid), resources))
+        else:
+            number += 1
+            yield number, node, resources
+
+def _operations(data):
+    """(operador, operandos) de un flujo de contenido; salta imágenes en línea"""
+    operands = []
+    pos = 0
+    while True:
+        pos = _SKIP.match(data, pos).end()
+        if pos >= len(data):
+            return
+        value, pos = parse_value(data, pos)
+        if not isinstance(value, Operator):
+            operands.append(value)
+            continue
+        if value == 'ID':
+            end = _INLINE_END.search(data, pos)
+            pos = end.end() if end else len(data)
+        else:
+            yield value, operands
+        operands = []
+
+def _multiply(m, n):
+    """Producto de matrices PDF [a b c d e f] (m se aplica antes que n)"""
+    a, b, c, d, e, f = m
+    return (a * n[0] + b * n[2], a * n[1] + b * n[3],
+            c * n[0] + d * n[2], c * n[1] + d * n[3],
+            e * n[0] + f * n[2] + n[4], e * n[1] + f * n[3] + n[5])
+
+def _content(pdf, contents):
+    """Contenido de una página (uno o varios flujos concatenados)"""
+    parts = []
+    for ref in _as_list(resolve(pdf, contents)):
+        stream = resolve(pdf, ref)
+        if isinstance(stream, Stream):
+            parts.append(stream_data(pdf, stream))
+    return b'\n'.join(parts)
+
+def _walk_content(pdf, data, resources, ctm, page, images, depth=0):
+    """Sigue q/Q/cm y anota cada Do de una imagen con su matriz"""
+    xobjects = resolve(pdf, (resources or {}).get('XObject')) or {}
+    stack = []
+    for op, operands in _operations(data):
+        if op == 'q':
+            stack.append(ctm)
+        elif op == 'Q':
+            if stack:
+                ctm = stack.pop()
+        elif op == 'cm' and len(operands) == 6:
+            ctm = _multiply([float(v) for v in operands], ctm)
+        elif op == 'Do' and operands:
+            ref = xobjects.get(operands[-1])
+            xobject = resolve(pdf, ref)
+            if not isinstance(xobject, Stream):
+                continue
+            subtype = xobject.dict.get('Subtype')
+            if subtype == 'Image':
+                num = ref.num if isinstance(ref, Ref) else id(xobject)
+                images.setdefault(num, {'stream': xobject, 'placements': []})
+                images[num]['placements'].append((page, ctm))
+            elif subtype == 'Form' and depth < MAX_FORM_DEPTH:
+                matrix = resolve(pdf, xobject.dict.get('Matrix')) or [1, 0, 0, 1, 0, 0]
+                form_ctm = _multiply([float(v) for v in matrix], ctm)
+                form_resources = resolve(pdf, xobject.dict.get('Resources')) or resources
+                _walk_content(pdf, stream_data(pdf, xobject), form_resources,
+                              form_ctm, page, images, depth + 1)
+
+def _describe(pdf, num, found):
+    """Entrada del informe para una imagen colocada"""
+    info = found['stream'].dict
+    width = resolve(pdf, info.get('Width'))
+    height = resolve(pdf, info.get('Height'))
+    colorspace = resolve(pdf, info.get('ColorSpace'))
+    if isinstance(colorspace, list):
+        colorspace = resolve(pdf, colorspace[0])
+    filters = [resolve(pdf, f) for f in _as_list(resolve(pdf, info.get('Filter')))]
+    smask = resolve(pdf, info.get('SMask'))
+
+    placements = []
+    for page, (a, b, c, d, _, _) in found['placements']:
+        # El cuadrado unidad de la imagen se transforma con la matriz
+        w_pt = (a * a + b * b) ** 0.5
+        h_pt = (c * c + d * d) ** 0.5
+        dpi = min(width / (w_pt / 72), height / (h_pt / 72)) if w_pt and h_pt else None
+        placements.append({'page': page, 'width_cm': round(w_pt / 72 * 2.54, 2),
+                           'height_cm': round(h_pt / 72 * 2.54, 2),
+                           'dpi': round(dpi) if dpi else None})
+    # La colocación más grande es la que necesita más píxeles
+    dpis = [p['dpi'] for p in placements if p['dpi']]
+    return {
+        'object': num,
+        'bytes': resolve(pdf, info.get('Length', 0)),
+        'smask_bytes': resolve(pdf, smask.dict.get('Length', 0)) if isinstance(smask, Stream) else 0,
+        'filter': '+'.join(f.replace('Decode', '') for f in filters) or 'ninguno',
+        'width': width,
+        'height': height,
+        'colorspace': colorspace,
+        'bits': resolve(pdf, info.get('BitsPerComponent')),
+        'pages': sorted({p['page'] for p in placements}),
+        'placements': placements,
+        'dpi': min(dpis) if dpis else None,
+        'hash': stream_hash(pdf, found['stream']) if 'DCTDecode' in filters else None,
+    }
+
+def _source_candidates(folder, tex_files):
+    """Dimensiones, tamaño y si el .tex la usa, para cada imagen de folder"""
+    keys = referenced_images(tex_files) if tex_files else None
+    candidates = []
+    for path, (size, _) in sorted(scan_images(folder).items()):
+        try:
+            with Image.open(path) as img:
+                dims = img.size
+        except Exception:
+            continue
+        candidates.append({'path': path, 'size': size, 'dims': dims,
+                           'referenced': keys is not None and is_referenced(keys, path)})
+    return candidates
+
+def match_sources(images, candidates):
+    """
+    Relaciona cada imagen del PDF con su archivo en img/
+
+    Un JPEG copiado tal cual al PDF coincide byte a byte con el archivo. Si
+    no, se buscan imágenes con las mismas dimensiones y, si hay varias, se
+    prefieren las que usa el .tex. match queda en 'contenido',
+    'dimensiones', 'ambigua' o None.
+    """
+    hashes = {}
+    for image in images:
+        image['source'], image['match'] = [], None
+        if image['hash']:
+            for cand in candidates:
+                if cand['size'] != image['bytes']:
+                    continue
+                if cand['path'] not in hashes:
+                    hashes[cand['path']] = file_hash(cand['path'])
+                if hashes[cand['path']] == image['hash']:
+                    image['source'], image['match'] = [cand['path']], 'contenido'
+                    break
+            if image['match']:
+                continue
+        same = [c for c in candidates if c['dims'] == (image['width'], image['height'])]
+        used = [c for c in same if c['referenced']]
+        same = used or same
+        if same:
+            image['source'] = [c['path'] for c in same]
+            image['match'] = 'dimensiones' if len(same) == 1 else 'ambigua'
+
+def audit_pdf(pdf_path, folder='img', tex_files=None):
+    """
+    Audita las imágenes de un PDF compilado
+
+    Args:
+        tex_files: documentos cuyos \\includegraphics desempatan el origen;
+            por defecto el .tex con el mismo nombre que el PDF, si existe
+
+    Returns:
+        dict con path, size (bytes del PDF), pages, image_bytes e images
+        (lista ordenada de mayor a menor tamaño)
+    """
+    pdf_path = Path(pdf_path)
+    if tex_files is None:
+        tex = pdf_path.with_suffix('.tex')
+        tex_files = [tex] if tex.exists() else []
+
+    with open(pdf_path, 'rb') as f:
+        pdf = open_pdf(f)
+        found = {}
+        pages = 0
+        for number, page, resources in _pages(pdf):
+            pages = number
+            _walk_content(pdf, _content(pdf, page.get('Contents')), resources,
+                          (1, 0, 0, 1, 0, 0), number, found)
+        images = [_describe(pdf, num, item) for num, item in found.items()]
+
+    match_sources(images, _source_candidates(folder, tex_files) if Path(folder).exists() else [])
+    images.sort(key=lambda image: image['bytes'] + image['smask_bytes'], reverse=True)
+    return {
+        'path': pdf_path,
+        'size': pdf['size'],
+        'pages': pages,
+        'image_bytes': sum(image['bytes'] + image['smask_bytes'] for image in images),
+        'images': images,
+    }
+
+def suggested_size(image, dpi=DPI_PRINT):
+    """Píxeles que bastan para imprimir a dpi en su colocación más grande, o None"""
+    if not image['dpi'] or image['dpi'] <= dpi * OVERSAMPLING:
+        return None
+    scale = dpi / image['dpi']
+    return round(image['width'] * scale), round(image['height'] * scale)
+
+def print_audit(audit, folder='img'):
+    """Muestra la auditoría de un PDF como tabla"""
+    mb = 1024 * 1024
+    share = audit['image_bytes'] / audit['size'] * 100 if audit['size'] else 0
+    print(f"\n📄 {audit['path']}: {audit['size'] / mb:.2f} MB, {audit['pages']} páginas")
+    print(f"   {len(audit['images'])} imágenes: {audit['image_bytes'] / mb:.2f} MB "
+          f"({share:.0f}% del PDF)")
+    if not audit['images']:
+        return
+    print(f"\n   {'MB':>7}  {'filtro':<6} {'píxeles':>11}  {'ppp':>5}  págs.  origen")
+    for image in audit['images']:
+        size = (image['bytes'] + image['smask_bytes']) / mb
+        pixels = f"{image['width']}x{image['height']}"
+        dpi = f"{image['dpi']:>5}" if image['dpi'] else '    -'
+        pages = ','.join(str(p) for p in image['pages'][:3])
+        if len(image['pages']) > 3:
+            pages += ',…'
+        if image['source']:
+            names = [Path(p).relative_to(folder).as_posix() for p in image['source']]
+            origin = names[0] if len(names) == 1 else ' | '.join(names[:3]) + ' (ambigua)'
+        else:
+            origin = '¿?'
+        mask = ' +alfa' if image['smask_bytes'] else ''
+        print(f"   {size:7.2f}  {image['filter']:<6} {pixels:>11}  {dpi}  {pages:<5}  "
+              f"{origin}{mask}")
+        target = suggested_size(image)
+        if target:
+            print(f"            ↳ sobran píxeles: {target[0]}x{target[1]} bastan a "
+                  f"{DPI_PRINT} ppp")
+
+def _to_json(audit, folder):
+    """Versión serializable (rutas relativas a folder) de una auditoría"""
+    data = dict(audit, path=str(audit['path']))
+    data['images'] = [dict(image, source=[Path(p).relative_to(folder).as_posix()
+                                          for p in image['source']])
+                      for image in audit['images']]
+    return data
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Tamaño, filtro y resolución efectiva de las imágenes de un PDF compilado")
+    parser.add_argument('pdfs', nargs='+', type=Path, metavar='PDF')
+    parser.add_argument('--folder', default='img',
+                        help="Carpeta donde buscar el origen de cada imagen (por defecto img)")
+    parser.add_argument('--tex', nargs='*', default=None, metavar='TEX',
+                        help="Documentos que usan las imágenes (por defecto el .tex del "
+                             "mismo nombre que cada PDF)")
+    parser.add_argument('--target', type=parse_size, default=None, metavar='TAMAÑO',
+                        help="Tamaño deseado del PDF: calcula el presupuesto de imágenes "
+                             "para compress_images.py --budget")
+    parser.add_argument('--json', type=Path, default=None, metavar='ARCHIVO',
+                        help="Guardar la auditoría en este archivo JSON")
+    args = parser.parse_args()
+
+    print("🔎 AUDITORÍA DE IMÁGENES DEL PDF")
+    print("=" * 40)
+    audits = []
+    for pdf_path in args.pdfs:
+        audit = audit_pdf(pdf_path, args.folder, args.tex)
+        print_audit(audit, args.folder)
+        audits.append(audit)
+
+        if args.target:
+            other = audit['size'] - audit['image_bytes']
+            budget = args.target - other
+            print(f"\n🎯 Texto, fuentes y estructura ocupan {other / (1024 * 1024):.2f} MB")
+            if budget <= 0:
+                print("   ⚠️  El objetivo no se alcanza ni eliminando todas las imágenes")
+            else:
+                print(f"   Presupuesto para las imágenes: "
+                      f"python compress_images.py --budget {budget // 1024}KB")
+
+    if args.json:
+        data = [_to_json(audit, args.folder) for audit in audits]
+        args.json.write_text(json.dumps(data, indent=2, ensure_ascii=False), encoding='utf-8')
+        print(f"\n📝 Auditoría guardada en: {args.json}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,447 @@
+#!/usr/bin/env python3
+"""
+Optimización sin pérdida de los PNG de img/
+
+Para logotipos (logo_gob.png, fondo_guinda.png) y gráficas con texto fino
+no conviene pasar a JPEG ni cuantizar. Este modo reescribe cada PNG con
+exactamente los mismos píxeles pero en la representación más pequeña que
+encuentra, probando:
+
+- Reducciones sin pérdida: quitar el alfa si todo es opaco, escala de
+  grises si R = G = B, paleta si hay 256 colores o menos (con tRNS para
+  las transparencias) y profundidad de 1, 2 o 4 bits cuando alcanza
+- Filtros PNG: cada uno de los cinco para toda la imagen y el adaptativo
+  (por fila, el de menor suma de diferencias absolutas)
+- Niveles y estrategias de zlib (por defecto, filtrada, RLE, solo Huffman)
+
+Cada reducción de cada imagen es una tarea del pool: filtra con todos
+los filtros, los ordena con una compresión rápida (zlib 1) y prueba las
+estrategias de zlib solo con los mejores. El ganador se decodifica y solo se
+acepta si sus píxeles RGBA son idénticos a los del original. Se conservan
+los bloques pHYs (resolución, que LaTeX usa para el tamaño natural),
+iCCP, sRGB, gAMA y cHRM; los de texto y EXIF se descartan. El nombre no
+cambia, así que las referencias .png de los .tex siguen valiendo.
+
+Uso:
+    python compress_images.py --lossless-png
+    python png_optimizer.py img/logo_gob.png --effort maximo   # sin escribir
+"""
+
+import io
+import time
+import zlib
+import struct
+import argparse
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from PIL import Image
+from backup_store import backup_file
+from image_io import atomic_write
+from compression_manifest import (load_manifest, save_manifest, file_hash, params_key,
+                                  known_output, is_up_to_date, record)
+from run_report import image_record, log_image
+from watch_images import scan_images
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+# Bloques auxiliares que se copian del original
+KEEP_CHUNKS = (b'iCCP', b'sRGB', b'gAMA', b'cHRM', b'pHYs')
+
+# Filtros PNG; ADAPTIVE elige uno por fila
+FILTER_NAMES = {0: 'none', 1: 'sub', 2: 'up', 3: 'average', 4: 'paeth', 5: 'adaptativo'}
+ADAPTIVE = 5
+
+# Por esfuerzo: filtros candidatos, cuántos pasan la criba con zlib 1 y
+# (nivel, estrategia) de zlib que se prueban con ellos
+EFFORTS = {
+    'rapido': {'filters': (0, ADAPTIVE), 'keep': 1,
+               'zlib': ((9, zlib.Z_DEFAULT_STRATEGY),)},
+    'normal': {'filters': (0, 1, 2, 3, 4, ADAPTIVE), 'keep': 2,
+               'zlib': ((9, zlib.Z_DEFAULT_STRATEGY), (9, zlib.Z_FILTERED),
+                        (9, zlib.Z_RLE))},
+    'maximo': {'filters': (0, 1, 2, 3, 4, ADAPTIVE), 'keep': 6,
+               'zlib': ((9, zlib.Z_DEFAULT_STRATEGY), (6, zlib.Z_DEFAULT_STRATEGY),
+                        (9, zlib.Z_FILTERED), (6, zlib.Z_FILTERED), (9, zlib.Z_RLE),
+                        (9, zlib.Z_HUFFMAN_ONLY))},
+}
+DEFAULT_EFFORT = 'normal'
+
+STRATEGY_NAMES = {zlib.Z_DEFAULT_STRATEGY: 'default', zlib.Z_FILTERED: 'filtered',
+                  zlib.Z_RLE: 'rle', zlib.Z_HUFFMAN_ONLY: 'huffman'}
+
+# Filas que se filtran a la vez (acota la memoria en imágenes grandes)
+FILTER_BLOCK_ROWS = 256
+
+SUPPORTED_MODES = ('1', 'L', 'LA', 'P', 'PA', 'RGB', 'RGBA')
+
+def read_chunks(path):
+    """(tipo, datos) de los bloques KEEP_CHUNKS de un PNG, en su orden"""
+    chunks = []
+    with open(path, 'rb') as f:
+        if f.read(8) != PNG_SIGNATURE:
+            raise ValueError("el contenido no es PNG (¿un JPEG renombrado?)")
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                break
+            length, kind = struct.unpack('>I4s', header)
+            if kind in (b'IDAT', b'IEND'):
+                break
+            data = f.read(length)
+            f.seek(4, 1)  # CRC
+            if kind in KEEP_CHUNKS:
+                chunks.append((kind, data))
+    return chunks
+
+def _pack_bits(values, depth):
+    """Empaqueta muestras de depth bits (1, 2, 4) en filas de bytes"""
+    if depth == 8:
+        return values
+    per_byte = 8 // depth
+    height, width = values.shape
+    padded = np.zeros((height, -(-width // per_byte) * per_byte), dtype=np.uint8)
+    padded[:, :width] = values
+    groups = padded.reshape(height, -1, per_byte)
+    packed = np.zeros(groups.shape[:2], dtype=np.uint8)
+    for k in range(per_byte):
+        packed |= groups[..., k] << (8 - depth * (k + 1))
+    return packed
+
+def _bit_depth(count):
+    """Menor profundidad PNG que indexa count valores"""
+    for depth in (1, 2, 4):
+        if count <= 1 << depth:
+            return depth
+    return 8
+
+def reductions(img, allow_gray=True):
+    """
+    Representaciones PNG sin pérdida de una imagen
+
+    Args:
+        allow_gray: False si el original lleva un perfil ICC de color (un
+            PNG gris con un perfil RGB no es válido)
+
+    Returns:
+        dict nombre → {color_type, bit_depth, rows (filas de bytes sin
+        filtrar), bpp (bytes por píxel para los filtros), plte, trns}
+    """
+    rgba = img.convert('RGBA')
+    pixels = np.asarray(rgba)
+    height, width = pixels.shape[:2]
+    alpha = pixels[..., 3]
+    opaque = bool((alpha == 255).all())
+    candidates = {}
+
+    # getcolors devuelve None en cuanto hay más de 256 colores
+    colors = rgba.getcolors(256)
+    if colors:
+        # Primero las entradas con transparencia (tRNS más corto), luego las más frecuentes
+        colors.sort(key=lambda item: (item[1][3] == 255, -item[0]))
+        palette = np.array([color for _, color in colors], dtype=np.uint8)
+        packed = palette.view(np.uint32).ravel()
+        order = np.argsort(packed)
+        flat = np.ascontiguousarray(pixels).view(np.uint32)[..., 0]
+        indices = order[np.searchsorted(packed[order], flat)].astype(np.uint8)
+        depth = _bit_depth(len(palette))
+        translucent = np.nonzero(palette[:, 3] != 255)[0]
+        candidates['paleta'] = {
+            'color_type': 3, 'bit_depth': depth, 'bpp': 1,
+            'rows': _pack_bits(indices, depth),
+            'plte': palette[:, :3].tobytes(),
+            'trns': palette[:translucent[-1] + 1, 3].tobytes() if len(translucent) else None,
+        }
+
+    rgb = pixels[..., :3]
+    is_gray = bool((rgb[..., 0] == rgb[..., 1]).all() and (rgb[..., 1] == rgb[..., 2]).all())
+    if allow_gray and is_gray:
+        gray = rgb[..., 0]
+        if opaque:
+            depth = 8
+            for bits in (1, 2, 4):
+                step = 255 // ((1 << bits) - 1)
+                if not (gray % step).any():
+                    depth = bits
+                    break
+            samples = gray // (255 // ((1 << depth) - 1))
+            candidates['gris'] = {'color_type': 0, 'bit_depth': depth, 'bpp': 1,
+                                  'rows': _pack_bits(samples, depth)}
+        else:
+            candidates['gris'] = {'color_type': 4, 'bit_depth': 8, 'bpp': 2,
+                                  'rows': np.dstack((gray, alpha)).reshape(height, -1)}
+    else:
+        channels = 3 if opaque else 4
+        candidates['color'] = {'color_type': 2 if opaque else 6, 'bit_depth': 8,
+                               'bpp': channels,
+                               'rows': pixels[..., :channels].reshape(height, -1)}
+    return candidates
+
+def _filter_block(x, prev, bpp, kind):
+    """Filtra un bloque de filas (int16) dado la fila anterior al bloque"""
+    up = np.vstack((prev[None, :], x[:-1]))
+    left = np.zeros_like(x)
+    left[:, bpp:] = x[:, :-bpp]
+    if kind == 0:
+        return x
+    if kind == 1:
+        return x - left
+    if kind == 2:
+        return x - up
+    if kind == 3:
+        return x - (left + up) // 2
+    upper_left = np.zeros_like(x)
+    upper_left[:, bpp:] = up[:, :-bpp]
+    p = left + up - upper_left
+    pa, pb, pc = np.abs(p - left), np.abs(p - up), np.abs(p - upper_left)
+    predictor = np.where((pa <= pb) & (pa <= pc), left, np.where(pb <= pc, up, upper_left))
+    return x - predictor
+
+def filter_rows(rows, bpp, kind):
+    """Datos IDAT sin comprimir: cada fila con su byte de filtro delante"""
+    height, row_bytes = rows.shape
+    out = np.empty((height, row_bytes + 1), dtype=np.uint8)
+    prev = np.zeros(row_bytes, dtype=np.int16)
+    for start in range(0, height, FILTER_BLOCK_ROWS):
+        x = rows[start:start + FILTER_BLOCK_ROWS].astype(np.int16)
+        if kind == ADAPTIVE:
+            options = np.stack([_filter_block(x, prev, bpp, k) for k in range(5)])
+            # Heurística estándar: menor suma de |byte con signo|
+            cost = np.abs(options.astype(np.uint8).view(np.int8).astype(np.int32)).sum(axis=2)
+            best = cost.argmin(axis=0)
+            out[start:start + len(x), 0] = best
+            out[start:start + len(x), 1:] = options[best, np.arange(len(x))]
+        else:
+            out[start:start + len(x), 0] = kind
+            out[start:start + len(x), 1:] = _filter_block(x, prev, bpp, kind)
+        prev = x[-1]
+    return out.tobytes()
+
+def _chunk(kind, data):
+    return (struct.pack('>I', len(data)) + kind + data
+            + struct.pack('>I', zlib.crc32(kind + data) & 0xFFFFFFFF))
+
+def build_png(width, height, candidate, idat, extra_chunks=()):
+    """Arma el archivo PNG con IHDR, bloques auxiliares, PLTE/tRNS e IDAT"""
+    header = struct.pack('>IIBBBBB', width, height, candidate['bit_depth'],
+                         candidate['color_type'], 0, 0, 0)
+    parts = [PNG_SIGNATURE, _chunk(b'IHDR', header)]
+    parts += [_chunk(kind, data) for kind, data in extra_chunks]
+    if candidate.get('plte'):
+        parts.append(_chunk(b'PLTE', candidate['plte']))
+    if candidate.get('trns'):
+        parts.append(_chunk(b'tRNS', candidate['trns']))
+    parts.append(_chunk(b'IDAT', idat))
+    parts.append(_chunk(b'IEND', b''))
+    return b''.join(parts)
+
+def _load(path):
+    """Imagen cargada y si admite reducción a grises"""
+    img = Image.open(path)
+    img.load()
+    if img.mode not in SUPPORTED_MODES:
+        raise ValueError(f"modo {img.mode} no soportado")
+    return img, 'icc_profile' not in img.info
+
+def plan(path):
+    """Reducciones aplicables a una imagen (se calcula en el pool)"""
+    read_chunks(path)  # descarta pronto lo que no es PNG
+    img, allow_gray = _load(path)
+    with img:
+        return sorted(reductions(img, allow_gray))
+
+def _deflate(raw, level, strategy):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 15, 9, strategy)
+    return compressor.compress(raw) + compressor.flush()
+
+def trial(path, name, effort=DEFAULT_EFFORT):
+    """
+    Prueba una reducción con los filtros y estrategias de zlib del esfuerzo
+
+    Returns:
+        (bytes del PNG más pequeño, descripción, segundos)
+    """
+    start = time.perf_counter()
+    settings = EFFORTS[effort]
+    img, allow_gray = _load(path)
+    with img:
+        size = img.size
+        candidate = reductions(img, allow_gray)[name]
+
+    filtered = {kind: filter_rows(candidate['rows'], candidate['bpp'], kind)
+                for kind in settings['filters']}
+    if len(filtered) > settings['keep']:
+        # Criba: zlib 1 ordena los filtros casi igual que zlib 9, por una fracción del coste
+        ranked = sorted(filtered, key=lambda kind: len(_deflate(filtered[kind], 1,
+                                                                zlib.Z_DEFAULT_STRATEGY)))
+        filtered = {kind: filtered[kind] for kind in ranked[:settings['keep']]}
+
+    best = None
+    for kind, raw in filtered.items():
+        for level, strategy in settings['zlib']:
+            idat = _deflate(raw, level, strategy)
+            if best is None or len(idat) < len(best[0]):
+                best = (idat, kind, level, strategy)
+    idat, kind, level, strategy = best
+    data = build_png(size[0], size[1], candidate, idat, read_chunks(path))
+    description = (f"{name} {candidate['bit_depth']} bits, filtro {FILTER_NAMES[kind]}, "
+                   f"zlib {level} {STRATEGY_NAMES[strategy]}")
+    return data, description, time.perf_counter() - start
+
+def same_pixels(path, data):
+    """True si el PNG nuevo decodifica a exactamente los mismos píxeles RGBA"""
+    with Image.open(path) as original, Image.open(io.BytesIO(data)) as optimized:
+        if original.size != optimized.size:
+            return False
+        return np.array_equal(np.asarray(original.convert('RGBA')),
+                              np.asarray(optimized.convert('RGBA')))
+
+def lossless_key(manifest, path, effort):
+    """
+    Clave de la optimización sin pérdida de un PNG de img/
+
+    Se calcula sobre el original (el de la compresión que generó el PNG, si
+    la hubo), igual que las demás claves del manifiesto.
+    """
+    entry = known_output(manifest, path)
+    source_hash = entry['source_hash'] if entry is not None else file_hash(path)
+    return params_key(source_hash, profile='png_lossless', effort=effort)
+
+def _submit_trials(executor, path, names, effort):
+    return [executor.submit(trial, path, name, effort) for name in names]
+
+def _best(futures):
+    """El resultado más pequeño de las pruebas de una imagen"""
+    results = [future.result() for future in futures]
+    cpu = sum(seconds for _, _, seconds in results)
+    data, description, _ = min(results, key=lambda result: len(result[0]))
+    return data, description, cpu
+
+def optimize_folder(folder_path, backup_folder, jobs=None, effort=DEFAULT_EFFORT,
+                    only=None, report=None):
+    """
+    Optimiza sin pérdida todos los PNG de una carpeta
+
+    Los originales se respaldan en backup_folder como en compress_images.
+    Un PNG que ya es salida de este modo con el mismo esfuerzo se salta.
+    Si el PNG es salida de otra compresión, su entrada del manifiesto
+    conserva la clave y el original de esa compresión, y la optimización
+    se anota en 'covers': así esa compresión no lo vuelve a generar.
+
+    Returns:
+        (bytes antes, bytes después)
+    """
+    folder = Path(folder_path)
+    manifest = load_manifest()
+    paths = []
+    for path in sorted(scan_images(folder, only)):
+        if path.suffix.lower() != '.png':
+            continue
+        if is_up_to_date(manifest, path, lossless_key(manifest, path, effort)):
+            continue
+        paths.append(path)
+    print(f"\n🗜️  PNG sin pérdida ({effort}): {len(paths)} imágenes pendientes")
+
+    before = after = 0
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        plans = list(executor.map(_plan_or_error, paths))
+        pending = []
+        for path, names in zip(paths, plans):
+            if isinstance(names, Exception):
+                print(f"  ✗ {path.relative_to(folder).as_posix()}: {names}")
+                continue
+            pending.append((path, _submit_trials(executor, path, names, effort)))
+
+        for path, futures in pending:
+            name = path.relative_to(folder).as_posix()
+            size = path.stat().st_size
+            image = image_record(path, source=path.as_posix(), bytes_before=size,
+                                 format='PNG', variant='lossless')
+            try:
+                data, description, cpu = _best(futures)
+            except Exception as e:
+                print(f"  ✗ {name}: {e}")
+                continue
+            image['stages']['encode'] = round(cpu, 6)
+
+            verify_start = time.perf_counter()
+            identical = same_pixels(path, data)
+            image['stages']['verify'] = round(time.perf_counter() - verify_start, 6)
+
+            entry = known_output(manifest, path)
+            if entry is not None:
+                source_path, source_hash = Path(entry['source']), entry['source_hash']
+            else:
+                source_path, source_hash = backup_folder / path.relative_to(folder), file_hash(path)
+            key = params_key(source_hash, profile='png_lossless', effort=effort)
+
+            if not identical:
+                print(f"  ✗ {name}: la prueba ganadora no es idéntica, se mantiene")
+                image['error'] = 'pixels differ'
+                data = None
+            elif len(data) >= size:
+                print(f"  → {name}: ya es óptimo ({size / 1024:.0f} KB)")
+                data = None
+            else:
+                if entry is None:
+                    backup_file(path, source_path, backup_folder)
+                atomic_write(path, data)
+                print(f"  ✓ {name}: {size / 1024:.0f} KB → {len(data) / 1024:.0f} KB "
+                      f"(-{(1 - len(data) / size) * 100:.1f}%) {description}")
+            # También se anota lo que se mantiene (ya óptimo o prueba no idéntica):
+            # repetir con el mismo esfuerzo no vuelve a probarlo
+            if entry is not None:
+                # La clave sigue siendo la de la compresión que generó el PNG
+                record(manifest, entry['key'], source_path, source_hash, path,
+                       covers=entry.get('covers', []) + [key])
+            elif data is not None:
+                record(manifest, key, source_path, source_hash, path)
+            else:
+                # Sin respaldo: el archivo de img/ sigue siendo su propio original
+                record(manifest, key, path, source_hash, path)
+            save_manifest(manifest)
+
+            image.update(output=path.as_posix(), bytes_after=path.stat().st_size,
+                         kept_original=data is None)
+            log_image(report, image)
+            before += size
+            after += path.stat().st_size
+
+    if before:
+        print(f"📊 PNG: {before / (1024 * 1024):.2f} MB → {after / (1024 * 1024):.2f} MB "
+              f"(-{(1 - after / before) * 100:.1f}%)")
+    return before, after
+
+def _plan_or_error(path):
+    """plan para el pool: devuelve el error en vez de lanzarlo"""
+    try:
+        return plan(path)
+    except Exception as e:
+        return e
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Prueba la optimización sin pérdida de PNG sueltos (no modifica nada)")
+    parser.add_argument('paths', nargs='+', type=Path, metavar='PNG')
+    parser.add_argument('--effort', choices=sorted(EFFORTS), default=DEFAULT_EFFORT)
+    parser.add_argument('--jobs', '-j', type=int, default=None)
+    parser.add_argument('--output', '-o', type=Path, default=None, metavar='CARPETA',
+                        help="Guardar aquí los PNG optimizados")
+    args = parser.parse_args()
+
+    with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+        pending = [(path, _submit_trials(executor, path, plan(path), args.effort))
+                   for path in args.paths]
+        for path, futures in pending:
+            data, description, cpu = _best(futures)
+            size = path.stat().st_size
+            status = "idéntico" if same_pixels(path, data) else "⚠️ DISTINTO"
+            print(f"{path}: {size / 1024:.0f} KB → {len(data) / 1024:.0f} KB "
+                  f"({(len(data) / size - 1) * 100:+.1f}%, {status}) {description}, "
+                  f"{cpu:.1f} s de CPU")
+            if args.output:
+                args.output.mkdir(parents=True, exist_ok=True)
+                (args.output / path.name).write_bytes(data)
+
+if __name__ == "__main__":
+    main()
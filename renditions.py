@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+Varias versiones de una imagen con una sola decodificación, con caché en disco
+
+De cada original se generan las versiones (renditions) que se pidan, todas
+desde el mismo búfer decodificado:
+
+- print: la versión para el PDF (JPEG, o PNG si el contenido lo pide)
+- screen: vista previa de ~1200 px para el editor web
+- thumb: miniatura de ~256 px
+
+Si todas las versiones pedidas tienen un tamaño máximo, el original se
+decodifica ya reducido (draft JPEG / reduce) y cada versión se remuestrea
+desde la anterior, de mayor a menor.
+
+Las versiones se guardan en CACHE_DIR con el nombre
+<hash del original>-<hash de la especificación>.<ext>, así que cambiar el
+original o los parámetros nunca devuelve una versión vieja. La caché tiene
+un tamaño máximo: cada acierto renueva la fecha del archivo y al pasarse se
+eliminan los menos usados recientemente (LRU).
+
+Uso:
+    python renditions.py img/graficos/figura_2_1.png --json
+    python renditions.py --warm --names screen thumb    # previsualizar todo img/
+    python renditions.py --stats
+"""
+
+import os
+import json
+import hashlib
+import argparse
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image
+from image_io import flatten_to_rgb, encode_jpeg, encode_png, atomic_write, load_reduced
+from image_classifier import (choose_format, to_palette, to_gray, gray_palette,
+                              FORMAT_JPEG, FORMAT_PALETTE)
+from image_budget import parse_size
+from compression_manifest import file_hash
+from run_report import stage, describe_source
+from watch_images import scan_images
+
+CACHE_DIR = Path(".rendition_cache")
+CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+# max_width/max_height None = sin límite; format 'auto' elige JPEG o PNG
+# según el contenido (los originales JPEG siguen siendo JPEG)
+RENDITIONS = {
+    'print': {'max_width': 3000, 'max_height': 3000, 'format': 'auto', 'quality': 90},
+    'screen': {'max_width': 1200, 'max_height': 1200, 'format': 'JPEG', 'quality': 82},
+    'thumb': {'max_width': 256, 'max_height': 256, 'format': 'JPEG', 'quality': 75},
+}
+
+EXTENSIONS = {'JPEG': '.jpg', 'PNG': '.png'}
+
+def spec_key(spec):
+    """Hash corto y estable de una especificación"""
+    encoded = json.dumps(spec, sort_keys=True).encode('utf-8')
+    return hashlib.sha256(encoded).hexdigest()[:12]
+
+def cache_path(source_hash, spec, fmt, cache_dir=CACHE_DIR):
+    """Ruta en la caché de una versión (repartida en subcarpetas como el almacén)"""
+    return (Path(cache_dir) / source_hash[:2]
+            / f"{source_hash}-{spec_key(spec)}{EXTENSIONS[fmt]}")
+
+def lookup(source_hash, spec, cache_dir=CACHE_DIR):
+    """Versión ya generada, o None; un acierto la marca como usada"""
+    for fmt in EXTENSIONS:
+        path = cache_path(source_hash, spec, fmt, cache_dir)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            continue
+        return path
+    return None
+
+def target_size(size, spec):
+    """Dimensiones de una versión: cabe en max_width x max_height, sin ampliar"""
+    width, height = size
+    ratio = min((spec.get('max_width') or width) / width,
+                (spec.get('max_height') or height) / height, 1.0)
+    return max(1, round(width * ratio)), max(1, round(height * ratio))
+
+def _encode(img, spec, source_format):
+    """Codifica una versión ya redimensionada; devuelve ('JPEG' o 'PNG', bytes)"""
+    kind = FORMAT_JPEG
+    if spec.get('format') == 'auto' and source_format != 'JPEG':
+        kind, _ = choose_format(img)
+    elif spec.get('format') == 'PNG':
+        kind = None
+    if kind == FORMAT_JPEG:
+        gray_img, _ = to_gray(flatten_to_rgb(img))
+        return 'JPEG', encode_jpeg(gray_img, spec.get('quality', 85),
+                                   progressive=spec.get('progressive', True))
+    if kind == FORMAT_PALETTE:
+        flat = flatten_to_rgb(img)
+        gray_img, gray = to_gray(flat, lossless=True)
+        return 'PNG', encode_png(gray_palette(gray_img)[0] if gray else to_palette(flat))
+    return 'PNG', encode_png(img)
+
+def render(source_path, specs, record=None):
+    """
+    Genera varias versiones de una imagen con una sola decodificación
+
+    Args:
+        specs: dict nombre → especificación (como las de RENDITIONS)
+        record: registro de run_report para los tiempos por etapa
+
+    Returns:
+        dict nombre → ('JPEG' o 'PNG', bytes)
+    """
+    def area(size):
+        return size[0] * size[1]
+
+    with Image.open(source_path) as img:
+        describe_source(record, img)
+        source_format = img.format
+        targets = {name: target_size(img.size, spec) for name, spec in specs.items()}
+        largest = max(targets.values(), key=area)
+        with stage(record, 'decode'):
+            # Sin límite en alguna versión, largest es el tamaño original y no se reduce
+            base = load_reduced(img, largest)
+        with stage(record, 'convert'):
+            if base.mode not in ('RGB', 'RGBA'):
+                has_alpha = 'A' in base.getbands() or 'transparency' in base.info
+                base = base.convert('RGBA' if has_alpha else 'RGB')
+
+        results = {}
+        current = base
+        for name in sorted(specs, key=lambda n: area(targets[n]), reverse=True):
+            with stage(record, 'resize'):
+                if current.size != targets[name]:
+                    current = current.resize(targets[name], Image.Resampling.LANCZOS)
+            with stage(record, 'encode'):
+                results[name] = _encode(current, specs[name], source_format)
+        return results
+
+def get_renditions(source_path, names=None, specs=RENDITIONS, cache_dir=CACHE_DIR,
+                   max_bytes=CACHE_MAX_BYTES, source_hash=None, record=None):
+    """
+    Rutas en la caché de las versiones pedidas de una imagen
+
+    Las que faltan se generan juntas (una decodificación) y se guardan.
+
+    Args:
+        names: versiones que se quieren (por defecto todas las de specs)
+        max_bytes: tamaño máximo de la caché tras guardar (None = no recortar)
+        source_hash: hash del original si ya se conoce
+
+    Returns:
+        dict nombre → ruta
+    """
+    names = list(names or specs)
+    source_hash = source_hash or file_hash(source_path)
+    paths = {name: lookup(source_hash, specs[name], cache_dir) for name in names}
+    missing = {name: specs[name] for name in names if paths[name] is None}
+    if record is not None:
+        record.update(cache_hits=len(names) - len(missing), cache_misses=len(missing))
+    if not missing:
+        return paths
+
+    for name, (fmt, data) in render(source_path, missing, record).items():
+        path = cache_path(source_hash, specs[name], fmt, cache_dir)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with stage(record, 'write'):
+            atomic_write(path, data)
+        paths[name] = path
+    if max_bytes is not None:
+        evict(cache_dir, max_bytes, keep=paths.values())
+    return paths
+
+def _entries(cache_dir):
+    """(mtime, tamaño, ruta) de cada archivo de la caché"""
+    entries = []
+    root = Path(cache_dir)
+    if not root.exists():
+        return entries
+    for folder in os.scandir(root):
+        if not folder.is_dir():
+            continue
+        for entry in os.scandir(folder.path):
+            if entry.is_file() and not entry.name.startswith('.'):
+                st = entry.stat()
+                entries.append((st.st_mtime_ns, st.st_size, Path(entry.path)))
+    return entries
+
+def cache_usage(cache_dir=CACHE_DIR):
+    """(archivos, bytes) que ocupa la caché"""
+    entries = _entries(cache_dir)
+    return len(entries), sum(size for _, size, _ in entries)
+
+def evict(cache_dir=CACHE_DIR, max_bytes=CACHE_MAX_BYTES, keep=()):
+    """
+    Elimina las versiones usadas hace más tiempo hasta que la caché cabe en max_bytes
+
+    Las rutas de keep (las que se acaban de pedir) nunca se eliminan.
+
+    Returns:
+        número de archivos eliminados
+    """
+    entries = sorted(_entries(cache_dir))
+    total = sum(size for _, size, _ in entries)
+    keep = {Path(p) for p in keep}
+    removed = 0
+    for _, size, path in entries:
+        if total <= max_bytes:
+            break
+        if path in keep:
+            continue
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            pass
+        total -= size
+        removed += 1
+    return removed
+
+def _warm_one(path, names, cache_dir):
+    """get_renditions para el pool (sin recortar: eso lo hace el proceso principal)"""
+    try:
+        return path, get_renditions(path, names, cache_dir=cache_dir, max_bytes=None), None
+    except Exception as e:
+        return path, None, e
+
+def warm_folder(folder_path, names=None, jobs=None, cache_dir=CACHE_DIR,
+                max_bytes=CACHE_MAX_BYTES, only=None):
+    """
+    Genera por adelantado las versiones de todas las imágenes de una carpeta
+
+    Returns:
+        dict ruta de la imagen → dict nombre → ruta en la caché
+    """
+    paths = sorted(scan_images(folder_path, only))
+    results = {}
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        for path, renditions, error in executor.map(_warm_one, paths,
+                                                     [names] * len(paths),
+                                                     [cache_dir] * len(paths)):
+            if error is not None:
+                print(f"  ✗ {path}: {error}")
+                continue
+            results[path] = renditions
+    removed = evict(cache_dir, max_bytes)
+    if removed:
+        print(f"🧹 Caché llena: {removed} versiones antiguas eliminadas")
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Versiones de impresión, vista previa y miniatura con caché en disco")
+    parser.add_argument('images', nargs='*', type=Path, metavar='IMAGEN')
+    parser.add_argument('--names', nargs='+', choices=sorted(RENDITIONS), default=None,
+                        help="Versiones que se generan (por defecto todas)")
+    parser.add_argument('--warm', action='store_true',
+                        help="Generar las versiones de todas las imágenes de img/")
+    parser.add_argument('--max-cache', type=parse_size, default=CACHE_MAX_BYTES,
+                        metavar='TAMAÑO', help="Tamaño máximo de la caché (por defecto 256MB)")
+    parser.add_argument('--jobs', '-j', type=int, default=None)
+    parser.add_argument('--json', action='store_true',
+                        help="Escribir en la salida estándar un JSON imagen → versión → ruta")
+    parser.add_argument('--stats', action='store_true', help="Mostrar el uso de la caché")
+    args = parser.parse_args()
+
+    if args.warm:
+        results = warm_folder(Path("img"), args.names, jobs=args.jobs,
+                              max_bytes=args.max_cache)
+    else:
+        results = {path: get_renditions(path, args.names, max_bytes=None)
+                   for path in args.images}
+        evict(CACHE_DIR, args.max_cache,
+              keep=[p for renditions in results.values() for p in renditions.values()])
+
+    if args.json:
+        print(json.dumps({Path(image).as_posix(): {name: path.as_posix()
+                                                   for name, path in renditions.items()}
+                          for image, renditions in results.items()},
+                         indent=2, ensure_ascii=False))
+    elif results:
+        for image, renditions in results.items():
+            print(f"🖼️  {Path(image).as_posix()}")
+            for name, path in renditions.items():
+                print(f"   {name:<7} {path.stat().st_size / 1024:8.0f} KB  {path.as_posix()}")
+    if args.stats or not (results or args.warm):
+        count, size = cache_usage()
+        print(f"📦 Caché {CACHE_DIR}/: {count} versiones, {size / (1024 * 1024):.1f} MB "
+              f"de {args.max_cache / (1024 * 1024):.1f} MB")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Informes estructurados de las pasadas de compresión
+
+Cada imagen procesada genera un registro con su origen (ruta, dimensiones,
+modo), el resultado (formato, calidad, bytes antes y después) y el tiempo
+de cada etapa: decode, classify, convert, resize, encode y write. Los
+registros se añaden como JSON Lines (una línea por imagen y una de resumen
+por ejecución), así que varias ejecuciones se pueden acumular en el mismo
+archivo y analizar después:
+
+    python compress_images.py --report informe.jsonl
+    python compress_images.py --report informe.jsonl --profile cpu
+
+Con --profile se perfila la ejecución completa: 'cpu' usa cProfile y
+'memory' tracemalloc.
+"""
+
+import io
+import json
+import time
+import uuid
+import pstats
+import cProfile
+import tracemalloc
+import contextlib
+from pathlib import Path
+from datetime import datetime
+
+# Líneas de las tablas de perfilado que se muestran
+PROFILE_TOP = 15
+
+def open_report(path, script):
+    """
+    Inicia el informe de una ejecución
+
+    Returns:
+        dict del informe, o None si path es None (informe desactivado)
+    """
+    if path is None:
+        return None
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    return {
+        'path': Path(path),
+        'run': uuid.uuid4().hex[:12],
+        'script': script,
+        'started': datetime.now().isoformat(timespec='seconds'),
+        'start_time': time.perf_counter(),
+        'images': 0,
+        'bytes_before': 0,
+        'bytes_after': 0,
+    }
+
+def image_record(path, **fields):
+    """Registro vacío de una imagen; las etapas se rellenan con stage()"""
+    record = {'path': Path(path).as_posix(), 'stages': {}}
+    record.update(fields)
+    return record
+
+@contextlib.contextmanager
+def stage(record, name):
+    """Cronometra una etapa y suma su duración en record['stages'][name]"""
+    if record is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        record['stages'][name] = round(record['stages'].get(name, 0.0) + elapsed, 6)
+
+def describe_source(record, img):
+    """Anota dimensiones, modo y formato de la imagen original"""
+    if record is not None:
+        record.update(width=img.width, height=img.height, mode=img.mode,
+                      source_format=img.format)
+
+def _append(report, line):
+    with open(report['path'], 'a', encoding='utf-8') as f:
+        f.write(json.dumps(line, ensure_ascii=False) + '\n')
+
+def log_image(report, record):
+    """Añade el registro de una imagen al informe (se escribe al momento)"""
+    if report is None or record is None:
+        return
+    line = {'type': 'image', 'run': report['run'], 'script': report['script']}
+    line.update(record)
+    line['total_s'] = round(sum(record['stages'].values()), 6)
+    _append(report, line)
+    report['images'] += 1
+    report['bytes_before'] += record.get('bytes_before') or 0
+    report['bytes_after'] += record.get('bytes_after') or 0
+
+def close_report(report, **totals):
+    """Escribe la línea de resumen de la ejecución"""
+    if report is None:
+        return
+    line = {
+        'type': 'summary',
+        'run': report['run'],
+        'script': report['script'],
+        'started': report['started'],
+        'wall_s': round(time.perf_counter() - report['start_time'], 3),
+        'images': report['images'],
+        'bytes_before': report['bytes_before'],
+        'bytes_after': report['bytes_after'],
+    }
+    line.update(totals)
+    _append(report, line)
+    print(f"📝 Informe de la ejecución en: {report['path']}")
+
+@contextlib.contextmanager
+def profiling(kind, output=None):
+    """
+    Perfila el bloque con cProfile ('cpu') o tracemalloc ('memory')
+
+    Al terminar muestra las funciones o líneas que más cuestan. Con
+    output, el perfil de CPU se guarda además en ese archivo (.prof,
+    legible con pstats o snakeviz).
+    """
+    if kind is None:
+        yield
+        return
+
+    if kind == 'cpu':
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            if output:
+                profiler.dump_stats(output)
+                print(f"🔬 Perfil de CPU guardado en: {output}")
+            stream = io.StringIO()
+            pstats.Stats(profiler, stream=stream).sort_stats('cumulative').print_stats(PROFILE_TOP)
+            print(stream.getvalue())
+        return
+
+    tracemalloc.start()
+    try:
+        yield
+    finally:
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"🔬 Memoria Python: actual {current / (1024 * 1024):.1f} MB, "
+              f"pico {peak / (1024 * 1024):.1f} MB")
+        print("   (los búferes de píxeles de Pillow no pasan por tracemalloc)")
+        for stat in snapshot.statistics('lineno')[:PROFILE_TOP]:
+            print(f"   {stat}")
+
+def add_report_arguments(parser):
+    """Añade --report y --profile a un ArgumentParser"""
+    parser.add_argument('--report', type=Path, default=None, metavar='JSONL',
+                        help="Añadir un registro por imagen (tiempos por etapa, bytes, "
+                             "formato) a este archivo JSON Lines")
+    parser.add_argument('--profile', choices=['cpu', 'memory'], default=None,
+                        help="Perfilar la ejecución con cProfile (cpu) o tracemalloc (memory)")
+    parser.add_argument('--profile-output', type=Path, default=None, metavar='PROF',
+                        help="Guardar el perfil de CPU en este archivo")
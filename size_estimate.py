@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Estimación rápida del tamaño comprimido sin tocar img/
+
+Para cada imagen se decodifica una versión reducida (draft JPEG / reduce
+entero), se toman varias teselas repartidas por la imagen, remuestreadas
+ya a la resolución final, y se codifican juntas en un mosaico con los
+mismos parámetros que la compresión real. Los bytes por píxel del mosaico
+se extrapolan al tamaño final. Las imágenes pequeñas se codifican enteras.
+
+La estimación se guarda en ESTIMATE_PATH; si después se hace la
+compresión real con los mismos parámetros, compare_estimate muestra el
+error de la predicción.
+"""
+
+import json
+from pathlib import Path
+from datetime import datetime
+from PIL import Image
+from image_io import flatten_to_rgb, encode_jpeg, encode_png, load_reduced
+from image_classifier import (choose_format, to_palette, to_gray, gray_palette,
+                              FORMAT_JPEG, FORMAT_LOSSLESS, FORMAT_PALETTE)
+from image_quality import find_quality
+
+ESTIMATE_PATH = Path(".size_estimate.json")
+
+# Mosaico de SAMPLE_GRID x SAMPLE_GRID teselas de SAMPLE_TILE píxeles
+# (múltiplo de 16 para alinear los bloques JPEG con submuestreo de color)
+SAMPLE_TILE = 128
+SAMPLE_GRID = 4
+
+def target_size(size, max_size):
+    """Dimensiones finales tras thumbnail(max_size), sin ampliar"""
+    width, height = size
+    ratio = min(max_size[0] / width, max_size[1] / height, 1.0)
+    return max(1, round(width * ratio)), max(1, round(height * ratio))
+
+def _mosaic(img, size):
+    """
+    Teselas de la imagen remuestreadas a la escala final, en una cuadrícula
+
+    Cada tesela cubre SAMPLE_TILE píxeles de la imagen final; se toman
+    centradas en una rejilla regular para cubrir toda la imagen.
+    """
+    scale_x = img.width / size[0]
+    scale_y = img.height / size[1]
+    mosaic = Image.new(img.mode, (SAMPLE_TILE * SAMPLE_GRID, SAMPLE_TILE * SAMPLE_GRID))
+    for row in range(SAMPLE_GRID):
+        for col in range(SAMPLE_GRID):
+            # Esquina de la tesela en coordenadas de la imagen final
+            x = (size[0] - SAMPLE_TILE) * (col + 0.5) / SAMPLE_GRID
+            y = (size[1] - SAMPLE_TILE) * (row + 0.5) / SAMPLE_GRID
+            box = (x * scale_x, y * scale_y,
+                   (x + SAMPLE_TILE) * scale_x, (y + SAMPLE_TILE) * scale_y)
+            tile = img.resize((SAMPLE_TILE, SAMPLE_TILE), Image.Resampling.LANCZOS, box=box)
+            mosaic.paste(tile, (col * SAMPLE_TILE, row * SAMPLE_TILE))
+    return mosaic
+
+def _encode(img, fmt, quality, target_ssim=None):
+    """Codifica como lo haría compress_images.encode_image; devuelve (bytes, calidad)"""
+    if fmt == FORMAT_JPEG and target_ssim:
+        quality, data, _ = find_quality(img, target_ssim)
+        return data, quality
+    if fmt == FORMAT_JPEG:
+        return encode_jpeg(img, quality), quality
+    if fmt == FORMAT_PALETTE:
+        gray_img, gray = to_gray(img, lossless=True)
+        img = gray_palette(gray_img)[0] if gray else to_palette(img)
+    return encode_png(img), None
+
+def estimate_image(source_path, quality=85, max_size=(1920, 1080), auto_format=False,
+                   target_ssim=None):
+    """
+    Predice el tamaño de la salida de compress_images para una imagen
+
+    Returns:
+        dict con format ('JPEG' o 'PNG'), bytes estimados, width, height
+        finales, quality y exact (True si se codificó la imagen completa)
+    """
+    with Image.open(source_path) as img:
+        source_format = img.format
+        size = target_size(img.size, max_size)
+        img = load_reduced(img, size)
+
+        fmt = FORMAT_JPEG
+        if auto_format and source_format != 'JPEG':
+            fmt, _ = choose_format(img)
+        img = img.convert('RGBA') if fmt == FORMAT_LOSSLESS else flatten_to_rgb(img)
+        if fmt == FORMAT_JPEG:
+            img, _ = to_gray(img)
+
+        container = 'JPEG' if fmt == FORMAT_JPEG else 'PNG'
+        pixels = size[0] * size[1]
+        if pixels <= 2 * (SAMPLE_TILE * SAMPLE_GRID) ** 2:
+            # Imagen pequeña: codificarla entera cuesta poco
+            if img.size != size:
+                img = img.resize(size, Image.Resampling.LANCZOS)
+            data, used_quality = _encode(img, fmt, quality, target_ssim)
+            return {'format': container, 'bytes': len(data), 'width': size[0],
+                    'height': size[1], 'quality': used_quality, 'exact': True}
+
+        mosaic = _mosaic(img, size)
+        data, used_quality = _encode(mosaic, fmt, quality, target_ssim)
+        # Cabeceras y tablas no escalan con los píxeles
+        header, _ = _encode(mosaic.resize((16, 16)), fmt, used_quality or quality)
+        per_pixel = max(len(data) - len(header), 0) / (mosaic.width * mosaic.height)
+        return {'format': container, 'bytes': round(len(header) + per_pixel * pixels),
+                'width': size[0], 'height': size[1], 'quality': used_quality,
+                'exact': False}
+
+def save_estimate(params, images, path=ESTIMATE_PATH):
+    """
+    Guarda una estimación para compararla con la próxima compresión real
+
+    Args:
+        params: parámetros de la compresión (deben coincidir para comparar)
+        images: dict ruta de salida prevista → bytes estimados
+    """
+    data = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'params': params,
+        'images': images,
+        'total': sum(images.values()),
+    }
+    Path(path).write_text(json.dumps(data, indent=2, ensure_ascii=False), encoding='utf-8')
+
+def compare_estimate(params, path=ESTIMATE_PATH):
+    """
+    Compara la última estimación con los archivos tras la compresión real
+
+    Solo se compara si la estimación se hizo con los mismos parámetros; la
+    estimación se descarta después para no compararla dos veces.
+
+    Returns:
+        dict con predicted, actual (bytes), error (relativo del total) y
+        mean_abs_error (medio por imagen), o None si no hay estimación
+    """
+    path = Path(path)
+    if not path.exists():
+        return None
+    data = json.loads(path.read_text(encoding='utf-8'))
+    path.unlink()
+    if data.get('params') != params:
+        return None
+
+    predicted = actual = 0
+    errors = []
+    for output, estimated in data['images'].items():
+        if not Path(output).exists():
+            continue
+        size = Path(output).stat().st_size
+        predicted += estimated
+        actual += size
+        if size:
+            errors.append(abs(estimated - size) / size)
+    if not actual:
+        return None
+    return {
+        'predicted': predicted,
+        'actual': actual,
+        'error': (predicted - actual) / actual,
+        'mean_abs_error': sum(errors) / len(errors),
+    }
@@ -0,0 +1,35 @@
+"""
+Utilidades comunes de las pruebas de los scripts de imágenes
+
+Los scripts trabajan con rutas relativas (img/, img_backup/, el
+manifiesto), así que cada prueba corre en una carpeta temporal propia.
+"""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+from PIL import Image
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """Carpeta de proyecto vacía con img/ e img_backup/ como directorio actual"""
+    (tmp_path / 'img').mkdir()
+    (tmp_path / 'img_backup').mkdir()
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+@pytest.fixture
+def make_image():
+    """Crea una imagen de ruido (incomprimible para que siempre haya ahorro)"""
+    def make(path, size=(640, 480), seed=0, **save_args):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        rng = np.random.default_rng(seed)
+        pixels = rng.integers(0, 256, (size[1], size[0], 3), dtype=np.uint8)
+        Image.fromarray(pixels).save(path, **save_args)
+        return path
+    return make
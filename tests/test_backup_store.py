@@ -0,0 +1,36 @@
+"""Pruebas del almacén de respaldos: restauraciones editables"""
+
+import os
+import stat
+from pathlib import Path
+
+from backup_store import backup_file, restore_folder, link_or_copy
+
+def _writable_copy(target, backup):
+    st, sb = os.stat(target), os.stat(backup)
+    return (st.st_ino != sb.st_ino) and bool(st.st_mode & stat.S_IWUSR)
+
+def test_restore_gives_writable_copies(workdir, make_image):
+    path = make_image('img/figura.png', seed=1)
+    original = path.read_bytes()
+    backup_file(path, Path('img_backup/figura.png'), Path('img_backup'))
+    path.write_bytes(b'editada')
+
+    restore_folder(Path('img'), Path('img_backup'))
+
+    assert path.read_bytes() == original
+    assert _writable_copy(path, 'img_backup/figura.png')
+    # Guardar encima de la imagen restaurada no toca el respaldo
+    path.write_bytes(b'otra edicion')
+    assert Path('img_backup/figura.png').read_bytes() == original
+
+def test_restore_breaks_old_hardlinks_to_the_store(workdir, make_image):
+    path = make_image('img/figura.png', seed=2)
+    backup_file(path, Path('img_backup/figura.png'), Path('img_backup'))
+    # Como dejaban las restauraciones anteriores: img/ enlazado al objeto
+    link_or_copy('img_backup/figura.png', path)
+
+    counts = restore_folder(Path('img'), Path('img_backup'))
+
+    assert counts['restored'] == 1
+    assert _writable_copy(path, 'img_backup/figura.png')
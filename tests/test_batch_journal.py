@@ -0,0 +1,77 @@
+"""Pruebas del diario de lotes: interrupción tras reemplazar, --rollback y --resume"""
+
+from pathlib import Path
+
+import pytest
+
+import compress_quick
+from compress_quick import compress_all_images
+from batch_journal import JOURNAL_PATH, read_journal, pending_paths, rollback
+from compression_manifest import load_manifest, file_hash
+
+@pytest.fixture
+def crashed_batch(workdir, make_image, monkeypatch):
+    """Lote de compress_quick interrumpido justo después de reemplazar la segunda imagen"""
+    originals = {}
+    for i in range(3):
+        path = make_image(f'img/figura_{i}.png', seed=i)
+        originals[path.as_posix()] = file_hash(path)
+
+    real_record = compress_quick.record
+    calls = []
+    def record_then_crash(manifest, key, source_path, source_hash, output_path):
+        calls.append(Path(output_path))
+        if len(calls) == 2:
+            # Ctrl+C entre el reemplazo y el manifiesto
+            raise KeyboardInterrupt
+        real_record(manifest, key, source_path, source_hash, output_path)
+    monkeypatch.setattr(compress_quick, 'record', record_then_crash)
+    compress_all_images()
+    monkeypatch.setattr(compress_quick, 'record', real_record)
+    return originals, calls
+
+def test_crash_after_replace_leaves_journal(crashed_batch):
+    originals, calls = crashed_batch
+    state = read_journal()
+
+    assert JOURNAL_PATH.exists()
+    assert len(state['planned']) == 3
+    # La primera imagen terminó; la segunda ya se reemplazó pero no llegó a done
+    assert len(pending_paths(state)) == 2
+    assert calls[1].exists()
+    assert not calls[1].with_suffix('.png').exists()
+
+def test_rollback_restores_original_hashes(crashed_batch):
+    originals, _ = crashed_batch
+
+    counts = rollback()
+
+    for path, digest in originals.items():
+        assert file_hash(path) == digest
+    # Los JPEG que creó el lote desaparecen y el manifiesto vuelve a estar vacío
+    assert sorted(p.name for p in Path('img').iterdir()) == sorted(
+        Path(p).name for p in originals)
+    assert counts['removed'] == 2
+    assert load_manifest()['outputs'] == {}
+    assert not JOURNAL_PATH.exists()
+
+def test_resume_processes_only_pending_images(crashed_batch, monkeypatch):
+    _, calls = crashed_batch
+    pending = pending_paths(read_journal())
+
+    encoded = []
+    real_encode = compress_quick.encode_quick
+    def spy(source_path, record=None):
+        encoded.append(Path(source_path).stem)
+        return real_encode(source_path, record)
+    monkeypatch.setattr(compress_quick, 'encode_quick', spy)
+    compress_all_images(state=read_journal())
+
+    # La imagen terminada antes del corte no se vuelve a codificar
+    assert sorted(encoded) == sorted(p.stem for p in pending)
+    assert calls[0].stem not in encoded
+    outputs = load_manifest()['outputs']
+    for i in range(3):
+        assert f'img/figura_{i}.jpg' in outputs
+        assert not Path(f'img/figura_{i}.png').exists()
+    assert not JOURNAL_PATH.exists()
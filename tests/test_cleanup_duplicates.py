@@ -0,0 +1,23 @@
+"""Pruebas de cleanup_duplicates: el manifiesto tras enlazar copias"""
+
+import shutil
+from pathlib import Path
+
+from cleanup_duplicates import apply_actions
+from compression_manifest import load_manifest, params_key, record, is_up_to_date
+
+def test_linked_copy_inherits_keeper_entry(workdir, make_image):
+    keeper = make_image('img/mapa.jpg', seed=6)
+    shutil.copy(keeper, 'img/mapa_copia.jpg')
+    copy = Path('img/mapa_copia.jpg')
+    manifest = load_manifest()
+    key = params_key('abc', profile='compress_images', quality=92)
+    record(manifest, key, 'img_backup/mapa.png', 'abc', keeper)
+
+    apply_actions([('link', copy, keeper, copy.stat().st_size)], manifest)
+
+    manifest = load_manifest()
+    entry = manifest['outputs']['img/mapa_copia.jpg']
+    assert entry['source'] == 'img_backup/mapa.png'
+    assert entry['output_mtime_ns'] == copy.stat().st_mtime_ns
+    assert is_up_to_date(manifest, copy, key)
@@ -0,0 +1,75 @@
+"""Pruebas de compress_images: colisiones de nombre y re-ejecuciones sin cambios"""
+
+from pathlib import Path
+
+import compress_images
+from compress_images import compress_images_in_folder, _compress_one
+from compression_manifest import load_manifest, file_hash
+
+def test_stem_collision_does_not_overwrite_other_image(workdir, make_image):
+    png = make_image('img/portada.png', seed=1)
+    jpg = make_image('img/portada.jpg', seed=2, quality=100)
+    png_bytes, jpg_bytes = png.read_bytes(), jpg.read_bytes()
+
+    compress_images_in_folder(Path('img'), Path('img_backup'), quality=92, jobs=2)
+
+    # portada.png se deja tal cual: su salida sería portada.jpg
+    assert png.read_bytes() == png_bytes
+    # portada.jpg se comprimió desde sí misma y su respaldo es el original real
+    assert Path('img_backup/portada.jpg').read_bytes() == jpg_bytes
+    entry = load_manifest()['outputs']['img/portada.jpg']
+    assert entry['source_hash'] == file_hash('img_backup/portada.jpg')
+    assert not Path('img_backup/portada.png').exists()
+
+def test_every_original_is_backed_up_before_writing(workdir, make_image):
+    for i in range(4):
+        make_image(f'img/figura_{i}.png', seed=i)
+
+    compress_images_in_folder(Path('img'), Path('img_backup'), quality=92, jobs=2)
+
+    manifest = load_manifest()
+    for i in range(4):
+        entry = manifest['outputs'][f'img/figura_{i}.jpg']
+        assert file_hash(entry['source']) == entry['source_hash']
+
+def test_rerun_after_budget_pass_changes_nothing(workdir, make_image, monkeypatch, capsys):
+    for i in range(3):
+        make_image(f'img/figura_{i}.png', seed=i)
+    # Presupuesto pequeño para que la pasada de calidad 92 no quepa
+    monkeypatch.setattr(compress_images, 'DEFAULT_BUDGET_MB', 0.4)
+    monkeypatch.setattr('sys.argv', ['compress_images.py', '-j', '1'])
+
+    compress_images.main()
+    assert 'Ajustando al presupuesto' in capsys.readouterr().out
+    before = {p: p.stat().st_mtime_ns for p in Path('img').iterdir()}
+
+    compress_images.main()
+    out = capsys.readouterr().out
+    assert 'Sin cambios (según manifiesto): 3' in out
+    assert {p: p.stat().st_mtime_ns for p in Path('img').iterdir()} == before
+
+def test_jpeg_recompressed_in_place_is_not_reported_as_kept(workdir, make_image):
+    path = make_image('img/foto.jpg', seed=3, quality=100)
+    result = _compress_one(path, path, Path('img'), Path('img_backup'), 80)
+    assert result['output_path'] == path
+    assert result['compressed_size'] < result['original_size']
+    assert result['record']['kept_original'] is False
+
+def test_jpeg_suffix_is_kept(workdir, make_image):
+    path = make_image('img/foto.jpeg', seed=5, quality=100)
+    compress_images_in_folder(Path('img'), Path('img_backup'), quality=80, jobs=1)
+    assert path.exists() and not Path('img/foto.jpg').exists()
+    assert 'img/foto.jpeg' in load_manifest()['outputs']
+
+def test_failed_image_is_retried_on_next_run(workdir, make_image, capsys):
+    path = make_image('img/rota.png', seed=6)
+    path.write_bytes(path.read_bytes()[:2000])
+
+    compress_images_in_folder(Path('img'), Path('img_backup'), quality=92, jobs=1)
+    assert 'img/rota.png' not in load_manifest()['outputs']
+    capsys.readouterr()
+
+    compress_images_in_folder(Path('img'), Path('img_backup'), quality=92, jobs=1)
+    out = capsys.readouterr().out
+    assert 'Procesando: rota.png' in out
+    assert 'Sin cambios (según manifiesto): 0' in out
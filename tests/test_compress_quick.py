@@ -0,0 +1,22 @@
+"""Pruebas de compress_quick: los originales sustituidos no se pierden"""
+
+from pathlib import Path
+
+from compress_quick import compress_all_images
+from compression_manifest import load_manifest, file_hash
+
+def test_replaced_upload_is_backed_up_before_png_is_removed(workdir, make_image):
+    # Respaldo de una versión anterior de la figura y, en img/, la nueva
+    old = make_image('img_backup/figura.png', seed=1)
+    new = make_image('img/figura.png', seed=2)
+    old_hash, new_hash = file_hash(old), file_hash(new)
+
+    compress_all_images()
+
+    assert not Path('img/figura.png').exists()
+    assert file_hash('img_backup/figura.png') == new_hash
+    entry = load_manifest()['outputs']['img/figura.jpg']
+    assert entry['source'] == 'img_backup/figura.png'
+    assert entry['source_hash'] == new_hash
+    # La versión anterior sigue en el almacén
+    assert Path('img_backup/.objects', old_hash[:2], old_hash).exists()
@@ -0,0 +1,48 @@
+"""Pruebas del modo servicio: la respuesta refleja lo que hizo _compress_one"""
+
+import io
+import json
+
+from compression_worker import serve
+
+def _serve(lines, monkeypatch):
+    """Atiende las solicitudes por la entrada estándar y devuelve las respuestas por id"""
+    monkeypatch.setattr('sys.stdin', io.StringIO(''.join(json.dumps(r) + '\n' for r in lines)))
+    responses = io.BytesIO()
+    serve('img', 'img_backup', jobs=1, responses=responses)
+    return {r['id']: r for r in map(json.loads, responses.getvalue().decode().splitlines())}
+
+def test_status_of_jpeg_recompressed_in_place(workdir, make_image, monkeypatch):
+    make_image('img/foto.jpg', seed=1, quality=100)
+    make_image('img/figura.png', seed=2)
+
+    responses = _serve([{'id': 1, 'path': 'img/foto.jpg'},
+                        {'id': 2, 'path': 'img/figura.png'}], monkeypatch)
+
+    assert responses[1]['status'] == 'compressed'
+    assert responses[1]['output'] == 'img/foto.jpg'
+    assert responses[1]['bytes_after'] < responses[1]['bytes_before']
+    assert responses[2]['status'] == 'compressed'
+    assert responses[2]['output'] == 'img/figura.jpg'
+
+def test_status_when_nothing_to_gain_and_on_rerun(workdir, make_image, monkeypatch):
+    # Un JPEG ya muy comprimido: la calidad 92 no lo mejora
+    make_image('img/ligera.jpg', seed=3, quality=30)
+
+    first = _serve([{'id': 1, 'path': 'img/ligera.jpg'}], monkeypatch)
+    again = _serve([{'id': 1, 'path': 'img/ligera.jpg'}], monkeypatch)
+
+    assert first[1]['status'] == 'kept'
+    assert again[1]['status'] == 'up_to_date'
+
+def test_request_that_would_overwrite_another_image_fails(workdir, make_image, monkeypatch):
+    png = make_image('img/portada.png', seed=4)
+    jpg = make_image('img/portada.jpg', seed=5, quality=100)
+    png_bytes, jpg_bytes = png.read_bytes(), jpg.read_bytes()
+
+    responses = _serve([{'id': 1, 'path': 'img/portada.png'}], monkeypatch)
+
+    assert responses[1]['ok'] is False
+    assert 'portada.jpg' in responses[1]['error']
+    assert png.read_bytes() == png_bytes
+    assert jpg.read_bytes() == jpg_bytes
@@ -0,0 +1,16 @@
+"""Pruebas de fix_compression: nombres de salida"""
+
+from pathlib import Path
+
+from fix_compression import restore_and_recompress
+from compression_manifest import load_manifest
+
+def test_jpeg_original_keeps_its_suffix(workdir, make_image):
+    make_image('img_backup/foto.jpeg', size=(1200, 900), seed=4, quality=100)
+    make_image('img/foto.jpeg', size=(1200, 900), seed=4, quality=100)
+
+    restore_and_recompress()
+
+    assert Path('img/foto.jpeg').exists()
+    assert not Path('img/foto.jpg').exists()
+    assert 'img/foto.jpeg' in load_manifest()['outputs']
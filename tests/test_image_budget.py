@@ -0,0 +1,129 @@
+"""Pruebas del optimizador de presupuesto de image_budget"""
+
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from image_budget import (compress_to_budget, allocate, measure_options, with_keep,
+                          fit_data, QUALITY_MAX, QUALITY_MIN)
+
+def _folder_bytes():
+    return sum(p.stat().st_size for p in Path('img').rglob('*') if p.is_file())
+
+def test_png_with_alpha_and_small_charts_are_kept(workdir, make_image):
+    # Logotipo con transparencia y gráfica de colores planos de ~1 KB
+    logo = np.zeros((200, 300, 4), dtype=np.uint8)
+    logo[50:150, 50:250] = (120, 20, 60, 255)
+    Image.fromarray(logo, 'RGBA').save('img/logo.png')
+    chart = np.full((300, 400, 3), 255, dtype=np.uint8)
+    chart[100:200, 50:350] = (30, 80, 160)
+    Image.fromarray(chart).save('img/grafica.png')
+    make_image('img/foto.png', seed=1)
+    before = {p.name: p.read_bytes() for p in Path('img').iterdir()}
+
+    compress_to_budget(Path('img'), 200 * 1024, jobs=1)
+
+    assert Path('img/logo.png').read_bytes() == before['logo.png']
+    assert Path('img/grafica.png').read_bytes() == before['grafica.png']
+    # La fotografía sí pasa a JPEG para caber
+    assert not Path('img/foto.png').exists()
+    assert Path('img/foto.jpg').stat().st_size < len(before['foto.png'])
+
+def test_png_output_of_another_pass_stays_png(workdir, make_image):
+    from compress_images import compress_images_in_folder
+    rng = np.random.default_rng(0)
+    pixels = rng.choice([0, 90, 200, 255], size=(300, 400, 3)).astype(np.uint8)
+    Image.fromarray(pixels).save('img/mapa.png', compress_level=0)
+    compress_images_in_folder(Path('img'), Path('img_backup'), quality=92, jobs=1,
+                              auto_format=True)
+    png_bytes = Path('img/mapa.png').read_bytes()
+
+    compress_to_budget(Path('img'), 1024, jobs=1)
+
+    assert Path('img/mapa.png').read_bytes() == png_bytes
+    assert not Path('img/mapa.jpg').exists()
+
+def test_files_left_out_count_against_budget(workdir, make_image, capsys):
+    # portada.png no se puede convertir (pisaría portada.jpg) y cuenta tal cual
+    make_image('img/portada.png', seed=2)
+    make_image('img/portada.jpg', seed=3, quality=95)
+    for i in range(3):
+        make_image(f'img/figura_{i}.png', seed=10 + i)
+    budget = Path('img/portada.png').stat().st_size + 600 * 1024
+
+    total = compress_to_budget(Path('img'), budget, jobs=1)
+
+    assert total == _folder_bytes()
+    assert total <= budget
+    assert f"{total / (1024 * 1024):.2f} MB (presupuesto" in capsys.readouterr().out
+
+def test_opaque_alpha_channel_does_not_pin_format(workdir):
+    rng = np.random.default_rng(4)
+    pixels = rng.integers(0, 256, (480, 640, 4), dtype=np.uint8)
+    pixels[..., 3] = 255
+    Image.fromarray(pixels, 'RGBA').save('img/exportada.png')
+
+    compress_to_budget(Path('img'), 200 * 1024, jobs=1)
+
+    assert not Path('img/exportada.png').exists()
+    assert Path('img/exportada.jpg').stat().st_size <= 200 * 1024
+
+# Curvas sintéticas (bytes, pérdida, escala, calidad), de más bytes a menos
+CHEAP = [(1000, 0, 1.0, 92), (600, 2, 1.0, 85), (500, 30, 1.0, 50)]
+COSTLY = [(1000, 0, 1.0, 92), (800, 10, 1.0, 80), (700, 40, 1.0, 50)]
+
+def test_allocate_lowers_cheapest_loss_per_byte_first():
+    choice, total = allocate([COSTLY, CHEAP], 1600)
+
+    # Bajar CHEAP ahorra 400 bytes por 2 puntos; COSTLY solo 200 por 10
+    assert choice == [0, 1]
+    assert total == 1600
+
+def test_allocate_keeps_best_options_when_budget_already_met():
+    assert allocate([COSTLY, CHEAP], 5000) == ([0, 0], 2000)
+
+def test_allocate_impossible_budget_ends_at_smallest_options():
+    choice, total = allocate([COSTLY, CHEAP], 100)
+
+    assert choice == [2, 2]
+    assert total == 1200
+
+def test_allocate_tie_lowers_one_image_and_total_only_decreases():
+    choice, total = allocate([CHEAP, list(CHEAP)], 1700)
+
+    # Con dos curvas iguales basta bajar una
+    assert sorted(choice) == [0, 1]
+    assert total == 1600
+    # Un presupuesto menor nunca deja un total mayor
+    totals = [allocate([COSTLY, CHEAP], budget)[1] for budget in range(2000, 1000, -100)]
+    assert totals == sorted(totals, reverse=True)
+
+def test_with_keep_never_offers_a_larger_file():
+    curve = with_keep(CHEAP, (700, 1, None, None))
+
+    assert curve[0] == (700, 1, None, None)
+    assert [o[0] for o in curve] == [700, 600, 500]
+    # Un archivo actual peor que una opción más pequeña desaparece de la curva
+    assert with_keep(CHEAP, (700, 5, None, None)) == CHEAP[1:]
+
+def test_measure_options_is_a_pareto_frontier(workdir, make_image):
+    path = make_image('img/foto.png', size=(320, 240), seed=1)
+
+    curve = measure_options(path)
+
+    sizes = [o[0] for o in curve]
+    losses = [o[1] for o in curve]
+    assert sizes == sorted(sizes, reverse=True) and len(set(sizes)) == len(sizes)
+    assert losses == sorted(losses) and len(set(losses)) == len(losses)
+    assert curve[0][2:] == (1.0, QUALITY_MAX)
+    assert curve[-1][3] == QUALITY_MIN
+
+def test_fit_data_meets_a_feasible_budget(workdir, make_image):
+    path = make_image('img/foto.png', size=(320, 240), seed=1)
+    budget = measure_options(path)[0][0] // 2
+
+    data, scale, quality = fit_data(path, budget)
+
+    assert len(data) <= budget
+    assert (scale, quality) != (1.0, QUALITY_MAX)
@@ -0,0 +1,130 @@
+"""Pruebas de image_classifier: elección de JPEG o PNG y figuras en gris"""
+
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from compress_images import encode_image
+import image_classifier
+from image_classifier import (choose_format, to_palette, to_gray, gray_palette,
+                              FORMAT_JPEG, FORMAT_PALETTE, FORMAT_LOSSLESS)
+
+def _photo(seed=0, size=(320, 240)):
+    rng = np.random.default_rng(seed)
+    return Image.fromarray(rng.integers(0, 256, (size[1], size[0], 3), dtype=np.uint8))
+
+def _chart(size=(400, 300)):
+    """Gráfica de colores planos con texto fino (pocos colores, bordes nítidos)"""
+    pixels = np.full((size[1], size[0], 3), 255, dtype=np.uint8)
+    pixels[50:250, 40:120] = (200, 40, 40)
+    pixels[100:250, 160:240] = (40, 120, 200)
+    pixels[::20, :] = (128, 128, 128)
+    return Image.fromarray(pixels)
+
+def test_photograph_goes_to_jpeg():
+    fmt, stats = choose_format(_photo())
+
+    assert fmt == FORMAT_JPEG
+    assert stats['colors'] > 256
+
+def test_flat_chart_goes_to_palette():
+    fmt, stats = choose_format(_chart())
+
+    assert fmt == FORMAT_PALETTE
+    assert stats['colors'] <= 256
+    assert stats['flat_ratio'] > 0.7
+
+def test_transparency_goes_to_lossless_png():
+    logo = np.zeros((200, 300, 4), dtype=np.uint8)
+    logo[50:150, 50:250] = (120, 20, 60, 255)
+    fmt, stats = choose_format(Image.fromarray(logo, 'RGBA'))
+
+    assert fmt == FORMAT_LOSSLESS
+    assert stats['alpha_ratio'] > 0.5
+    # Un canal alfa totalmente opaco no cuenta como transparencia
+    opaque = _chart().convert('RGBA')
+    assert choose_format(opaque)[0] == FORMAT_PALETTE
+
+def test_to_palette_keeps_every_color_of_a_chart():
+    chart = _chart()
+
+    palette = to_palette(chart)
+
+    assert palette.mode == 'P'
+    assert np.array_equal(np.asarray(palette.convert('RGB')), np.asarray(chart))
+
+def test_auto_format_encodes_chart_as_png_and_photo_as_jpeg(workdir):
+    _chart().save('img/grafica.png')
+    _photo().save('img/foto.png')
+
+    fmt, data = encode_image('img/grafica.png', auto_format=True)
+    assert fmt == 'PNG'
+    with Image.open(io.BytesIO(data)) as img:
+        assert img.mode == 'P'
+        assert np.array_equal(np.asarray(img.convert('RGB')), np.asarray(_chart()))
+
+    assert encode_image('img/foto.png', auto_format=True)[0] == 'JPEG'
+    # Sin auto_format todo sale en JPEG
+    assert encode_image('img/grafica.png')[0] == 'JPEG'
+
+def _gray_rgb(levels=(0, 255), size=(200, 100), noise=0):
+    """Imagen RGB con franjas de los grises dados y, si noise, canales algo distintos"""
+    pixels = np.zeros((size[1], size[0], 3), dtype=np.int16)
+    for i, level in enumerate(levels):
+        pixels[:, i * size[0] // len(levels):] = level
+    pixels[..., 0] += noise
+    return Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8))
+
+def test_to_gray_tolerance_depends_on_output():
+    almost = _gray_rgb((10, 120, 240), noise=2)
+
+    # Para JPEG basta con canales casi iguales; para PNG deben ser idénticos
+    gray, is_gray = to_gray(almost)
+    assert is_gray and gray.mode == 'L'
+    assert to_gray(almost, lossless=True) == (almost, False)
+    exact, is_gray = to_gray(_gray_rgb((10, 120, 240)), lossless=True)
+    assert is_gray
+    assert sorted(np.unique(np.asarray(exact))) == [10, 120, 240]
+
+def test_color_found_outside_the_analysis_view_is_not_gray(monkeypatch):
+    # Un solo píxel de color en el último bloque de filas
+    pixels = np.asarray(_gray_rgb(size=(600, 600))).copy()
+    pixels[-1, -1] = (255, 0, 0)
+    monkeypatch.setattr(image_classifier, 'GRAY_BLOCK_ROWS', 64)
+
+    assert to_gray(Image.fromarray(pixels))[1] is False
+
+@pytest.mark.parametrize('levels, kind, bits', [((0, 255), 'bilevel', 1),
+                                                ((0, 80, 160, 255), 'tones', 2),
+                                                (tuple(range(0, 256, 16)), 'tones', 4)])
+def test_gray_palette_is_lossless_and_small(levels, kind, bits):
+    gray = _gray_rgb(levels, size=(256, 64)).convert('L')
+
+    palette_img, found = gray_palette(gray)
+
+    assert found == kind
+    assert np.array_equal(np.asarray(palette_img.convert('L')), np.asarray(gray))
+    buffer = io.BytesIO()
+    palette_img.save(buffer, 'PNG')
+    # Profundidad de bits de la cabecera IHDR
+    assert buffer.getvalue()[24] == bits
+
+def test_many_grays_stay_as_gray():
+    gray = Image.fromarray(np.tile(np.arange(256, dtype=np.uint8), (10, 1)))
+
+    assert gray_palette(gray) == (gray, 'gray')
+
+def test_gray_figures_are_encoded_with_one_channel(workdir):
+    _gray_rgb((0, 255), size=(400, 300)).save('img/plano.png')
+    photo = np.asarray(_photo()).mean(axis=-1).astype(np.uint8)
+    Image.fromarray(photo).convert('RGB').save('img/radiografia.png')
+
+    fmt, data = encode_image('img/plano.png', auto_format=True)
+    assert fmt == 'PNG'
+    with Image.open(io.BytesIO(data)) as img:
+        assert img.mode in ('P', '1') and len(img.getcolors()) == 2
+    fmt, data = encode_image('img/radiografia.png')
+    with Image.open(io.BytesIO(data)) as img:
+        assert (fmt, img.mode) == ('JPEG', 'L')
@@ -0,0 +1,68 @@
+"""Pruebas de image_quality: SSIM y búsqueda de la calidad JPEG mínima"""
+
+import io
+
+import numpy as np
+from PIL import Image
+
+from compress_images import encode_image, job_key
+from compression_manifest import load_manifest
+from image_io import encode_jpeg
+from image_quality import ssim, find_quality, luminance, QUALITY_MIN, QUALITY_MAX
+
+def _scene(size=(320, 240), seed=0):
+    """Degradado con algo de textura: la calidad JPEG sí cambia el SSIM"""
+    rng = np.random.default_rng(seed)
+    x = np.linspace(0, 255, size[0])[None, :, None]
+    y = np.linspace(0, 255, size[1])[:, None, None]
+    pixels = (x * np.array([1, 0.5, 0.2]) + y * np.array([0, 0.5, 0.8])) / 1.2
+    pixels = pixels + rng.normal(0, 12, (size[1], size[0], 3))
+    return Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8))
+
+def _score(img, data):
+    with Image.open(io.BytesIO(data)) as decoded:
+        return ssim(luminance(img), luminance(decoded))
+
+def test_ssim_of_identical_and_degraded_images():
+    a = luminance(_scene())
+    rng = np.random.default_rng(1)
+    b = np.clip(a + rng.normal(0, 20, a.shape), 0, 255).astype(np.float32)
+
+    assert ssim(a, a) == 1.0
+    assert 0 < ssim(a, b) < 0.9
+    assert abs(ssim(a, b) - ssim(b, a)) < 1e-12
+
+def test_find_quality_returns_lowest_quality_meeting_target():
+    img = _scene()
+
+    quality, data, score = find_quality(img, 0.95)
+
+    assert QUALITY_MIN < quality < QUALITY_MAX
+    assert score >= 0.95
+    assert _score(img, data) >= 0.95
+    # Una calidad menos ya no llega al objetivo
+    assert _score(img, encode_jpeg(img, quality - 1)) < 0.95
+
+def test_find_quality_higher_target_never_lowers_quality():
+    img = _scene()
+
+    qualities = [find_quality(img, target)[0] for target in (0.9, 0.95, 0.98)]
+
+    assert qualities == sorted(qualities)
+
+def test_unreachable_target_uses_maximum_quality():
+    quality, _, score = find_quality(_scene(), 1.01)
+
+    assert quality == QUALITY_MAX
+    assert score < 1.01
+
+def test_ssim_option_changes_encoding_and_manifest_key(workdir):
+    _scene().save('img/escena.png')
+
+    fmt, data = encode_image('img/escena.png', quality=92, target_ssim=0.9)
+
+    assert fmt == 'JPEG'
+    assert len(data) < len(encode_image('img/escena.png', quality=92)[1])
+    manifest = load_manifest()
+    plain = job_key(manifest, 'img/escena.png', 92)[3]
+    assert job_key(manifest, 'img/escena.png', 92, target_ssim=0.95)[3] != plain
@@ -0,0 +1,191 @@
+"""Pruebas de pdf_images sobre PDF pequeños generados en la propia prueba"""
+
+import zlib
+import base64
+from pathlib import Path
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import pdf_images
+from pdf_images import audit_pdf, open_pdf, get_object, resolve, stream_data, parse_value, Ref
+
+def _stream(info, data):
+    return b'<< ' + info + b' /Length %d >>\nstream\n' % len(data) + data + b'\nendstream'
+
+def _up_predicted(rows):
+    """Filas con el predictor PNG Up (tipo 2), como las escribe pdfTeX en los flujos xref"""
+    out = bytearray()
+    previous = bytes(len(rows[0]))
+    for row in rows:
+        out.append(2)
+        out += bytes((b - a) & 0xFF for a, b in zip(previous, row))
+        previous = row
+    return bytes(out)
+
+def _document(jpeg, pixels, alpha):
+    """
+    Objetos de una página con un JPEG, una imagen Flate con /SMask y un /Form
+
+    Returns:
+        dict num → cuerpo del objeto (bytes)
+    """
+    content = (b'q 144 0 0 72 100 600 cm /Im1 Do Q\n'
+               b'q 2 0 0 2 0 0 cm /Fm1 Do Q\n')
+    form = b'q 36 0 0 36 0 0 cm /Im2 Do Q'
+    return {
+        1: b'<< /Type /Catalog /Pages 2 0 R >>',
+        # Los recursos se heredan del nodo /Pages
+        2: b'<< /Type /Pages /Kids [3 0 R] /Count 1 /Resources 4 0 R >>',
+        3: b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Contents 5 0 R >>',
+        4: b'<< /XObject << /Im1 6 0 R /Fm1 8 0 R >> >>',
+        5: _stream(b'/Filter [/ASCII85Decode /FlateDecode]',
+                   base64.a85encode(zlib.compress(content)) + b'~>'),
+        6: _stream(b'/Type /XObject /Subtype /Image /Width 64 /Height 32 '
+                   b'/ColorSpace /DeviceRGB /BitsPerComponent 8 /Filter /DCTDecode', jpeg),
+        7: _stream(b'/Type /XObject /Subtype /Image /Width 20 /Height 10 '
+                   b'/ColorSpace /DeviceGray /BitsPerComponent 8 /Filter /FlateDecode',
+                   zlib.compress(alpha)),
+        8: _stream(b'/Type /XObject /Subtype /Form /BBox [0 0 100 100] '
+                   b'/Matrix [1 0 0 1 10 10] /Resources << /XObject << /Im2 9 0 R >> >> '
+                   b'/Filter /ASCIIHexDecode', form.hex().encode() + b'>'),
+        9: _stream(b'/Type /XObject /Subtype /Image /Width 20 /Height 10 '
+                   b'/ColorSpace [/ICCBased 10 0 R] /BitsPerComponent 8 /SMask 7 0 R '
+                   b'/Filter [/ASCIIHexDecode /FlateDecode]',
+                   zlib.compress(pixels).hex().encode() + b'>'),
+        10: _stream(b'/N 3', b''),
+    }
+
+def write_classic(path, objects, update=None):
+    """PDF con tabla xref clásica; update añade una actualización incremental con /Prev"""
+    out = bytearray(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+    offsets = {}
+    for num, body in sorted(objects.items()):
+        offsets[num] = len(out)
+        out += b'%d 0 obj\n' % num + body + b'\nendobj\n'
+    size = max(objects) + 1
+    xref = len(out)
+    out += b'xref\n0 %d\n0000000000 65535 f \n' % size
+    for num in range(1, size):
+        out += b'%010d 00000 n \n' % offsets[num]
+    out += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (size, xref)
+    if update:
+        previous = xref
+        offsets = {}
+        for num, body in sorted(update.items()):
+            offsets[num] = len(out)
+            out += b'%d 0 obj\n' % num + body + b'\nendobj\n'
+        xref = len(out)
+        out += b'xref\n0 1\n0000000000 65535 f \n'
+        for num in sorted(update):
+            out += b'%d 1\n%010d 00000 n \n' % (num, offsets[num])
+        out += (b'trailer\n<< /Size %d /Root 1 0 R /Prev %d >>\nstartxref\n%d\n%%%%EOF\n'
+                % (size, previous, xref))
+    path.write_bytes(bytes(out))
+    return path
+
+def write_compressed(path, objects, packed=(1, 2, 3, 4)):
+    """PDF 1.5 con los objetos de packed en un flujo de objetos y un flujo xref con predictor"""
+    out = bytearray(b'%PDF-1.5\n%\xe2\xe3\xcf\xd3\n')
+    stm_num = max(objects) + 1
+    xref_num = stm_num + 1
+    header, body = [], bytearray()
+    for num in packed:
+        header.append(b'%d %d' % (num, len(body)))
+        body += objects[num] + b'\n'
+    header = b' '.join(header) + b'\n'
+    loose = {num: obj for num, obj in objects.items() if num not in packed}
+    loose[stm_num] = _stream(b'/Type /ObjStm /N %d /First %d /Filter /FlateDecode'
+                             % (len(packed), len(header)), zlib.compress(header + body))
+    offsets = {}
+    for num, obj in sorted(loose.items()):
+        offsets[num] = len(out)
+        out += b'%d 0 obj\n' % num + obj + b'\nendobj\n'
+    offsets[xref_num] = len(out)
+
+    rows = [bytes([0, 0, 0xFF, 0xFF])]
+    for num in range(1, xref_num + 1):
+        if num in packed:
+            rows.append(bytes([2]) + stm_num.to_bytes(2, 'big') + bytes([packed.index(num)]))
+        else:
+            rows.append(bytes([1]) + offsets[num].to_bytes(2, 'big') + bytes([0]))
+    data = zlib.compress(_up_predicted(rows))
+    out += b'%d 0 obj\n' % xref_num + _stream(
+        b'/Type /XRef /Size %d /Root 1 0 R /W [1 2 1] /Filter /FlateDecode '
+        b'/DecodeParms << /Predictor 12 /Columns 4 >>' % (xref_num + 1), data)
+    out += b'\nendobj\nstartxref\n%d\n%%%%EOF\n' % offsets[xref_num]
+    path.write_bytes(bytes(out))
+    return path
+
+@pytest.fixture
+def document(workdir, make_image):
+    """Objetos del PDF, con el JPEG copiado tal cual desde img/ y un PNG de 20x10 en img/"""
+    jpeg = make_image('img/foto.jpg', size=(64, 32), seed=1, quality=85).read_bytes()
+    rng = np.random.default_rng(2)
+    pixels = rng.integers(0, 256, (10, 20), dtype=np.uint8)
+    alpha = np.full((10, 20), 200, dtype=np.uint8)
+    Image.fromarray(pixels).save('img/grafica.png')
+    make_image('img/otra.png', size=(30, 30), seed=3)
+    return _document(jpeg, pixels.tobytes(), alpha.tobytes()), pixels.tobytes()
+
+def _check_audit(audit):
+    assert audit['pages'] == 1
+    by_filter = {image['filter']: image for image in audit['images']}
+    assert set(by_filter) == {'DCT', 'ASCIIHex+Flate'}
+
+    jpeg = by_filter['DCT']
+    assert (jpeg['width'], jpeg['height'], jpeg['colorspace']) == (64, 32, 'DeviceRGB')
+    assert jpeg['placements'] == [{'page': 1, 'width_cm': 5.08, 'height_cm': 2.54, 'dpi': 32}]
+    assert jpeg['match'] == 'contenido'
+    assert [p.name for p in jpeg['source']] == ['foto.jpg']
+
+    # Colocada dentro del /Form: 36 pt del propio form por el 2x de la página
+    flate = by_filter['ASCIIHex+Flate']
+    assert flate['colorspace'] == 'ICCBased'
+    assert flate['placements'] == [{'page': 1, 'width_cm': 2.54, 'height_cm': 2.54, 'dpi': 10}]
+    assert flate['smask_bytes'] > 0
+    assert flate['match'] == 'dimensiones'
+    assert [p.name for p in flate['source']] == ['grafica.png']
+    assert audit['image_bytes'] == sum(i['bytes'] + i['smask_bytes'] for i in audit['images'])
+
+@pytest.mark.parametrize('window', [4096, 16])
+def test_audit_classic_xref(document, monkeypatch, window):
+    # Con una ventana mínima cada objeto se lee en varios intentos
+    monkeypatch.setattr(pdf_images, 'READ_WINDOW', window)
+    objects, _ = document
+    _check_audit(audit_pdf(write_classic(Path('clasico.pdf'), objects)))
+
+@pytest.mark.parametrize('window', [4096, 16])
+def test_audit_object_and_xref_streams(document, monkeypatch, window):
+    monkeypatch.setattr(pdf_images, 'READ_WINDOW', window)
+    objects, _ = document
+    _check_audit(audit_pdf(write_compressed(Path('comprimido.pdf'), objects)))
+
+def test_incremental_update_wins_over_previous_xref(document):
+    objects, _ = document
+    # La actualización recoloca el JPEG al doble de tamaño
+    content = b'q 288 0 0 144 100 600 cm /Im1 Do Q'
+    path = write_classic(Path('actualizado.pdf'), objects,
+                         update={5: _stream(b'', content)})
+
+    audit = audit_pdf(path)
+
+    assert [image['filter'] for image in audit['images']] == ['DCT']
+    assert audit['images'][0]['dpi'] == 16
+
+def test_stream_filters_decode_image_data(document):
+    objects, pixels = document
+    path = write_compressed(Path('datos.pdf'), objects)
+
+    with open(path, 'rb') as f:
+        pdf = open_pdf(f)
+        image = get_object(pdf, 9)
+        assert stream_data(pdf, image) == pixels
+        assert resolve(pdf, image.dict['SMask']) == get_object(pdf, 7)
+        assert len(stream_data(pdf, get_object(pdf, 7))) == 200
+        assert pdf['xref'][1] == ('c', 11, 0)
+
+def test_parse_value_objects():
+    value, _ = parse_value(b'<< /A [1 2.5 (a\\(b\\)) <414> 3 0 R] /N#20x true /Z null >>', 0)
+    assert value == {'A': [1, 2.5, b'a(b)', b'A@', Ref(3, 0)], 'N x': True, 'Z': None}
@@ -0,0 +1,51 @@
+"""Pruebas de png_optimizer: convivencia con las entradas de compress_images"""
+
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from compress_images import compress_images_in_folder
+from png_optimizer import optimize_folder
+from compression_manifest import load_manifest, save_manifest, forget
+
+def test_lossless_pass_keeps_upstream_entry(workdir, capsys):
+    # Figura de pocos colores: con auto_format sale como PNG
+    rng = np.random.default_rng(0)
+    pixels = rng.choice([0, 90, 200, 255], size=(300, 400, 3)).astype(np.uint8)
+    Image.fromarray(pixels).save('img/grafica.png', compress_level=0)
+    compress_images_in_folder(Path('img'), Path('img_backup'), quality=92, jobs=1,
+                              auto_format=True)
+    upstream = load_manifest()['outputs']['img/grafica.png']
+
+    optimize_folder(Path('img'), Path('img_backup'), jobs=1, effort='rapido')
+    entry = load_manifest()['outputs']['img/grafica.png']
+    assert entry['key'] == upstream['key']
+    assert entry['source_hash'] == upstream['source_hash']
+    assert len(entry['covers']) == 1
+    optimized = Path('img/grafica.png').read_bytes()
+    capsys.readouterr()
+
+    # Ni compress_images ni una nueva pasada sin pérdida lo vuelven a tocar
+    compress_images_in_folder(Path('img'), Path('img_backup'), quality=92, jobs=1,
+                              auto_format=True)
+    optimize_folder(Path('img'), Path('img_backup'), jobs=1, effort='rapido')
+    assert Path('img/grafica.png').read_bytes() == optimized
+    assert '0 imágenes pendientes' in capsys.readouterr().out
+
+def test_png_already_optimal_is_skipped_on_rerun(workdir, capsys):
+    # La salida del propio optimizador, sin entrada en el manifiesto, ya es mínima
+    Image.new('L', (64, 64), 0).save('img/negro.png')
+    optimize_folder(Path('img'), Path('img_backup'), jobs=1, effort='rapido')
+    manifest = load_manifest()
+    forget(manifest, 'img/negro.png')
+    save_manifest(manifest)
+    capsys.readouterr()
+
+    optimize_folder(Path('img'), Path('img_backup'), jobs=1, effort='rapido')
+    assert 'ya es óptimo' in capsys.readouterr().out
+    entry = load_manifest()['outputs']['img/negro.png']
+    assert entry['source'] == 'img/negro.png'
+
+    optimize_folder(Path('img'), Path('img_backup'), jobs=1, effort='rapido')
+    assert '0 imágenes pendientes' in capsys.readouterr().out
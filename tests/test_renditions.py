@@ -0,0 +1,82 @@
+"""Pruebas de renditions: varias versiones por decodificación y caché LRU en disco"""
+
+import os
+from pathlib import Path
+
+import pytest
+from PIL import Image
+
+import renditions
+from renditions import get_renditions, lookup, evict, cache_usage, RENDITIONS
+from compression_manifest import file_hash
+from run_report import image_record
+
+CACHE = Path('cache')
+
+def test_all_renditions_come_from_one_render(workdir, make_image, monkeypatch):
+    path = make_image('img/foto.png', size=(2000, 1000), seed=1)
+    calls = []
+    real_render = renditions.render
+    def spy(source_path, specs, record=None):
+        calls.append(sorted(specs))
+        return real_render(source_path, specs, record)
+    monkeypatch.setattr(renditions, 'render', spy)
+
+    paths = get_renditions(path, cache_dir=CACHE)
+
+    assert calls == [['print', 'screen', 'thumb']]
+    sizes = {}
+    for name, rendition in paths.items():
+        with Image.open(rendition) as img:
+            sizes[name] = img.size
+    assert sizes == {'print': (2000, 1000), 'screen': (1200, 600), 'thumb': (256, 128)}
+
+def test_second_request_is_served_from_cache(workdir, make_image, monkeypatch):
+    path = make_image('img/foto.png', seed=1)
+    first = get_renditions(path, ['screen', 'thumb'], cache_dir=CACHE)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("no debería volver a decodificar")
+    monkeypatch.setattr(renditions, 'render', fail)
+    record = image_record(path)
+    again = get_renditions(path, ['screen', 'thumb'], cache_dir=CACHE, record=record)
+
+    assert again == first
+    assert (record['cache_hits'], record['cache_misses']) == (2, 0)
+
+def test_changed_source_or_spec_misses(workdir, make_image):
+    path = make_image('img/foto.png', seed=1)
+    get_renditions(path, ['thumb'], cache_dir=CACHE)
+    digest = file_hash(path)
+
+    assert lookup(digest, RENDITIONS['thumb'], CACHE) is not None
+    assert lookup(digest, dict(RENDITIONS['thumb'], quality=60), CACHE) is None
+
+    make_image('img/foto.png', seed=2)
+    record = image_record(path)
+    get_renditions(path, ['thumb'], cache_dir=CACHE, record=record)
+    assert record['cache_misses'] == 1
+    assert cache_usage(CACHE)[0] == 2
+
+def test_evict_removes_least_recently_used(workdir, make_image):
+    paths = [get_renditions(make_image(f'img/foto_{i}.png', seed=i), ['thumb'],
+                            cache_dir=CACHE)['thumb'] for i in range(3)]
+    for age, path in enumerate(reversed(paths)):
+        os.utime(path, ns=(10**18 - age * 10**9,) * 2)
+    # Un acierto renueva la fecha: foto_0 pasa a ser la más reciente
+    lookup(file_hash('img/foto_0.png'), RENDITIONS['thumb'], CACHE)
+
+    sizes = {p: p.stat().st_size for p in paths}
+    removed = evict(CACHE, max_bytes=sizes[paths[0]] + sizes[paths[2]])
+
+    assert removed == 1
+    assert [p.exists() for p in paths] == [True, False, True]
+
+@pytest.mark.parametrize('max_bytes', [0, 1])
+def test_requested_renditions_survive_a_full_cache(workdir, make_image, max_bytes):
+    old = get_renditions(make_image('img/vieja.png', seed=1), ['thumb'], cache_dir=CACHE)
+    new = get_renditions(make_image('img/nueva.png', seed=2), ['thumb', 'screen'],
+                         cache_dir=CACHE, max_bytes=max_bytes)
+
+    assert not old['thumb'].exists()
+    assert all(path.exists() for path in new.values())
@@ -0,0 +1,77 @@
+"""Pruebas de size_estimate y --estimate: predicción sin tocar img/"""
+
+from pathlib import Path
+
+import compress_images
+from compress_images import encode_image, estimate_folder
+from compression_manifest import MANIFEST_PATH
+from size_estimate import (estimate_image, save_estimate, compare_estimate, target_size,
+                           ESTIMATE_PATH)
+
+def _snapshot():
+    return {p: p.read_bytes() for p in Path('img').rglob('*') if p.is_file()}
+
+def test_target_size_never_enlarges():
+    assert target_size((4000, 2000), (1920, 1080)) == (1920, 960)
+    assert target_size((800, 600), (1920, 1080)) == (800, 600)
+
+def test_small_image_is_estimated_exactly(workdir, make_image):
+    path = make_image('img/pequena.png', size=(400, 300), seed=1)
+
+    estimate = estimate_image(path, quality=92)
+
+    assert estimate['exact']
+    assert estimate['bytes'] == len(encode_image(path, quality=92)[1])
+
+def test_large_image_estimate_is_close(workdir, make_image):
+    path = make_image('img/grande.png', size=(2400, 1800), seed=2)
+
+    estimate = estimate_image(path, quality=92, max_size=(1920, 1080))
+
+    actual = len(encode_image(path, quality=92, max_width=1920, max_height=1080)[1])
+    assert not estimate['exact']
+    assert (estimate['width'], estimate['height']) == (1440, 1080)
+    assert abs(estimate['bytes'] - actual) / actual < 0.15
+
+def test_estimate_folder_writes_nothing(workdir, make_image):
+    for i in range(3):
+        make_image(f'img/figura_{i}.png', size=(400, 300), seed=i)
+    before = _snapshot()
+
+    predictions = estimate_folder(Path('img'), quality=92, jobs=1)
+
+    assert _snapshot() == before
+    assert not any(Path('img_backup').iterdir())
+    assert not MANIFEST_PATH.exists()
+    assert set(predictions) == {f'img/figura_{i}.jpg' for i in range(3)}
+
+def test_compare_only_with_same_parameters(workdir, make_image):
+    path = make_image('img/foto.jpg', size=(200, 100), seed=3)
+    size = path.stat().st_size
+    save_estimate({'quality': 92}, {'img/foto.jpg': size * 2})
+
+    assert compare_estimate({'quality': 80}) is None
+    assert not ESTIMATE_PATH.exists()
+
+    save_estimate({'quality': 92}, {'img/foto.jpg': size * 2})
+    accuracy = compare_estimate({'quality': 92})
+    assert accuracy['predicted'] == 2 * size and accuracy['actual'] == size
+    assert accuracy['error'] == 1.0
+    assert not ESTIMATE_PATH.exists()
+
+def test_estimate_then_real_run_reports_accuracy(workdir, make_image, monkeypatch, capsys):
+    for i in range(2):
+        make_image(f'img/figura_{i}.png', size=(400, 300), seed=i)
+    before = _snapshot()
+
+    monkeypatch.setattr('sys.argv', ['compress_images.py', '-j', '1', '--estimate'])
+    compress_images.main()
+    assert 'img/ no se ha modificado' in capsys.readouterr().out
+    assert _snapshot() == before
+    assert ESTIMATE_PATH.exists()
+
+    monkeypatch.setattr('sys.argv', ['compress_images.py', '-j', '1'])
+    compress_images.main()
+    # Imágenes pequeñas: la estimación es exacta
+    assert 'error total +0.0%' in capsys.readouterr().out
+    assert not ESTIMATE_PATH.exists()
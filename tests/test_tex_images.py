@@ -0,0 +1,142 @@
+"""Pruebas de tex_images: qué imágenes usan los .tex y a qué tamaño se imprimen"""
+
+from pathlib import Path
+
+from PIL import Image
+
+import compress_images
+from compress_images import compress_images_in_folder
+from compress_quick import compress_all_images
+from tex_images import (page_widths, parse_references, pixel_limits, max_size_for,
+                        referenced_images, is_referenced, split_referenced,
+                        PAPER_WIDTH_CM, PAPER_HEIGHT_CM, NO_LIMIT)
+
+CLS = r"""
+\RequirePackage[left=2cm,right=2cm,top=3cm,bottom=3cm]{geometry}
+\newcommand{\logo}{\includegraphics[height=1cm]{img/Logo.png}}
+"""
+
+DOCUMENT = r"""
+\includegraphics[width=0.5\textwidth]{img/figura.png}
+\pdftooltip{\includegraphics[width=\textwidth]{img/Figura.jpg}}{otra vez, más grande}
+\includegraphics[height=5cm]{img/alta.png}
+\imagenHorizontal{img/plano.png}{fig:plano}
+\portadafondo[img/portada.jpg]
+% \includegraphics[width=\textwidth]{img/comentada.png}
+"""
+
+def _px(cm, dpi=300):
+    return round(cm / 2.54 * dpi)
+
+def _write_sources(workdir):
+    (workdir / 'test.cls').write_text(CLS, encoding='utf-8')
+    (workdir / 'doc.tex').write_text(DOCUMENT, encoding='utf-8')
+
+def test_page_widths_follow_class_geometry(workdir):
+    _write_sources(workdir)
+
+    page = page_widths('test.cls')
+
+    assert page['textwidth'] == PAPER_WIDTH_CM - 4
+    assert page['textheight'] == PAPER_HEIGHT_CM - 6
+    assert page['paperwidth'] == PAPER_WIDTH_CM
+
+def test_parse_references_reads_every_form(workdir):
+    _write_sources(workdir)
+    page = page_widths('test.cls')
+
+    refs = {r['path']: r for r in parse_references('doc.tex', page)}
+
+    assert set(refs) == {'img/figura.png', 'img/Figura.jpg', 'img/alta.png',
+                         'img/plano.png', 'img/portada.jpg'}
+    assert refs['img/figura.png']['width_cm'] == 0.5 * page['textwidth']
+    assert refs['img/alta.png'] == {'path': 'img/alta.png', 'width_cm': None,
+                                    'height_cm': 5.0, 'landscape': False}
+    assert refs['img/plano.png']['width_cm'] == page['landscape_linewidth']
+    assert refs['img/plano.png']['landscape']
+    assert refs['img/portada.jpg']['height_cm'] == PAPER_HEIGHT_CM
+
+def test_pixel_limits_use_largest_print_size(workdir):
+    _write_sources(workdir)
+    page = page_widths('test.cls')
+
+    limits = pixel_limits(['doc.tex'], dpi=300, cls_path='test.cls')
+
+    # figura.png y Figura.jpg son la misma imagen: manda el ancho completo
+    assert limits['img/figura'] == (_px(page['textwidth']), None)
+    assert limits['img/alta'] == (None, _px(5))
+    # La clase también aporta sus imágenes
+    assert limits['img/logo'] == (None, _px(1))
+    assert 'img/comentada' not in limits
+    assert pixel_limits(['doc.tex'], dpi=150, cls_path='test.cls')['img/alta'] == (None, _px(5, 150))
+
+def test_max_size_for_falls_back_to_default(workdir):
+    limits = {'img/figura': (1000, None)}
+
+    assert max_size_for(limits, Path('img/Figura.PNG'), (1920, 1080)) == (1000, NO_LIMIT)
+    assert max_size_for(limits, Path('img/otra.png'), (1920, 1080)) == (1920, 1080)
+    assert max_size_for(None, Path('img/figura.png'), (1920, 1080)) == (1920, 1080)
+
+def test_compression_resizes_to_printed_width(workdir, make_image):
+    _write_sources(workdir)
+    make_image('img/figura.png', size=(3000, 1500), seed=1)
+    make_image('img/suelta.png', size=(1600, 800), seed=2)
+    limits = pixel_limits(['doc.tex'], dpi=150, cls_path='test.cls')
+
+    compress_images_in_folder(Path('img'), Path('img_backup'), quality=92, jobs=1,
+                              limits=limits)
+
+    width = limits['img/figura'][0]
+    with Image.open('img/figura.jpg') as img:
+        assert img.size == (width, round(1500 * width / 3000))
+    # Sin referencia en los .tex se aplica el límite fijo, que no la reduce
+    with Image.open('img/suelta.jpg') as img:
+        assert img.size == (1600, 800)
+
+def test_referenced_images_include_class_and_ignore_case(workdir):
+    _write_sources(workdir)
+
+    keys = referenced_images(['doc.tex'], cls_path='test.cls')
+
+    assert keys == {'img/figura', 'img/alta', 'img/plano', 'img/portada', 'img/logo'}
+    # La compresión cambia la extensión y los .tex no siempre respetan mayúsculas
+    assert is_referenced(keys, Path('img/FIGURA.jpg'))
+    assert not is_referenced(keys, Path('img/comentada.png'))
+    assert is_referenced(None, Path('img/comentada.png'))
+
+def test_split_referenced_lists_unused_and_missing(workdir):
+    _write_sources(workdir)
+    keys = referenced_images(['doc.tex'], cls_path='test.cls')
+    files = [Path('img/figura.png'), Path('img/logo.png'), Path('img/suelta.png')]
+
+    used, unused, missing = split_referenced(files, keys)
+
+    assert used == files[:2]
+    assert unused == [Path('img/suelta.png')]
+    assert missing == ['img/alta', 'img/plano', 'img/portada']
+
+def test_document_option_compresses_only_its_images(workdir, make_image, monkeypatch):
+    # La clase por defecto de los documentos
+    (workdir / 'sener2025.cls').write_text(CLS, encoding='utf-8')
+    (workdir / 'doc.tex').write_text(DOCUMENT, encoding='utf-8')
+    make_image('img/figura.png', seed=1)
+    suelta = make_image('img/suelta.png', seed=2)
+    original = suelta.read_bytes()
+
+    monkeypatch.setattr('sys.argv', ['compress_images.py', '-j', '1', '-d', 'doc.tex'])
+    compress_images.main()
+
+    assert Path('img/figura.jpg').exists() and not Path('img/figura.png').exists()
+    assert suelta.read_bytes() == original
+    assert not Path('img_backup/suelta.png').exists()
+
+def test_quick_compression_honours_only(workdir, make_image):
+    _write_sources(workdir)
+    make_image('img/Logo.png', seed=1)
+    suelta = make_image('img/suelta.png', seed=2)
+    original = suelta.read_bytes()
+
+    compress_all_images(only=referenced_images(['doc.tex'], cls_path='test.cls'))
+
+    assert Path('img/Logo.jpg').exists()
+    assert suelta.read_bytes() == original
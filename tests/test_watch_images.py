@@ -0,0 +1,53 @@
+"""Pruebas del modo vigilancia de watch_images"""
+
+import time
+from pathlib import Path
+
+import watch_images
+from watch_images import watch_folder
+from compression_manifest import load_manifest, file_hash
+
+def run_watch(monkeypatch, polls=15, **kwargs):
+    """Ejecuta watch_folder durante unas pocas revisiones y lo detiene como Ctrl+C"""
+    calls = []
+    real_sleep = time.sleep
+
+    def sleep(_):
+        calls.append(1)
+        if len(calls) >= polls:
+            raise KeyboardInterrupt
+        real_sleep(0.05)
+
+    monkeypatch.setattr(watch_images.time, 'sleep', sleep)
+    return watch_folder(Path('img'), Path('img_backup'), jobs=1, settle=0, **kwargs)
+
+def test_stem_collision_is_left_alone(workdir, make_image, monkeypatch, capsys):
+    png = make_image('img/portada.png', seed=1)
+    jpg = make_image('img/portada.jpg', seed=2, quality=100)
+    png_bytes, jpg_bytes = png.read_bytes(), jpg.read_bytes()
+
+    run_watch(monkeypatch)
+
+    assert 'Se deja sin comprimir portada.png' in capsys.readouterr().out
+    assert png.read_bytes() == png_bytes
+    # portada.jpg se comprimió desde sí misma y su respaldo es el original real
+    assert Path('img_backup/portada.jpg').read_bytes() == jpg_bytes
+    entry = load_manifest()['outputs']['img/portada.jpg']
+    assert entry['source_hash'] == file_hash('img_backup/portada.jpg')
+    assert not Path('img_backup/portada.png').exists()
+
+def test_new_png_is_compressed(workdir, make_image, monkeypatch):
+    make_image('img/figura.png', seed=3)
+
+    assert run_watch(monkeypatch) == 1
+    assert not Path('img/figura.png').exists()
+    assert 'img/figura.jpg' in load_manifest()['outputs']
+
+def test_failed_compression_is_not_recorded(workdir, make_image, monkeypatch):
+    path = make_image('img/rota.png', seed=4)
+    path.write_bytes(path.read_bytes()[:2000])
+    monkeypatch.setattr(watch_images, 'UNREADABLE_TIMEOUT', 0)
+
+    assert run_watch(monkeypatch) == 0
+    assert 'img/rota.png' not in load_manifest()['outputs']
+    assert path.exists()
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+Lectura de las referencias a imágenes en los documentos .tex
+
+Obtiene, para cada imagen de img/, el tamaño al que realmente se imprime
+según las formas que genera server/latexGenerator.js:
+
+- \\includegraphics[width=X\\textwidth]{img/...}
+- \\pdftooltip{\\includegraphics[...]{img/...}}{...}
+- \\imagenHorizontal{img/...}{etiqueta}  (ancho de línea en página horizontal)
+- Rutas img/... en argumentos opcionales (p. ej. \\portadafondo[img/...]),
+  que se tratan como imágenes a página completa
+
+Las medidas de página salen de la geometría de sener2025.cls.
+"""
+
+import re
+from pathlib import Path
+
+CLS_PATH = Path("sener2025.cls")
+
+# Tamaño carta (letterpaper) en cm
+PAPER_WIDTH_CM = 21.59
+PAPER_HEIGHT_CM = 27.94
+
+# Resoluciones de salida habituales
+DPI_PRINT = 300
+DPI_SCREEN = 150
+
+# Valor usado cuando una dimensión no está limitada
+NO_LIMIT = 100000
+
+CM_PER_UNIT = {'cm': 1.0, 'mm': 0.1, 'in': 2.54, 'pt': 2.54 / 72.27, 'bp': 2.54 / 72}
+
+_INCLUDEGRAPHICS = re.compile(r'\\includegraphics\s*(?:\[([^\]]*)\])?\s*\{([^}]+)\}')
+_IMAGEN_HORIZONTAL = re.compile(r'\\imagenHorizontal\s*\{([^}]+)\}')
+_OPTIONAL_IMG = re.compile(r'\[\s*(img/[^\]\s]+)\s*\]')
+_DIMENSION = re.compile(
+    r'(width|height)\s*=\s*([\d.]*)\s*(?:\\(textwidth|linewidth|paperwidth|paperheight|textheight)|(cm|mm|in|pt|bp))')
+
+def _strip_comments(text):
+    """Quita los comentarios de LaTeX (% no escapado hasta fin de línea)"""
+    return re.sub(r'(?<!\\)%.*', '', text)
+
+def _geometry_margins(options):
+    """Extrae los márgenes en cm de una lista de opciones de geometry"""
+    margins = {}
+    for name, value, unit in re.findall(r'(left|right|top|bottom)\s*=\s*([\d.]+)\s*(cm|mm|in|pt)', options):
+        margins[name] = float(value) * CM_PER_UNIT[unit]
+    return margins
+
+def page_widths(cls_path=CLS_PATH):
+    """
+    Medidas útiles de la página en cm según sener2025.cls
+
+    Returns:
+        dict con textwidth, textheight, landscape_linewidth,
+        landscape_textheight, paperwidth y paperheight
+    """
+    text = _strip_comments(Path(cls_path).read_text(encoding='utf-8'))
+    portrait = {'left': 2.5, 'right': 2.5, 'top': 3.5, 'bottom': 3.5}
+    match = re.search(r'\\RequirePackage\s*\[([^\]]*)\]\s*\{geometry\}', text)
+    if match:
+        portrait.update(_geometry_margins(match.group(1)))
+
+    # En horizontal, geometry se aplica sobre la página vertical y luego
+    # se gira: el ancho de línea es la altura útil de esa geometría
+    landscape = {'left': 3.0, 'right': 2.5, 'top': 2.5, 'bottom': 2.0}
+    match = re.search(r'\\newgeometry\s*\{([^}]*)\}\s*\\begin\{landscape\}', text)
+    if match:
+        landscape.update(_geometry_margins(match.group(1)))
+
+    return {
+        'textwidth': PAPER_WIDTH_CM - portrait['left'] - portrait['right'],
+        'textheight': PAPER_HEIGHT_CM - portrait['top'] - portrait['bottom'],
+        'landscape_linewidth': PAPER_HEIGHT_CM - landscape['top'] - landscape['bottom'],
+        'landscape_textheight': PAPER_WIDTH_CM - landscape['left'] - landscape['right'],
+        'paperwidth': PAPER_WIDTH_CM,
+        'paperheight': PAPER_HEIGHT_CM,
+    }
+
+def image_key(path):
+    """
+    Clave de una imagen independiente de mayúsculas y extensión
+
+    'img/Figura_2_1.png' e 'img/figura_2_1.jpg' comparten clave, porque la
+    compresión cambia la extensión y los .tex no siempre respetan mayúsculas.
+    """
+    return Path(path).with_suffix('').as_posix().lower()
+
+def _print_size(options, page, landscape=False):
+    """Ancho y alto impresos (cm) a partir de las opciones de \\includegraphics"""
+    width = height = None
+    for dim, factor, macro, unit in _DIMENSION.findall(options or ''):
+        factor = float(factor) if factor else 1.0
+        if macro:
+            if macro in ('textwidth', 'linewidth'):
+                base = page['landscape_linewidth'] if landscape else page['textwidth']
+            elif macro == 'textheight':
+                base = page['landscape_textheight'] if landscape else page['textheight']
+            else:
+                base = page[macro]
+            size = factor * base
+        else:
+            size = factor * CM_PER_UNIT[unit]
+        if dim == 'width':
+            width = size
+        else:
+            height = size
+    return width, height
+
+def parse_references(tex_path, page=None):
+    """
+    Lista las imágenes referenciadas por un .tex con su tamaño impreso
+
+    Returns:
+        lista de dicts con path, width_cm, height_cm (None si no se fija)
+        y landscape
+    """
+    page = page or page_widths()
+    text = _strip_comments(Path(tex_path).read_text(encoding='utf-8', errors='replace'))
+    refs = []
+    seen_spans = []
+    for match in _IMAGEN_HORIZONTAL.finditer(text):
+        refs.append({'path': match.group(1).strip(), 'width_cm': page['landscape_linewidth'],
+                     'height_cm': None, 'landscape': True})
+    for match in _INCLUDEGRAPHICS.finditer(text):
+        width, height = _print_size(match.group(1), page)
+        if width is None and height is None:
+            # Sin tamaño explícito: como mucho ocupa el ancho de texto
+            width = page['textwidth']
+        refs.append({'path': match.group(2).strip(), 'width_cm': width,
+                     'height_cm': height, 'landscape': False})
+        seen_spans.append(match.span())
+    for match in _OPTIONAL_IMG.finditer(text):
+        if any(start <= match.start() < end for start, end in seen_spans):
+            continue
+        # Fondos de portada y similares: página completa
+        refs.append({'path': match.group(1), 'width_cm': page['paperwidth'],
+                     'height_cm': page['paperheight'], 'landscape': False})
+    return refs
+
+def pixel_limits(tex_paths, dpi=DPI_PRINT, cls_path=CLS_PATH):
+    """
+    Límite de píxeles (ancho, alto) de cada imagen para la resolución dada
+
+    Si una imagen aparece varias veces se usa el mayor tamaño impreso.
+    Un valor None en ancho o alto significa que esa dimensión no limita.
+
+    Returns:
+        dict image_key → (max_width, max_height)
+    """
+    page = page_widths(cls_path)
+    sizes = {}
+    paths = list(tex_paths)
+    if Path(cls_path).exists():
+        # La clase también incluye imágenes (logotipos del encabezado)
+        paths.append(cls_path)
+    for tex_path in paths:
+        for ref in parse_references(tex_path, page):
+            if '#' in ref['path']:
+                continue  # Argumentos de macros en la propia clase
+            key = image_key(ref['path'])
+            width, height = sizes.get(key, (0, 0))
+            # Una dimensión sin fijar en alguna referencia deja de limitar
+            width = max(width, ref['width_cm'] or float('inf'))
+            height = max(height, ref['height_cm'] or float('inf'))
+            sizes[key] = (width, height)
+
+    def to_pixels(cm):
+        return round(cm / 2.54 * dpi) if cm != float('inf') else None
+
+    return {key: (to_pixels(w), to_pixels(h)) for key, (w, h) in sizes.items()}
+
+def referenced_images(tex_paths, cls_path=CLS_PATH):
+    """
+    Claves (image_key) de todas las imágenes que necesitan los documentos
+
+    Incluye las que usa la propia clase (logotipos, portada por defecto),
+    porque aparecen en cualquier documento compilado con ella.
+    """
+    page = page_widths(cls_path)
+    paths = list(tex_paths)
+    if Path(cls_path).exists():
+        paths.append(cls_path)
+    return {image_key(ref['path'])
+            for tex_path in paths
+            for ref in parse_references(tex_path, page)
+            if '#' not in ref['path']}
+
+def _relative_key(image_path, root):
+    """image_key de una ruta de archivo, relativa a la carpeta de los .tex"""
+    try:
+        rel = Path(image_path).resolve().relative_to(Path(root).resolve())
+    except ValueError:
+        rel = Path(image_path)
+    return image_key(rel)
+
+def is_referenced(keys, image_path, root=Path('.')):
+    """True si la imagen está en keys (o si keys es None: sin filtro)"""
+    return keys is None or _relative_key(image_path, root) in keys
+
+def split_referenced(files, keys, root=Path('.')):
+    """
+    Separa las imágenes usadas por los documentos de las que no
+
+    Returns:
+        (usadas, no_usadas, claves referenciadas sin archivo)
+    """
+    used, unused, found = [], [], set()
+    for f in files:
+        key = _relative_key(f, root)
+        if key in keys:
+            used.append(f)
+            found.add(key)
+        else:
+            unused.append(f)
+    return used, unused, sorted(keys - found)
+
+def max_size_for(limits, image_path, default, root=Path('.')):
+    """
+    Tamaño máximo (ancho, alto) en píxeles para una imagen de img/
+
+    Usa el límite calculado desde los .tex; si ningún documento usa la
+    imagen (o no hay límites) devuelve default.
+    """
+    if not limits:
+        return default
+    limit = limits.get(_relative_key(image_path, root))
+    if limit is None:
+        return default
+    width, height = limit
+    return (width or NO_LIMIT, height or NO_LIMIT)
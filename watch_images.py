@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Modo vigilancia: comprime las imágenes nuevas o modificadas de img/
+
+El editor web deja las figuras nuevas en img/; en vez de lanzar una
+pasada completa antes de cada compilación, este modo revisa la carpeta
+cada pocos segundos y comprime en segundo plano solo lo que cambió, con
+la misma lógica (respaldo, manifiesto, reemplazo atómico) que
+compress_images.
+
+Un archivo se encola cuando su tamaño y fecha no cambian durante
+SETTLE_SECONDS y Pillow puede leer su cabecera y datos: así no se
+comprime una subida a medio escribir.
+
+Uso:
+    python compress_images.py --watch
+"""
+
+import os
+import time
+import signal
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image
+from image_budget import IMAGE_EXTENSIONS
+from image_io import rename_collisions, jpeg_path
+from tex_images import is_referenced
+from compression_manifest import load_manifest, save_manifest, is_up_to_date, record
+from run_report import log_image
+
+# Segundos entre revisiones de la carpeta
+POLL_INTERVAL = 1.0
+
+# Segundos que un archivo debe permanecer sin cambios antes de comprimirlo
+SETTLE_SECONDS = 2.0
+
+# Un archivo que sigue sin poder leerse pasado este tiempo se da por válido
+# y se deja que la compresión informe del error
+UNREADABLE_TIMEOUT = 30.0
+
+def scan_images(folder, only=None):
+    """
+    Firma (tamaño, mtime_ns) de cada imagen de folder, en una pasada de scandir
+
+    Se ignoran los archivos ocultos, como los temporales de atomic_write.
+    """
+    signatures = {}
+    stack = [Path(folder)]
+    while stack:
+        current = stack.pop()
+        try:
+            entries = list(os.scandir(current))
+        except FileNotFoundError:
+            continue
+        for entry in entries:
+            if entry.name.startswith('.'):
+                continue
+            if entry.is_dir(follow_symlinks=False):
+                stack.append(Path(entry.path))
+            elif (entry.is_file() and Path(entry.name).suffix.lower() in IMAGE_EXTENSIONS
+                  and is_referenced(only, entry.path)):
+                try:
+                    st = entry.stat()
+                except FileNotFoundError:
+                    continue
+                signatures[Path(entry.path)] = (st.st_size, st.st_mtime_ns)
+    return signatures
+
+def _ignore_interrupt():
+    """Los procesos del pool ignoran Ctrl+C: el principal decide cuándo parar"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+def _readable(path):
+    """True si Pillow puede leer la imagen completa (no está a medio escribir)"""
+    try:
+        with Image.open(path) as img:
+            img.verify()
+        return True
+    except Exception:
+        return False
+
+def _outputs(path):
+    """Archivos que puede escribir la compresión de path (JPEG o, con auto_format, PNG)"""
+    return {path, jpeg_path(path), path.with_suffix('.png')}
+
+def _signature(path):
+    """Firma actual (tamaño, mtime_ns) de un archivo, o None si ya no existe"""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_size, st.st_mtime_ns
+
+def watch_folder(folder_path, backup_folder, quality=92, jobs=None, limits=None,
+                 auto_format=False, max_memory=None, target_ssim=None, only=None,
+                 report=None, interval=POLL_INTERVAL, settle=SETTLE_SECONDS):
+    """
+    Vigila folder_path y comprime cada imagen nueva o modificada
+
+    Al arrancar se ponen al día las imágenes que el manifiesto no reconoce.
+    Como en compress_images_in_folder, x.png no se comprime si hay otra
+    imagen x.jpg (u otra con el mismo nombre base) en su carpeta, y nunca
+    corren a la vez dos compresiones que pueden escribir el mismo archivo.
+    Se detiene con Ctrl+C; las compresiones en curso terminan y el
+    manifiesto se guarda.
+    """
+    from compress_images import _compress_one, job_key  # compress_images importa este módulo
+
+    folder = Path(folder_path)
+    manifest = load_manifest()
+    executor = ProcessPoolExecutor(max_workers=jobs or min(os.cpu_count() or 1, 4),
+                                   initializer=_ignore_interrupt)
+    settled = {}      # ruta → firma ya revisada (comprimida o al día)
+    changing = {}     # ruta → (firma, instante en que se vio por primera vez)
+    running = {}      # future → (ruta, clave, hash del original)
+    warned = {}       # ruta → imágenes con las que choca (ya avisado)
+    compressed = 0
+
+    print(f"\n👀 Vigilando {folder}/ (Ctrl+C para terminar)")
+    try:
+        while True:
+            now = time.monotonic()
+            queued = {path for path, _, _ in running.values()}
+            writing = set().union(*(_outputs(path) for path in queued))
+            # Las colisiones se buscan entre todas las imágenes, no solo las referenciadas
+            images = scan_images(folder)
+            collisions = rename_collisions(images)
+            for path, others in collisions.items():
+                # Un x.png en curso convive un momento con el x.jpg que escribe
+                if (warned.get(path) != others and path not in queued
+                        and is_referenced(only, path)):
+                    print(f"⚠️  Se deja sin comprimir {path.relative_to(folder).as_posix()}: "
+                          f"su salida pisaría {', '.join(o.name for o in others)} "
+                          f"(renombra uno de los dos)")
+            warned = {path: others for path, others in collisions.items()}
+            for path, signature in images.items():
+                if (settled.get(path) == signature or path in queued
+                        or path in collisions or not is_referenced(only, path)):
+                    continue
+                seen = changing.get(path)
+                if seen is None or seen[0] != signature:
+                    changing[path] = (signature, now)
+                    continue
+                age = now - seen[1]
+                if age < settle or (not _readable(path) and age < UNREADABLE_TIMEOUT):
+                    continue
+                if _outputs(path) & writing:
+                    # Otra compresión en curso puede escribir este archivo: se
+                    # vuelve a considerar en la siguiente revisión
+                    continue
+                del changing[path]
+
+                source_path, source_hash, max_size, key = job_key(
+                    manifest, path, quality, limits, auto_format, target_ssim,
+                    max_memory=max_memory)
+                if is_up_to_date(manifest, path, key):
+                    settled[path] = signature
+                    continue
+                writing |= _outputs(path)
+                future = executor.submit(_compress_one, path, source_path, folder,
+                                         Path(backup_folder), quality, max_size,
+                                         auto_format, max_memory, target_ssim)
+                running[future] = (path, key, source_hash)
+                print(f"⏳ En cola: {path.relative_to(folder).as_posix()}")
+
+            for future in [f for f in running if f.done()]:
+                path, key, source_hash = running.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    result = {'status': 'error', 'log': f"  ✗ {path.name}: {e}\n"}
+                print(result['log'], end='')
+                if result['status'] == 'error':
+                    # No va al manifiesto: se reintenta cuando el archivo cambie
+                    # o al volver a arrancar la vigilancia
+                    settled[path] = _signature(path)
+                    continue
+                record(manifest, key, result['source_path'], source_hash,
+                       result['output_path'])
+                save_manifest(manifest)
+                log_image(report, result['record'])
+                compressed += 1
+                # La salida (y el original si no cambió de nombre) ya está al día
+                output = Path(result['output_path'])
+                if output.exists():
+                    settled[output] = _signature(output)
+
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        print("\n⏹️  Deteniendo la vigilancia...")
+    finally:
+        executor.shutdown(wait=True)
+        for future, (path, key, source_hash) in running.items():
+            if not future.cancelled() and future.exception() is None:
+                result = future.result()
+                print(result['log'], end='')
+                if result['status'] == 'error':
+                    continue
+                record(manifest, key, result['source_path'], source_hash,
+                       result['output_path'])
+                log_image(report, result['record'])
+                compressed += 1
+        save_manifest(manifest)
+    print(f"✅ Imágenes comprimidas durante la vigilancia: {compressed}")
+    return compressed